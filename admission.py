@@ -0,0 +1,259 @@
+"""
+Cross-process admission control for agent runs.
+
+Every service worker shares one budget of concurrent agent runs and one
+bounded queue, kept in SQLite so it holds across processes. A run that
+fits starts at once; otherwise it waits in the queue (FIFO across
+workers) for up to `queue_timeout` seconds. Past that the request is
+shed fast instead of piling up behind the upstream rate limits: 429 when
+the queue is full, 503 when the wait times out or the worker is
+draining, both with a `Retry-After` estimated from how long runs take.
+
+The slots also make runs visible across workers: any worker can tell
+where a session's run lives, and a cancel requested through any worker is
+picked up by the one running it. Heartbeats carry each worker's metrics,
+so `GET /metrics` on any worker lists all of them, by `worker_id`.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from typing import Callable, Dict, Optional, Set
+from pydantic import BaseModel
+from repository.admission_repository import AdmissionRepository
+from telemetry import Metrics, telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class Saturated(Exception):
+    """No capacity for the run; `status_code` and `retry_after` go to the client"""
+
+    def __init__(self, status_code: int, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Cancelled(Exception):
+    """The run was cancelled through the API while it waited for a slot"""
+
+
+class Capacity(BaseModel):
+    ready: bool
+    worker_id: str
+    workers: int
+    running: int
+    queued: int
+    max_running: int
+    max_queued: int
+    reason: Optional[str] = None
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        repository: AdmissionRepository,
+        max_running: int = 16,
+        max_queued: int = 32,
+        queue_timeout: float = 10.0,
+        poll_interval: float = 0.25,
+        cancel_poll_interval: float = 1.0,
+        on_cancel: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.repository = repository
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.poll_interval = poll_interval
+        self.cancel_poll_interval = cancel_poll_interval
+        # called with the session id of a run cancelled through another worker
+        self.on_cancel = on_cancel
+        self.draining = False
+        # seconds per run, smoothed; seeds the Retry-After estimate
+        self.average_run = queue_timeout
+        self.last_heartbeat = time.monotonic()
+        self._admitted: Dict[str, float] = {}
+        self._releases: Set[asyncio.Task] = set()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._cancels: Optional[asyncio.Task] = None
+
+    @property
+    def worker_id(self) -> str:
+        return self.repository.worker_id
+
+    async def start(self) -> None:
+        await self.repository.register()
+        self.last_heartbeat = time.monotonic()
+        self._heartbeat = asyncio.create_task(self.heartbeat_forever())
+        self._cancels = asyncio.create_task(self.watch_cancels())
+
+    async def heartbeat_forever(self) -> None:
+        interval = self.repository.ttl / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.repository.heartbeat(json.dumps(telemetry.metrics.snapshot()))
+                self.last_heartbeat = time.monotonic()
+            except Exception as e:
+                logger.warning("Worker heartbeat failed:", extra={"error": str(e)})
+
+    async def watch_cancels(self) -> None:
+        """Hand cancels requested through other workers to `on_cancel`"""
+        while True:
+            await asyncio.sleep(self.cancel_poll_interval)
+            try:
+                sessions = await self.repository.cancel_requests()
+            except Exception as e:
+                logger.warning("Polling cancel requests failed:", extra={"error": str(e)})
+                continue
+            for session_id in sessions:
+                if self.on_cancel is not None:
+                    self.on_cancel(session_id)
+
+    def alive(self) -> bool:
+        """False once heartbeats stop landing, so other workers reap our slots"""
+        return time.monotonic() - self.last_heartbeat < self.repository.ttl
+
+    def retry_after(self, queued: int = 0) -> int:
+        """Seconds until a slot is likely to free up for a new request"""
+        wait = self.average_run * (queued + 1) / self.max_running
+        return max(1, min(300, math.ceil(wait)))
+
+    def shed(self, status_code: int, message: str, reason: str, queued: int = 0) -> Saturated:
+        telemetry.metrics.inc("admission_decisions_total", outcome=reason)
+        logger.warning("Agent run shed:", extra={"reason": reason})
+        return Saturated(status_code, message, self.retry_after(queued))
+
+    async def acquire(self, session_id: str) -> None:
+        """
+        Wait for a running slot for `session_id`.
+
+        Raises:
+            ValueError: If the session already has a run on some worker
+            Saturated: If the run can't be admitted in time
+            Cancelled: If the run is cancelled while queued
+        """
+        if self.draining:
+            raise self.shed(503, "Worker is shutting down", "draining")
+        outcome = await self.repository.admit(session_id, self.max_running, self.max_queued)
+        if outcome == "duplicate":
+            raise ValueError(f"Session already has a run in progress: {session_id}")
+        if outcome == "full":
+            raise self.shed(429, "Too many agent runs queued", "queue_full", self.max_queued)
+
+        started = time.monotonic()
+        gone = False
+        try:
+            admitted = outcome == "running"
+            deadline = started + self.queue_timeout
+            while not admitted:
+                if self.draining or time.monotonic() >= deadline:
+                    break
+                await asyncio.sleep(self.poll_interval)
+                promoted = await self.repository.promote(session_id, self.max_running)
+                if promoted is None:
+                    gone = True
+                    break
+                admitted = promoted
+        except BaseException:
+            # the client went away while queued
+            self.release(session_id)
+            raise
+        waited = time.monotonic() - started
+        telemetry.metrics.observe("admission_queue_wait_seconds", waited)
+        # a slot that went while this worker kept heartbeating was cancelled;
+        # otherwise the worker was reaped after missing its heartbeats
+        if gone and self.alive():
+            telemetry.metrics.inc("admission_decisions_total", outcome="cancelled")
+            raise Cancelled(f"Run was cancelled while queued: {session_id}")
+        if not admitted:
+            await self.repository.release(session_id)
+            raise self.shed(503, "Timed out waiting for an agent run slot", "queue_timeout")
+        telemetry.metrics.inc(
+            "admission_decisions_total",
+            outcome="admitted" if outcome == "running" else "queued")
+        self._admitted[session_id] = time.monotonic()
+
+    def release(self, session_id: str) -> None:
+        """Free the session's slot; the delete runs in the background"""
+        admitted = self._admitted.pop(session_id, None)
+        if admitted is not None:
+            self.average_run = 0.8 * self.average_run + 0.2 * (time.monotonic() - admitted)
+        task = asyncio.create_task(self.repository.release(session_id))
+        self._releases.add(task)
+        task.add_done_callback(self._releases.discard)
+
+    async def cancel(self, session_id: str) -> Optional[bool]:
+        """
+        Ask whichever worker holds the session's slot to cancel its run,
+        and wait up to `queue_timeout` for the slot to be released.
+
+        Returns None if the session has no slot, else whether it was
+        released in time; the request stands either way.
+        """
+        if not await self.repository.request_cancel(session_id):
+            return None
+        deadline = time.monotonic() + self.queue_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            if await self.repository.slot(session_id) is None:
+                return True
+        return False
+
+    async def metrics(self) -> str:
+        """
+        Metrics of every live worker in the Prometheus text format, each
+        series labelled with its `worker_id`: this worker's as of now, the
+        others' as of their last heartbeat. Each series only comes from
+        its own worker, so counters never go down between scrapes that
+        land on different workers; sum them in the query.
+        """
+        merged = Metrics()
+        merged.merge(telemetry.metrics.snapshot(), worker_id=self.worker_id)
+        try:
+            for worker_id, snapshot in (await self.repository.worker_metrics()).items():
+                merged.merge(json.loads(snapshot), worker_id=worker_id)
+        except Exception as e:
+            logger.warning("Reading worker metrics failed:", extra={"error": str(e)})
+        return merged.render()
+
+    async def capacity(self) -> Capacity:
+        counts = {"running": 0, "queued": 0, "workers": 0}
+        reason = None
+        if self.draining:
+            reason = "draining"
+        elif not self.alive():
+            reason = "heartbeat stale"
+        try:
+            counts = await self.repository.counts()
+        except Exception as e:
+            reason = reason or f"database unavailable: {e}"
+        if reason is None and (
+            counts["running"] >= self.max_running and counts["queued"] >= self.max_queued
+        ):
+            reason = "saturated"
+        return Capacity(
+            ready=reason is None,
+            worker_id=self.worker_id,
+            max_running=self.max_running,
+            max_queued=self.max_queued,
+            reason=reason,
+            **counts,
+        )
+
+    def drain(self) -> None:
+        """Stop admitting runs and report not ready; runs in progress carry on"""
+        self.draining = True
+
+    async def aclose(self) -> None:
+        self.drain()
+        for task in (self._heartbeat, self._cancels):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._heartbeat = self._cancels = None
+        await asyncio.gather(*self._releases, return_exceptions=True)
+        # our slots go with the worker row
+        await self.repository.unregister()
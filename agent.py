@@ -1,41 +1,44 @@
 from clients.anthropic_client import AnthropicClient
+import asyncio
+import contextlib
+import functools
+import inspect
 import logging
+import subprocess
 from clients.anthropic_models import (
     Message,
     Tool,
     ExecuteToolResult,
     AnthropicRequest,
     ToolChoice,
-    ToolResultBlock
+    ToolResultBlock,
+    ToolUseBlock,
+    StreamEvent,
+    Usage,
 )
-from typing import List, Optional, Dict, Any
+from concurrent.futures import Executor, ThreadPoolExecutor
+from clients.context_window import ContextWindow
+from clients.history import HistoryStore
+from clients.prompt_cache import add_cache_breakpoints
+from clients.single_flight import SingleFlight, request_key
+from clients.streaming import StreamAccumulator
+from clients.tool_cache import ToolResultCache
+from repository.session_repository import SessionRepository
+from logging_setup import log_context
+from telemetry import telemetry
+from typing import AsyncIterator, List, Mapping, Optional, Dict, Any, Union
 import uuid
-from clients.tools import (
-    tool_convert_markdown_to_toml_gemini,
-    tool_convert_markdown_to_toml_claude_code,
-    tool_validate_toml,
-    tool_process_errors_claude,
-    convert_markdown_to_toml_gemini,
-    convert_markdown_to_toml_claude_code,
-    validate_toml,
-    process_errors_claude
-)
+from clients.tool_registry import ToolRegistry, ToolSpec
 
-tools = [
-    tool_convert_markdown_to_toml_gemini,
-    tool_convert_markdown_to_toml_claude_code,
-    tool_validate_toml,
-    tool_process_errors_claude,
-]
+# offered to the model when a run doesn't pick its own tools
+DEFAULT_TOOLS = ["convert_markdown_to_toml", "validate_toml", "repair_toml"]
 
-tool_registry = {
-    "convert_markdown_to_toml_gemini": convert_markdown_to_toml_gemini,
-    "convert_markdown_to_toml_claude_code": convert_markdown_to_toml_claude_code,
-    "validate_toml": validate_toml,
-    "process_errors_claude": process_errors_claude,
-}
+# bounded pool shared by every agent in the process for blocking tools
+default_tool_executor = ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="agent-tool")
 
-eval_registry = {"validate_toml": validate_toml}
+# identical calls of the same tool from concurrent sessions share one execution
+default_tool_flight = SingleFlight()
 
 
 class Agent:
@@ -44,10 +47,19 @@ class Agent:
         session_id: Optional[str],
         aclient: AnthropicClient,
         tools: List[Tool],
-        tool_registry: Dict[str, Any],
+        tool_registry: Mapping[str, Any],
         max_iters: int = 4,
         timeout: int = 300,
-        logger: logging.Logger = None
+        logger: logging.Logger = None,
+        tool_choice: Optional[ToolChoice] = None,
+        tool_executor: Optional[Executor] = None,
+        tool_cache: Optional[ToolResultCache] = None,
+        session_store: Optional[SessionRepository] = None,
+        history_limit: int = 50,
+        system: Optional[str] = None,
+        prompt_caching: bool = True,
+        context_window: Optional[ContextWindow] = None,
+        tool_flight: Optional[SingleFlight] = None,
     ) -> None:
         self.session_id = session_id or str(uuid.uuid4())
         self.aclient = aclient
@@ -55,62 +67,281 @@ class Agent:
         self.tool_registry = tool_registry
         self.max_iters = max_iters
         self.timeout = timeout
-        self.messages: List[Message] = []
+        self.messages = HistoryStore()
         self.logger = logger or logging.getLogger(__name__)
+        self.tool_choice = tool_choice or ToolChoice(type="auto")
+        # blocking tools run here so they never stall the event loop
+        self.tool_executor = tool_executor or default_tool_executor
+        self.tool_cache = tool_cache
+        self.tool_flight = tool_flight or default_tool_flight
+        self.system = system
+        self.prompt_caching = prompt_caching
+        self.context_window = context_window or ContextWindow()
+        # conversation persistence: only the tail of a stored session is
+        # loaded and new messages are appended after each turn
+        self.session_store = session_store
+        self.history_limit = history_limit
+        self._session_loaded = False
+        self._next_seq = 0
+        self._persisted = 0
+
+    def build_request(self) -> AnthropicRequest:
+        # only the tools this run was given; every definition is input
+        # tokens on every request
+        tools = self.tools
+        system = self.system
+        messages = self.messages
+        if self.prompt_caching:
+            tools, system, messages = add_cache_breakpoints(
+                tools, system, messages)
+        return AnthropicRequest(
+            model=self.aclient.model,
+            max_tokens=1024,
+            messages=messages,
+            system=system,
+            tools=tools or None,
+            tool_choice=self.tool_choice if tools else None,
+        )
+
+    def compact_history(self) -> None:
+        """Keep the history under the context budget before each request"""
+        removed = self.context_window.fit(self.messages)
+        if removed:
+            # compaction only rewrites turns that were already persisted
+            self._persisted = max(self._persisted - removed, 0)
+            telemetry.metrics.inc("history_compactions_total")
+            self.logger.info(
+                "History compacted:",
+                extra={
+                    "removed_messages": removed,
+                    "estimated_tokens": self.context_window.total,
+                    "history_bytes": self.messages.stats()["resident_bytes"],
+                }
+            )
+
+    def log_usage(self, usage: Usage) -> None:
+        self.logger.info("Model usage:", extra=usage.model_dump())
+
+    async def load_session(self) -> None:
+        """Lazily pull the tail of a stored conversation on first use"""
+        if self.session_store is None or self._session_loaded:
+            return
+        with telemetry.span("session.load", session_id=self.session_id):
+            count, tail = await asyncio.to_thread(
+                self.session_store.load_tail, self.session_id, self.history_limit
+            )
+        self.messages[:0] = tail
+        self._next_seq = count
+        self._persisted = len(tail)
+        self._session_loaded = True
+
+    async def save_session(self) -> None:
+        """Append messages added since the last save in one batch"""
+        if self.session_store is None:
+            return
+        new_messages = self.messages[self._persisted:]
+        if not new_messages:
+            return
+        with telemetry.span("session.save", messages=len(new_messages)):
+            await asyncio.to_thread(
+                self.session_store.append,
+                self.session_id,
+                self._next_seq,
+                new_messages,
+            )
+        self._next_seq += len(new_messages)
+        self._persisted = len(self.messages)
 
     async def run(self, prompt: str) -> str:
+        with (
+            log_context(session_id=self.session_id),
+            telemetry.span("agent.run", session_id=self.session_id),
+        ):
+            try:
+                # one deadline for the whole run, model calls and tools alike
+                async with asyncio.timeout(self.timeout):
+                    return await self._run(prompt)
+            except TimeoutError as e:
+                raise self.deadline_exceeded() from e
+            finally:
+                # between runs the session only holds the compact records
+                self.messages.release()
+
+    async def _run(self, prompt: str) -> str:
+        await self.load_session()
         self.messages.append(Message(role="user", content=prompt))
 
+        result = ""
         for iteration in range(self.max_iters):
-            req = AnthropicRequest(
-                model=self.aclient.model,
-                max_tokens=1024,
-                messages=self.messages,
-                tools=[
-                    tool_convert_markdown_to_toml_gemini
-                ],
-                tool_choice=ToolChoice(type="auto"),
-            )
-            resp = await self.aclient.get(req)
-            # add the response content to our messages
-            self.messages.append(Message(role=resp.role, content=resp.content))
+            with telemetry.span("agent.iteration", iteration=iteration):
+                self.compact_history()
+                resp = await self.aclient.get(self.build_request())
+                self.log_usage(resp.usage)
+                # add the response content to our messages
+                self.messages.append(Message(role=resp.role, content=resp.content))
+
+                tool_uses = [c for c in resp.content if c.type == "tool_use"]
+                if not tool_uses:
+                    text = "".join(c.text for c in resp.content if c.type == "text")
+                    self.logger.info("Model text response: %s", text)
+                    await self.save_session()
+                    return text
+
+                results = await self.execute_tools(tool_uses)
+                for r in results:
+                    if not r.success:
+                        self.logger.error("Error in tool use: %s", r.error_msg)
+                self.messages.append(self.tool_results_message(results))
+                # every tool_use is answered, so this is a safe point to persist
+                await self.save_session()
+                result = results[-1].tool_result
+
+        # out of iterations: hand back the latest tool output
+        return result
 
-            for content in resp.content:
-                match content.type:
-                    case "tool_use":
+    async def run_stream(
+        self, prompt: str
+    ) -> AsyncIterator[Union[StreamEvent, ExecuteToolResult]]:
+        """
+        Streaming variant of `run`.
+
+        Yields model stream events as they arrive and an ExecuteToolResult
+        for every tool call; tool results are sent back to the model until
+        it answers without requesting a tool or `max_iters` is reached.
+        Like `run`, the whole run has to finish within `timeout` seconds.
+        """
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        with (
+            log_context(session_id=self.session_id),
+            telemetry.span("agent.run", session_id=self.session_id, stream=True),
+        ):
+            steps = self._run_stream(prompt)
+            try:
+                while True:
+                    # a timeout scope can't stay open across a yield, so the
+                    # deadline bounds each step; time the consumer spends
+                    # between steps still counts against it
+                    async with asyncio.timeout_at(deadline):
                         try:
-                            result = await self.execute_tool(
-                                tool_use_id=content.id,
-                                tool_name=content.name,
-                                tool_input=content.input
-                            )
-
-                            if result.success:
-                                # process ExecuteToolResult to ToolResultBlock
-                                # so we can send it back to the model
-                                tool_result_block = ToolResultBlock(
-                                    tool_use_id=result.tool_use_id,
-                                    content=result.tool_result,
-                                    is_error=False,
-                                    type="tool_result"
-                                )
-                                self.messages.append(
-                                    Message(role="user",
-                                            content=[tool_result_block])
-                                )
-                                return result.tool_result
-                            else:
-                                error_msg = f"Error in tool use: {
-                                    result.error_msg}"
-                                self.logger.error(error_msg)
-                                return error_msg
-
-                        except Exception as e:
-                            print(str(e))
-                    case "text":
-                        self.logger.info(
-                            f"Model text response: {content.text}")
-                        return content.text
+                            item = await anext(steps)
+                        except StopAsyncIteration:
+                            return
+                    yield item
+            except TimeoutError as e:
+                raise self.deadline_exceeded() from e
+            finally:
+                await steps.aclose()
+                self.messages.release()
+
+    def deadline_exceeded(self) -> TimeoutError:
+        self.logger.error("Agent run timed out:", extra={"timeout": self.timeout})
+        return TimeoutError(f"Agent run timed out after {self.timeout}s")
+
+    async def _run_stream(
+        self, prompt: str
+    ) -> AsyncIterator[Union[StreamEvent, ExecuteToolResult]]:
+        await self.load_session()
+        self.messages.append(Message(role="user", content=prompt))
+
+        for iteration in range(self.max_iters):
+            with telemetry.span("agent.iteration", iteration=iteration):
+                accumulator = StreamAccumulator()
+                self.compact_history()
+                async for event in self.aclient.stream(self.build_request()):
+                    accumulator.add(event)
+                    yield event
+                resp = accumulator.response()
+                self.log_usage(resp.usage)
+                self.messages.append(Message(role=resp.role, content=resp.content))
+
+                tool_uses = [c for c in resp.content if c.type == "tool_use"]
+                if not tool_uses:
+                    await self.save_session()
+                    return
+
+                results = await self.execute_tools(tool_uses)
+                for r in results:
+                    yield r
+                self.messages.append(self.tool_results_message(results))
+                await self.save_session()
+
+    def tool_results_message(self, results: List[ExecuteToolResult]) -> Message:
+        """All results of one assistant turn go back in a single user message"""
+        return Message(
+            role="user",
+            content=[
+                ToolResultBlock(
+                    tool_use_id=r.tool_use_id,
+                    content=r.tool_result,
+                    is_error=not r.success,
+                    type="tool_result"
+                )
+                for r in results
+            ],
+        )
+
+    async def execute_tools(
+        self, tool_uses: List[ToolUseBlock]
+    ) -> List[ExecuteToolResult]:
+        """
+        Run every tool_use block of one assistant turn.
+
+        Blocks are dispatched concurrently, so a turn costs roughly its
+        slowest tool, unless the tool choice disables parallel tool use.
+        Results are returned in the order of `tool_uses`.
+        """
+        if self.tool_choice.disable_parallel_tool_use:
+            return [await self.execute_tool_block(b) for b in tool_uses]
+        return list(
+            await asyncio.gather(*(self.execute_tool_block(b) for b in tool_uses))
+        )
+
+    async def execute_tool_block(self, block: ToolUseBlock) -> ExecuteToolResult:
+        try:
+            return await self.execute_tool(
+                tool_use_id=block.id,
+                tool_name=block.name,
+                tool_input=block.input
+            )
+        except ValueError as e:
+            # unknown tool: report it to the model instead of failing the turn
+            return ExecuteToolResult(
+                success=False,
+                tool_use_id=block.id,
+                tool_name=block.name,
+                session_id=self.session_id,
+                error_msg=str(e),
+                tool_result=str(e)
+            )
+
+    def tool_spec(self, tool_name: str) -> Optional[ToolSpec]:
+        # a plain dict of callables carries no metadata
+        if isinstance(self.tool_registry, ToolRegistry):
+            return self.tool_registry.spec(tool_name)
+        return None
+
+    async def invoke_tool(
+        self,
+        tool_name: str,
+        tool: Any,
+        tool_input: Dict[str, Any],
+        cache_key: Optional[str],
+        spec: Optional[ToolSpec] = None,
+    ) -> Any:
+        is_async = spec.is_async if spec else inspect.iscoroutinefunction(tool)
+        limit = spec.semaphore if spec else None
+        async with limit or contextlib.nullcontext():
+            if is_async:
+                result = await tool(**tool_input)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    self.tool_executor,
+                    functools.partial(tool, **tool_input)
+                )
+        if cache_key is not None and isinstance(result, str):
+            await self.tool_cache.put(tool_name, cache_key, result)
+        return result
 
     async def execute_tool(
         self,
@@ -118,6 +349,30 @@ class Agent:
         tool_name: str,
         tool_input: Dict[str, Any]
     ) -> ExecuteToolResult:
+        with (
+            log_context(session_id=self.session_id),
+            telemetry.span(
+                "tool.execute", tool_name=tool_name, session_id=self.session_id
+            ) as span,
+        ):
+            result = await self._execute_tool(tool_use_id, tool_name, tool_input)
+            outcome = span.attributes.get("outcome") or (
+                "ok" if result.success else "error")
+            span.set(outcome=outcome)
+            telemetry.metrics.inc(
+                "tool_calls_total",
+                tool=tool_name,
+                outcome=outcome,
+                cached=span.attributes.get("cached", False),
+            )
+            return result
+
+    async def _execute_tool(
+        self,
+        tool_use_id: str,
+        tool_name: str,
+        tool_input: Dict[str, Any]
+    ) -> ExecuteToolResult:
 
         if tool_name not in self.tool_registry:
             available_tools = ", ".join(self.tool_registry.keys())
@@ -125,32 +380,67 @@ class Agent:
             Available tools: {available_tools}
             """)
         tool = self.tool_registry[tool_name]
+        spec = self.tool_spec(tool_name)
+        timeout = spec.timeout if spec and spec.timeout else self.timeout
+
+        cache_key = None
+        if self.tool_cache is not None:
+            cache_key = self.tool_cache.key(tool_name, tool_input)
+        if cache_key is not None:
+            cached = await self.tool_cache.get(tool_name, cache_key)
+            if cached is not None:
+                telemetry.current_span().set(cached=True)
+                self.logger.debug(
+                    "Tool result served from cache:",
+                    extra={
+                        "tool_name": tool_name,
+                        "tool_use_id": tool_use_id,
+                    }
+                )
+                return ExecuteToolResult(
+                    success=True,
+                    tool_use_id=tool_use_id,
+                    tool_name=tool_name,
+                    session_id=self.session_id,
+                    tool_result=cached
+                )
+
         try:
-            self.logger.info(
+            self.logger.debug(
                 "Executing tool:",
                 extra={
                     "tool_name": tool_name,
-                    "session_id": self.session_id,
                     "tool_use_id": tool_use_id,
                     "tool_arguments": list(tool_input.keys())
                 }
             )
-            result = tool(**tool_input)
+            # cancelling a CLI tool kills its process group, but only once
+            # every session waiting on the shared call has given up
+            # keyed on the callable too: registries may map one name to
+            # different tools
+            flight_key = request_key(
+                {"tool": tool_name, "callable": id(tool), "input": tool_input})
+            async with asyncio.timeout(timeout):
+                result = await self.tool_flight.do(
+                    flight_key,
+                    lambda: self.invoke_tool(
+                        tool_name, tool, tool_input, cache_key, spec),
+                )
             self.logger.info(
                 "Tool execution completed:",
                 extra={
                     "tool_name": tool_name,
-                    "session_id": self.session_id,
                     "tool_use_id": tool_use_id,
                 }
             )
-            return ExecuteToolResult(
+            execute_result = ExecuteToolResult(
                 success=True,
                 tool_use_id=tool_use_id,
                 tool_name=tool_name,
                 session_id=self.session_id,
                 tool_result=result
             )
+            return execute_result
 
         except TypeError as e:
             error_msg = f"Invalid params for tool: '{tool_name}': {str(e)}"
@@ -159,7 +449,25 @@ class Agent:
                 extra={
                     "tool_name": tool_name,
                     "tool_use_id": tool_use_id,
-                    "session_id": self.session_id,
+                    "error": error_msg
+                }
+            )
+            return ExecuteToolResult(
+                success=False,
+                tool_use_id=tool_use_id,
+                tool_name=tool_name,
+                session_id=self.session_id,
+                error_msg=error_msg,
+                tool_result=error_msg
+            )
+        except (TimeoutError, subprocess.TimeoutExpired):
+            error_msg = f"Tool '{tool_name}' timed out after {timeout}s"
+            telemetry.current_span().set(outcome="timeout")
+            self.logger.error(
+                "Tool execution failed: timeout",
+                extra={
+                    "tool_name": tool_name,
+                    "tool_use_id": tool_use_id,
                     "error": error_msg
                 }
             )
@@ -178,7 +486,6 @@ class Agent:
                 extra={
                     "tool_name": tool_name,
                     "tool_use_id": tool_use_id,
-                    "session_id": self.session_id,
                     "error": error_msg,
                     "error_type": type(e).__name__
                 }
@@ -0,0 +1,288 @@
+import json
+import sqlite3
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Callable, List, Optional, Union
+from admission import AdmissionController, Cancelled, Saturated
+from agent import DEFAULT_TOOLS, Agent
+from clients.anthropic_client import AnthropicClient
+from clients.anthropic_models import ExecuteToolResult, StreamEvent, Tool
+from clients.rate_limiter import Priority
+from clients.tool_cache import ToolResultCache
+from clients.tool_registry import registry as tool_registry
+from config import Config
+from repository.session_repository import SessionRepository
+from secret_manager import SecretManager
+from .agent_models import AgentRunRequest, JobStatus, RunStatus
+from .job_service import JobService
+from .run_registry import AgentRun, RunRegistry
+
+agent_router = APIRouter(prefix="/agent")
+
+
+def get_anthropic_client(request: Request) -> AnthropicClient:
+    return anthropic_client(request.app.state)
+
+
+def anthropic_client(state, priority: Priority = Priority.INTERACTIVE) -> AnthropicClient:
+    # built once per process and priority: fetching the api key is a secret
+    # manager round-trip, and every client shares the lifespan connection
+    # pool and rate limiter, where BATCH requests wait behind INTERACTIVE ones
+    clients = getattr(state, "anthropic_clients", None)
+    if clients is None:
+        clients = state.anthropic_clients = {}
+    if priority not in clients:
+        config = Config()
+        secret_mgr = SecretManager(config.gcp_project_id)
+        clients[priority] = AnthropicClient(
+            config,
+            secret_mgr,
+            config.anthropic_model_sonnet,
+            http_client=state.http_client,
+            rate_limiter=state.rate_limiter,
+            priority=priority,
+        )
+    return clients[priority]
+
+
+def get_tool_cache(request: Request) -> ToolResultCache:
+    return request.app.state.tool_cache
+
+
+def get_session_store(request: Request) -> SessionRepository:
+    return request.app.state.session_store
+
+
+def get_run_registry(request: Request) -> RunRegistry:
+    return request.app.state.run_registry
+
+
+def get_admission(request: Request) -> AdmissionController:
+    return request.app.state.admission
+
+
+def get_job_service(request: Request) -> JobService:
+    return request.app.state.job_service
+
+
+def resolve_tools(body: AgentRunRequest) -> List[Tool]:
+    try:
+        return tool_registry.schemas(
+            DEFAULT_TOOLS if body.tools is None else body.tools)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def build_agent(
+    body: AgentRunRequest,
+    aclient: AnthropicClient,
+    tool_cache: ToolResultCache,
+    session_store: SessionRepository,
+) -> Agent:
+    tools = resolve_tools(body)
+    return Agent(
+        session_id=body.session_id,
+        aclient=aclient,
+        tools=tools,
+        tool_registry=tool_registry,
+        max_iters=body.max_iters,
+        timeout=body.timeout,
+        tool_cache=tool_cache,
+        session_store=session_store,
+    )
+
+
+def job_agent_builder(state) -> Callable[[AgentRunRequest], Agent]:
+    """
+    Agents for queued jobs: nobody waits on them, so their model requests
+    go at BATCH priority and yield the rate limits to interactive runs
+    """
+
+    def build_job_agent(body: AgentRunRequest) -> Agent:
+        return build_agent(
+            body, anthropic_client(state, Priority.BATCH), state.tool_cache,
+            state.session_store)
+
+    return build_job_agent
+
+
+async def start_run(
+    run_registry: RunRegistry,
+    admission: AdmissionController,
+    agent: Agent,
+    prompt: str,
+) -> AgentRun:
+    """Admit the run against the capacity shared by every worker, then start it"""
+    session_id = agent.session_id
+    try:
+        await admission.acquire(session_id)
+    except (ValueError, Cancelled) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Saturated as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    try:
+        run = run_registry.start(agent, prompt)
+    except ValueError as e:
+        admission.release(session_id)
+        raise HTTPException(status_code=409, detail=str(e))
+    run.task.add_done_callback(lambda _: admission.release(session_id))
+    return run
+
+
+def slot_status(slot: sqlite3.Row, status: Optional[str] = None) -> RunStatus:
+    """What is known of a run from its admission slot, e.g. on another worker"""
+    return RunStatus(
+        session_id=slot["session_id"],
+        status=status or slot["state"],
+        started_at=datetime.fromtimestamp(slot["created_at"], timezone.utc),
+        worker_id=slot["worker_id"],
+    )
+
+
+def to_sse(event: Union[StreamEvent, ExecuteToolResult]) -> str:
+    if isinstance(event, ExecuteToolResult):
+        return f"event: tool_result\ndata: {event.model_dump_json()}\n\n"
+    data = event.model_dump_json(exclude_none=True)
+    return f"event: {event.type}\ndata: {data}\n\n"
+
+
+@agent_router.post("/stream")
+async def stream_agent(
+    body: AgentRunRequest,
+    aclient: AnthropicClient = Depends(get_anthropic_client),
+    tool_cache: ToolResultCache = Depends(get_tool_cache),
+    session_store: SessionRepository = Depends(get_session_store),
+    run_registry: RunRegistry = Depends(get_run_registry),
+    admission: AdmissionController = Depends(get_admission),
+) -> StreamingResponse:
+    """Run the agent and relay model tokens and tool results as SSE"""
+    agent = build_agent(body, aclient, tool_cache, session_store)
+    run = await start_run(run_registry, admission, agent, body.prompt)
+    run_events = run.subscribe()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event in run_events:
+                yield to_sse(event)
+            if run.status != "done":
+                data = json.dumps({"message": run.error, "status": run.status})
+                yield f"event: error\ndata: {data}\n\n"
+        finally:
+            # the client went away: nobody is left to read the run
+            run.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Session-Id": agent.session_id},
+    )
+
+
+@agent_router.post("/runs", status_code=202)
+async def start_agent_run(
+    body: AgentRunRequest,
+    aclient: AnthropicClient = Depends(get_anthropic_client),
+    tool_cache: ToolResultCache = Depends(get_tool_cache),
+    session_store: SessionRepository = Depends(get_session_store),
+    run_registry: RunRegistry = Depends(get_run_registry),
+    admission: AdmissionController = Depends(get_admission),
+) -> RunStatus:
+    """Start a run in the background; poll it with GET /agent/runs/{session_id}"""
+    agent = build_agent(body, aclient, tool_cache, session_store)
+    run = await start_run(run_registry, admission, agent, body.prompt)
+    return run.snapshot()
+
+
+@agent_router.get("/runs")
+async def list_agent_runs(
+    run_registry: RunRegistry = Depends(get_run_registry),
+    admission: AdmissionController = Depends(get_admission),
+) -> List[RunStatus]:
+    """Runs in progress on every worker"""
+    runs = [run.snapshot() for run in run_registry.running()]
+    return runs + [slot_status(slot) for slot in await admission.repository.others()]
+
+
+@agent_router.get("/runs/{session_id}")
+async def get_agent_run(
+    session_id: str,
+    run_registry: RunRegistry = Depends(get_run_registry),
+    admission: AdmissionController = Depends(get_admission),
+) -> RunStatus:
+    """
+    The run's status; a run on another worker only shows its state there,
+    and a run that finished on another worker is not found
+    """
+    run = run_registry.get(session_id)
+    if run is None or run.status != "running":
+        slot = await admission.repository.slot(session_id)
+        if slot is not None and (run is None or slot["worker_id"] != admission.worker_id):
+            return slot_status(slot)
+    if run is None:
+        raise HTTPException(status_code=404, detail="run not found")
+    return run.snapshot()
+
+
+@agent_router.delete("/runs/{session_id}")
+async def cancel_agent_run(
+    session_id: str,
+    run_registry: RunRegistry = Depends(get_run_registry),
+    admission: AdmissionController = Depends(get_admission),
+) -> RunStatus:
+    """Cancel a run; returns once its model request and tools are stopped"""
+    run = run_registry.get(session_id)
+    if run is not None and run.status == "running":
+        await run_registry.cancel(session_id)
+        return run.snapshot()
+    # anywhere else, the worker holding the run's slot cancels it
+    slot = await admission.repository.slot(session_id)
+    if slot is None:
+        if run is None:
+            raise HTTPException(status_code=404, detail="run not found")
+        return run.snapshot()
+    stopped = await admission.cancel(session_id)
+    if stopped is None:
+        # it ended on its worker in the meantime
+        raise HTTPException(status_code=404, detail="run not found")
+    if not stopped:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Cancel requested; the run on worker {slot['worker_id']} "
+                   "has not stopped yet",
+        )
+    return slot_status(slot, "cancelled")
+
+
+@agent_router.post("/jobs", status_code=202)
+async def submit_agent_job(
+    body: AgentRunRequest,
+    job_service: JobService = Depends(get_job_service),
+) -> JobStatus:
+    """Queue a run; workers pick it up as capacity allows. Poll GET /agent/jobs/{job_id}"""
+    resolve_tools(body)
+    return await job_service.submit(body)
+
+
+@agent_router.get("/jobs/dead")
+async def list_dead_jobs(
+    limit: int = Query(100, ge=1, le=1000),
+    job_service: JobService = Depends(get_job_service),
+) -> List[JobStatus]:
+    """Dead-lettered jobs: out of attempts or cancelled"""
+    return await job_service.dead_letters(limit)
+
+
+@agent_router.get("/jobs/{job_id}")
+async def get_agent_job(
+    job_id: str,
+    job_service: JobService = Depends(get_job_service),
+) -> JobStatus:
+    status = await job_service.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return status
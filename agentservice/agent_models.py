@@ -0,0 +1,42 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+
+class AgentRunRequest(BaseModel):
+    prompt: str = Field(min_length=1)
+    session_id: Optional[str] = None
+    max_iters: int = Field(4, ge=1, le=20)
+    # hard deadline for the whole run, in seconds
+    timeout: int = Field(300, ge=1, le=3600)
+    tools: Optional[List[str]] = Field(
+        None, description="Tools offered to the model; defaults to the converter set")
+
+
+class RunStatus(BaseModel):
+    session_id: str
+    status: Literal["queued", "running", "done", "failed", "cancelled", "timed_out"]
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    timeout: Optional[int] = None
+    worker_id: Optional[str] = Field(
+        None, description="Worker holding the run, when it is not the one answering")
+    iterations: int = 0
+    tool_calls: int = 0
+    result: Optional[str] = Field(
+        None, description="Text of the final model turn, once done")
+    error: Optional[str] = None
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    session_id: str
+    # leased: a worker is running it; dead: out of attempts (dead-lettered)
+    status: Literal["queued", "leased", "done", "dead"]
+    attempts: int
+    max_attempts: int
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[str] = Field(
+        None, description="Text of the final model turn, once done")
+    error: Optional[str] = Field(None, description="Error of the last attempt")
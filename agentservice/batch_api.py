@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from .batch_models import BatchResults, BatchStatus, BatchSubmitRequest
+from .batch_service import BatchService
+
+batch_router = APIRouter(prefix="/batches")
+
+
+def get_batch_service(request: Request) -> BatchService:
+    return request.app.state.batch_service
+
+
+@batch_router.post("", status_code=202)
+async def submit_batch(
+    body: BatchSubmitRequest,
+    batch_service: BatchService = Depends(get_batch_service),
+) -> dict:
+    try:
+        batch_id = await batch_service.submit(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"batch_id": batch_id}
+
+
+@batch_router.get("/{batch_id}")
+async def get_batch(
+    batch_id: str,
+    batch_service: BatchService = Depends(get_batch_service),
+) -> BatchStatus:
+    status = await batch_service.status(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="batch not found")
+    return status
+
+
+@batch_router.get("/{batch_id}/results")
+async def get_batch_results(
+    batch_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    batch_service: BatchService = Depends(get_batch_service),
+) -> BatchResults:
+    if await batch_service.status(batch_id) is None:
+        raise HTTPException(status_code=404, detail="batch not found")
+    return await batch_service.results(batch_id, offset, limit)
@@ -0,0 +1,42 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
+
+
+class BatchSubmitRequest(BaseModel):
+    # either a directory to scan or an explicit manifest of files
+    directory: Optional[str] = None
+    pattern: str = "*.md"
+    paths: Optional[List[str]] = None
+    output_dir: Optional[str] = None  # also write <name>.toml files here
+
+    @model_validator(mode="after")
+    def check_source(self) -> "BatchSubmitRequest":
+        if not self.directory and not self.paths:
+            raise ValueError("either `directory` or `paths` is required")
+        return self
+
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    status: Literal["running", "done"]
+    total: int
+    pending: int = 0
+    running: int = 0
+    done: int = 0
+    failed: int = 0
+
+
+class BatchItemResult(BaseModel):
+    item_id: int
+    path: str
+    status: Literal["pending", "running", "done", "failed"]
+    attempts: int
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResults(BaseModel):
+    batch_id: str
+    items: List[BatchItemResult]
+    next_offset: Optional[int] = Field(
+        None, description="Offset of the next page, if any")
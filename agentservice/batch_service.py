@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from agent import Agent
+from clients.tool_cache import ToolResultCache
+from clients.toml_repair import repair
+from logging_setup import log_context
+from repository.batch_repository import BatchRepository
+from .batch_models import (
+    BatchItemResult,
+    BatchResults,
+    BatchStatus,
+    BatchSubmitRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BatchService:
+    """
+    Bulk markdown -> TOML conversion.
+
+    A batch is a list of markdown files fanned out over a bounded pool of
+    workers shared by every batch in the process. Each worker converts one
+    file, repairs the TOML locally (escalating to process_errors_claude
+    only for errors the rules can't fix) and checkpoints the outcome, so a
+    restarted service resumes an interrupted batch from the files that
+    never finished. Every path a request names, and the output
+    directory, must resolve inside `root`. A batch belongs to the worker
+    process that runs it;
+    when that worker stops heartbeating, another one takes it over.
+    """
+
+    def __init__(
+        self,
+        repository: BatchRepository,
+        tool_registry: Dict[str, Any],
+        tool_cache: Optional[ToolResultCache] = None,
+        max_workers: int = 8,
+        max_repairs: int = 2,
+        timeout: int = 300,
+        converter: str = "convert_markdown_to_toml",
+        worker_id: str = "local",
+        worker_ttl: float = 15.0,
+        root: str = "data/batches",
+    ) -> None:
+        self.repository = repository
+        self.tool_registry = tool_registry
+        self.tool_cache = tool_cache
+        self.max_workers = max_workers
+        self.max_repairs = max_repairs
+        self.timeout = timeout
+        self.converter = converter
+        self.worker_id = worker_id
+        self.worker_ttl = worker_ttl
+        self.root = Path(root).resolve()
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, request: BatchSubmitRequest) -> str:
+        """
+        Raises:
+            ValueError: If a path is missing or outside the batch root
+        """
+        paths = self.resolve_paths(request)
+        output_dir = None
+        if request.output_dir:
+            output_dir = str(self.confine(request.output_dir))
+            if not Path(output_dir).is_dir():
+                raise ValueError(f"Not a directory: {request.output_dir}")
+        batch_id = str(uuid.uuid4())
+        source = str(self.confine(request.directory)) if request.directory else "manifest"
+        await self.repository.create(
+            batch_id, source, output_dir, paths, self.worker_id)
+        self.start(batch_id)
+        return batch_id
+
+    def start(self, batch_id: str) -> None:
+        # the task inherits the context, so every record it logs has the id
+        with log_context(batch_id=batch_id):
+            task = asyncio.create_task(self.run(batch_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def resume(self) -> None:
+        """Restart batches left running by a worker that is gone"""
+        live_since = time.time() - self.worker_ttl
+        for batch_id in await self.repository.claim_orphaned(self.worker_id, live_since):
+            logger.info("Resuming batch", extra={"batch_id": batch_id})
+            self.start(batch_id)
+
+    def watch(self) -> None:
+        """Resume orphaned batches now and every `worker_ttl` seconds"""
+
+        async def resume_forever() -> None:
+            while True:
+                try:
+                    await self.resume()
+                except Exception as e:
+                    logger.warning("Resuming batches failed:", extra={"error": str(e)})
+                await asyncio.sleep(self.worker_ttl)
+
+        task = asyncio.create_task(resume_forever())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self, batch_id: str) -> None:
+        batch = await self.repository.get(batch_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in await self.repository.unfinished_items(batch_id):
+            queue.put_nowait(item)
+        # outputs mirror the tree under the scanned directory
+        base = self.root if batch["source"] == "manifest" else Path(batch["source"])
+
+        async def worker() -> None:
+            while not queue.empty():
+                item = queue.get_nowait()
+                async with self.semaphore:
+                    await self.run_item(
+                        batch_id, item["item_id"], item["path"], batch["output_dir"],
+                        base)
+
+        workers = min(self.max_workers, queue.qsize())
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        await self.repository.finish(batch_id)
+        logger.info("Batch finished")
+
+    async def run_item(
+        self,
+        batch_id: str,
+        item_id: int,
+        path: str,
+        output_dir: Optional[str],
+        base: Optional[Path] = None,
+    ) -> None:
+        await self.repository.start_item(batch_id, item_id)
+        try:
+            markdown = await asyncio.to_thread(Path(path).read_text, encoding="utf-8")
+            toml = await self.convert(f"batch:{batch_id}:{item_id}", markdown)
+            if output_dir:
+                # mirror the source tree so git/commit.md and hg/commit.md
+                # don't overwrite each other
+                relative = Path(path).relative_to(base or self.root)
+                target = Path(output_dir) / relative.with_suffix(".toml")
+                await asyncio.to_thread(self.write, target, toml)
+        except Exception as e:
+            logger.error(
+                "Batch item failed",
+                extra={"item_id": item_id, "error": str(e)},
+            )
+            await self.repository.finish_item(batch_id, item_id, error=str(e))
+            return
+        await self.repository.finish_item(batch_id, item_id, result=toml)
+
+    async def convert(self, session_id: str, markdown: str) -> str:
+        # tool execution only: the pipeline is fixed, so no model turns
+        agent = Agent(
+            session_id=session_id,
+            aclient=None,
+            tools=[],
+            tool_registry=self.tool_registry,
+            timeout=self.timeout,
+            tool_cache=self.tool_cache,
+        )
+        converted = await agent.execute_tool(
+            tool_use_id="convert",
+            tool_name=self.converter,
+            tool_input={"markdown_doc": markdown},
+        )
+        if not converted.success:
+            raise RuntimeError(converted.error_msg)
+        toml = converted.tool_result
+
+        for attempt in range(self.max_repairs + 1):
+            repaired = repair(toml)
+            if repaired.valid:
+                return repaired.toml
+            errors = repaired.report.describe()
+            if attempt == self.max_repairs:
+                break
+            fixed = await agent.execute_tool(
+                tool_use_id=f"repair-{attempt}",
+                tool_name="process_errors_claude",
+                tool_input={"tomlfile": repaired.toml, "errors": errors},
+            )
+            if not fixed.success:
+                raise RuntimeError(fixed.error_msg)
+            toml = fixed.tool_result
+        raise ValueError(f"TOML still invalid after {self.max_repairs} repairs: {errors}")
+
+    async def status(self, batch_id: str) -> Optional[BatchStatus]:
+        batch = await self.repository.get(batch_id)
+        if batch is None:
+            return None
+        counts = await self.repository.counts(batch_id)
+        return BatchStatus(
+            batch_id=batch_id,
+            status=batch["status"],
+            total=sum(counts.values()),
+            **counts,
+        )
+
+    async def results(self, batch_id: str, offset: int, limit: int) -> BatchResults:
+        rows = await self.repository.items(batch_id, offset, limit + 1)
+        items = [BatchItemResult(**dict(r)) for r in rows[:limit]]
+        return BatchResults(
+            batch_id=batch_id,
+            items=items,
+            next_offset=offset + limit if len(rows) > limit else None,
+        )
+
+    async def aclose(self) -> None:
+        # unfinished items stay 'running' and are picked up by resume()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @staticmethod
+    def write(target: Path, toml: str) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(toml, encoding="utf-8")
+
+    def confine(self, path: str) -> Path:
+        """
+        `path` resolved against the batch root, symlinks included.
+
+        Raises:
+            ValueError: If it points outside the root
+        """
+        resolved = (self.root / path).resolve()
+        if not resolved.is_relative_to(self.root):
+            raise ValueError(f"Path is outside the batch root: {path}")
+        return resolved
+
+    def resolve_paths(self, request: BatchSubmitRequest) -> List[str]:
+        if request.paths:
+            return [str(self.confine(p)) for p in request.paths]
+        directory = self.confine(request.directory)
+        if not directory.is_dir():
+            raise ValueError(f"Not a directory: {request.directory}")
+        return sorted(
+            str(self.confine(p)) for p in directory.rglob(request.pattern) if p.is_file())
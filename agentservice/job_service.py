@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Set
+from admission import AdmissionController, Cancelled, Saturated
+from agent import Agent
+from logging_setup import log_context
+from repository.job_queue import JobQueue
+from telemetry import telemetry
+from .agent_models import AgentRunRequest, JobStatus
+from .run_registry import AgentRun, RunRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def to_status(row: sqlite3.Row) -> JobStatus:
+    return JobStatus(
+        job_id=row["job_id"],
+        session_id=row["session_id"],
+        status=row["status"],
+        attempts=row["attempts"],
+        max_attempts=row["max_attempts"],
+        created_at=datetime.fromtimestamp(row["created_at"], timezone.utc),
+        updated_at=datetime.fromtimestamp(row["updated_at"], timezone.utc),
+        result=row["result"],
+        error=row["error"],
+    )
+
+
+class JobService:
+    """
+    Agent runs queued in SQLite and worked off at a steady rate.
+
+    Submitting only stores the request, so a burst of submissions becomes
+    a backlog instead of a burst of model calls. Every worker process
+    leases up to `concurrency` jobs at a time and runs each through the
+    run registry (so it shows under /agent/runs and can be cancelled) and
+    the shared admission budget, heartbeating the lease while it runs.
+    Failed runs are retried with exponential backoff and dead-lettered
+    after `max_attempts`; a job leased by a worker that died becomes
+    visible again after `visibility_timeout`, so work survives restarts.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        build_agent: Callable[[AgentRunRequest], Agent],
+        run_registry: RunRegistry,
+        admission: AdmissionController,
+        worker_id: str = "local",
+        concurrency: int = 4,
+        visibility_timeout: float = 60.0,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0,
+        poll_interval: float = 1.0,
+    ) -> None:
+        self.queue = queue
+        self.build_agent = build_agent
+        self.run_registry = run_registry
+        self.admission = admission
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[asyncio.Task] = None
+
+    async def submit(self, request: AgentRunRequest) -> JobStatus:
+        # fixed now so every attempt continues the same conversation
+        request = request.model_copy(
+            update={"session_id": request.session_id or str(uuid.uuid4())})
+        job_id = await self.queue.enqueue(
+            request.session_id, request.model_dump_json(), self.max_attempts)
+        telemetry.metrics.inc("jobs_enqueued_total")
+        self._wakeup.set()
+        return await self.status(job_id)
+
+    async def status(self, job_id: str) -> Optional[JobStatus]:
+        row = await self.queue.get(job_id)
+        return to_status(row) if row is not None else None
+
+    async def dead_letters(self, limit: int = 100) -> List[JobStatus]:
+        return [to_status(r) for r in await self.queue.by_status("dead", limit)]
+
+    def start(self) -> None:
+        if self._runner is None:
+            self._runner = asyncio.create_task(self.run_forever())
+
+    async def run_forever(self) -> None:
+        while True:
+            # set again by submissions and finished jobs from here on
+            self._wakeup.clear()
+            free = self.concurrency - len(self._tasks)
+            jobs: List[sqlite3.Row] = []
+            if free > 0:
+                try:
+                    jobs = await self.queue.lease(
+                        self.worker_id, self.visibility_timeout, free)
+                except Exception as e:
+                    logger.warning("Leasing jobs failed:", extra={"error": str(e)})
+            for job in jobs:
+                with log_context(job_id=job["job_id"], session_id=job["session_id"]):
+                    task = asyncio.create_task(self.process(job))
+                self._tasks.add(task)
+                task.add_done_callback(self.done)
+            if len(jobs) < free:
+                # nothing else due: wait for a submission here or the next poll
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+            elif free <= 0:
+                await self._wakeup.wait()
+
+    def done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._wakeup.set()
+
+    async def process(self, job: sqlite3.Row) -> None:
+        job_id = job["job_id"]
+        telemetry.metrics.observe(
+            "job_queue_wait_seconds", time.time() - job["created_at"])
+        request = AgentRunRequest.model_validate_json(job["payload"])
+        try:
+            await self.admission.acquire(request.session_id)
+        except (ValueError, Saturated) as e:
+            # no capacity, or the session is busy: not the job's fault
+            delay = e.retry_after if isinstance(e, Saturated) else self.retry_delay
+            await self.queue.release(job_id, self.worker_id, delay)
+            telemetry.metrics.inc("jobs_total", outcome="deferred")
+            return
+        except Cancelled as e:
+            await self.finish(job, "cancelled", str(e))
+            return
+        except asyncio.CancelledError:
+            await self.queue.release(job_id, self.worker_id)
+            raise
+
+        run: Optional[AgentRun] = None
+        try:
+            run = self.run_registry.start(self.build_agent(request), request.prompt)
+            await self.keep_leased(job_id, run)
+        except asyncio.CancelledError:
+            # shutting down: hand the job straight to another worker
+            if run is not None:
+                run.cancel()
+                await run.wait()
+            await self.queue.release(job_id, self.worker_id)
+            telemetry.metrics.inc("jobs_total", outcome="released")
+            raise
+        except Exception as e:
+            await self.finish(job, "failed", str(e))
+            return
+        finally:
+            self.admission.release(request.session_id)
+        await self.finish(job, run.status, run.error, run.snapshot().result)
+
+    async def keep_leased(self, job_id: str, run: AgentRun) -> None:
+        """Wait for the run, extending the lease until it ends"""
+        interval = self.visibility_timeout / 3
+        while True:
+            await asyncio.wait([run.task], timeout=interval)
+            if run.task.done():
+                return
+            if not await self.queue.heartbeat(job_id, self.worker_id, self.visibility_timeout):
+                # another worker has the job now; don't run it twice
+                logger.warning("Job lease lost:", extra={"job_id": job_id})
+                run.cancel()
+                await run.wait()
+                return
+
+    async def finish(
+        self,
+        job: sqlite3.Row,
+        status: str,
+        error: Optional[str],
+        result: Optional[str] = None,
+    ) -> None:
+        job_id = job["job_id"]
+        if status == "done":
+            if await self.queue.ack(job_id, self.worker_id, result):
+                telemetry.metrics.inc("jobs_total", outcome="done")
+            return
+        delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+        # a run cancelled through the API is not retried
+        outcome = await self.queue.fail(
+            job_id, self.worker_id, error or status, delay, retry=status != "cancelled")
+        if outcome is None:
+            return
+        if outcome == "dead":
+            logger.error("Job dead-lettered:", extra={"job_id": job_id, "error": error})
+        telemetry.metrics.inc(
+            "jobs_total", outcome="dead" if outcome == "dead" else "retried")
+
+    async def aclose(self) -> None:
+        # leased jobs are released, not lost: another worker runs them
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Union
+from agent import Agent
+from clients.anthropic_models import ExecuteToolResult, StreamEvent
+from logging_setup import log_context
+from telemetry import telemetry
+from .agent_models import RunStatus
+
+logger = logging.getLogger(__name__)
+
+RunEvent = Union[StreamEvent, ExecuteToolResult]
+
+
+class AgentRun:
+    """One agent run driven by the registry, and what it has done so far"""
+
+    def __init__(self, session_id: str, timeout: int) -> None:
+        self.session_id = session_id
+        self.timeout = timeout
+        self.status = "running"
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self.iterations = 0
+        self.tool_calls = 0
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._text: List[str] = []
+        self._subscribers: List[asyncio.Queue] = []
+
+    def observe(self, event: RunEvent) -> None:
+        if isinstance(event, ExecuteToolResult):
+            self.tool_calls += 1
+        elif event.type == "message_start":
+            self.iterations += 1
+            self._text = []
+        elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+            self._text.append(event.delta.text)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.now(timezone.utc)
+        telemetry.metrics.inc("agent_runs_total", status=status)
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+    def subscribe(self) -> AsyncIterator[RunEvent]:
+        """
+        Events from now until the run ends.
+
+        The subscription is registered before this returns, so calling it
+        right after `RunRegistry.start` misses nothing.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        if self.status == "running":
+            self._subscribers.append(queue)
+        else:
+            queue.put_nowait(None)
+        return self._drain(queue)
+
+    async def _drain(self, queue: asyncio.Queue) -> AsyncIterator[RunEvent]:
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+        finally:
+            if queue in self._subscribers:
+                self._subscribers.remove(queue)
+
+    def cancel(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def wait(self) -> None:
+        if self.task is not None:
+            await asyncio.wait([self.task])
+
+    def snapshot(self) -> RunStatus:
+        return RunStatus(
+            session_id=self.session_id,
+            status=self.status,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            timeout=self.timeout,
+            iterations=self.iterations,
+            tool_calls=self.tool_calls,
+            result="".join(self._text) if self.status == "done" else None,
+            error=self.error,
+        )
+
+
+class RunRegistry:
+    """
+    Agent runs keyed by session id.
+
+    Every run is a task owned by the registry rather than by the request
+    that started it, so it can be inspected and cancelled from any other
+    request. Cancelling the task aborts the in-flight model request and
+    kills the process group of a running CLI tool; the agent and its
+    history are dropped as soon as the task ends. A session has at most
+    one run at a time, and the most recent finished runs are kept for
+    inspection.
+    """
+
+    def __init__(self, max_finished: int = 1000) -> None:
+        self.max_finished = max_finished
+        self._running: Dict[str, AgentRun] = {}
+        self._finished: OrderedDict[str, AgentRun] = OrderedDict()
+
+    def start(self, agent: Agent, prompt: str) -> AgentRun:
+        """
+        Raises:
+            ValueError: If the session already has a run in progress
+        """
+        session_id = agent.session_id
+        if session_id in self._running:
+            raise ValueError(f"Session already has a run in progress: {session_id}")
+        run = AgentRun(session_id, agent.timeout)
+        self._finished.pop(session_id, None)
+        self._running[session_id] = run
+        with log_context(session_id=session_id):
+            run.task = asyncio.create_task(self.drive(run, agent, prompt))
+        # drive() retires the run itself, unless it never got to start
+        run.task.add_done_callback(lambda _: self.retire(run))
+        return run
+
+    async def drive(self, run: AgentRun, agent: Agent, prompt: str) -> None:
+        try:
+            async for event in agent.run_stream(prompt):
+                run.observe(event)
+        except asyncio.CancelledError:
+            logger.info("Agent run cancelled")
+            run.finish("cancelled", "Run cancelled")
+            raise
+        except TimeoutError as e:
+            run.finish("timed_out", str(e))
+        except Exception as e:
+            logger.error(
+                "Agent run failed:",
+                extra={"error": str(e), "error_type": type(e).__name__},
+            )
+            run.finish("failed", str(e))
+        else:
+            run.finish("done")
+        finally:
+            self.retire(run)
+
+    def retire(self, run: AgentRun) -> None:
+        if self._running.get(run.session_id) is not run:
+            return
+        del self._running[run.session_id]
+        if run.status == "running":
+            run.finish("cancelled", "Run cancelled")
+        self._finished[run.session_id] = run
+        while len(self._finished) > self.max_finished:
+            self._finished.popitem(last=False)
+
+    def get(self, session_id: str) -> Optional[AgentRun]:
+        return self._running.get(session_id) or self._finished.get(session_id)
+
+    def running(self) -> List[AgentRun]:
+        return list(self._running.values())
+
+    def cancel_nowait(self, session_id: str) -> None:
+        """Start cancelling the session's run, if it is running here"""
+        run = self._running.get(session_id)
+        if run is not None:
+            run.cancel()
+
+    async def cancel(self, session_id: str) -> Optional[AgentRun]:
+        """Cancel a run and wait until its resources are released"""
+        run = self.get(session_id)
+        if run is not None:
+            run.cancel()
+            await run.wait()
+        return run
+
+    async def aclose(self) -> None:
+        runs = self.running()
+        for run in runs:
+            run.cancel()
+        await asyncio.gather(*(run.wait() for run in runs))
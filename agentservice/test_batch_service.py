@@ -0,0 +1,153 @@
+import asyncio
+import time
+import pytest
+from agentservice.batch_models import BatchSubmitRequest
+from agentservice.batch_service import BatchService
+from repository.async_database import AsyncSQLite3Database
+from repository.batch_repository import BatchRepository
+from repository.database import SQLite3ConnectionPool
+
+
+async def fake_convert(markdown_doc: str) -> str:
+    await asyncio.sleep(0.01)
+    if "broken" in markdown_doc:
+        return 'title = "unterminated'
+    return f'title = "{markdown_doc.strip()}"'
+
+
+async def fake_repair(tomlfile: str, errors: str) -> str:
+    return tomlfile + '"'
+
+
+registry = {
+    "convert_markdown_to_toml": fake_convert,
+    "process_errors_claude": fake_repair,
+}
+
+
+@pytest.fixture
+def repository(db):
+    pool = SQLite3ConnectionPool(db.db_path, readers=2)
+    adb = AsyncSQLite3Database(pool)
+    yield BatchRepository(adb)
+    adb.close()
+    pool.close()
+
+
+@pytest.fixture
+def docs(tmp_path):
+    src = tmp_path / "commands"
+    src.mkdir()
+    for i in range(5):
+        (src / f"cmd{i}.md").write_text(f"command {i}")
+    (src / "broken.md").write_text("broken")
+    (src / "notes.txt").write_text("skip me")
+    return src
+
+
+async def test_directory_batch_converts_repairs_and_writes(repository, docs, tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    service = BatchService(repository, registry, max_workers=3, root=str(tmp_path))
+    batch_id = await service.submit(
+        BatchSubmitRequest(directory="commands", output_dir="out"))
+    await asyncio.gather(*service._tasks)
+
+    status = await service.status(batch_id)
+    assert (status.status, status.total, status.done) == ("done", 6, 6)
+    assert (out / "broken.toml").read_text() == 'title = "unterminated"'
+    results = await service.results(batch_id, offset=0, limit=4)
+    assert results.next_offset == 4
+    assert results.items[1].result == 'title = "command 0"'
+
+
+async def test_paths_are_confined_to_the_root_and_outputs_mirror_the_tree(
+    repository, tmp_path
+):
+    root = tmp_path / "root"
+    for vcs in ("git", "hg"):
+        (root / "commands" / vcs).mkdir(parents=True)
+        (root / "commands" / vcs / "commit.md").write_text(f"{vcs} commit")
+    (root / "out").mkdir()
+    (tmp_path / "secret.md").write_text("secret")
+    (root / "commands" / "link.txt").symlink_to(tmp_path / "secret.md")
+    service = BatchService(repository, registry, root=str(root))
+
+    for request in (
+        BatchSubmitRequest(paths=["../secret.md"]),
+        BatchSubmitRequest(paths=[str(tmp_path / "secret.md")]),
+        BatchSubmitRequest(directory=str(tmp_path)),
+        BatchSubmitRequest(directory="commands", output_dir=str(tmp_path)),
+        # a symlink inside the root can't lead out of it either
+        BatchSubmitRequest(directory="commands", pattern="*.txt"),
+    ):
+        with pytest.raises(ValueError):
+            await service.submit(request)
+
+    await service.submit(BatchSubmitRequest(directory="commands", output_dir="out"))
+    await asyncio.gather(*service._tasks)
+    assert (root / "out" / "git" / "commit.toml").read_text() == 'title = "git commit"'
+    assert (root / "out" / "hg" / "commit.toml").read_text() == 'title = "hg commit"'
+
+
+async def test_interrupted_batch_resumes_unfinished_items(repository, docs):
+    paths = sorted(str(p) for p in docs.glob("cmd*.md"))
+    await repository.create("b1", "manifest", None, paths)
+    await repository.start_item("b1", 0)
+    await repository.finish_item("b1", 0, result="kept")
+    await repository.start_item("b1", 1)  # worker died here
+
+    service = BatchService(repository, registry)
+    await service.resume()
+    await asyncio.gather(*service._tasks)
+
+    items = {r["item_id"]: r for r in await repository.items("b1", 0, 10)}
+    assert items[0]["result"] == "kept"
+    assert items[0]["attempts"] == 1
+    assert items[1]["attempts"] == 2
+    assert all(r["status"] == "done" for r in items.values())
+    assert (await service.status("b1")).status == "done"
+
+
+async def test_batches_of_live_workers_are_not_taken_over(repository, docs):
+    paths = sorted(str(p) for p in docs.glob("cmd*.md"))
+    now = time.time()
+    await repository.db.execute(
+        "INSERT INTO workers (worker_id, pid, started_at, heartbeat_at) "
+        "VALUES ('a', 1, ?, ?)", (now, now))
+    await repository.create("b1", "manifest", None, paths, worker_id="a")
+
+    service = BatchService(repository, registry, worker_id="b")
+    await service.resume()
+    assert not service._tasks
+
+    # worker a is gone
+    await repository.db.execute("DELETE FROM workers WHERE worker_id = 'a'")
+    await service.resume()
+    await asyncio.gather(*service._tasks)
+    assert (await service.status("b1")).status == "done"
+    assert (await repository.get("b1"))["worker_id"] == "b"
+
+
+async def test_common_mistakes_are_repaired_without_claude(repository, tmp_path):
+    repairs = []
+
+    async def fenced_convert(markdown_doc: str) -> str:
+        return f'```toml\ntitle = "{markdown_doc}"\n```'
+
+    async def counting_repair(tomlfile: str, errors: str) -> str:
+        repairs.append(errors)
+        return tomlfile
+
+    doc = tmp_path / "cmd.md"
+    doc.write_text("say hi")
+    service = BatchService(repository, {
+        "convert_markdown_to_toml": fenced_convert,
+        "process_errors_claude": counting_repair,
+    }, root=str(tmp_path))
+    batch_id = await service.submit(BatchSubmitRequest(paths=[str(doc)]))
+    await asyncio.gather(*service._tasks)
+
+    results = await service.results(batch_id, offset=0, limit=1)
+    assert results.items[0].result == 'title = "say hi"\n'
+    assert repairs == []
@@ -0,0 +1,162 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+from admission import AdmissionController
+from agent import Agent
+from agentservice import agent_api
+from agentservice.agent_models import AgentRunRequest
+from agentservice.job_service import JobService
+from agentservice.run_registry import RunRegistry
+from agentservice.test_run_registry import StreamingClient, tool_turn
+from clients.anthropic_models import TextBlock
+from clients.anthropic_stub import StubSecretManager
+from clients.rate_limiter import Priority, RateLimitScheduler
+from clients.single_flight import SingleFlight
+from repository.admission_repository import AdmissionRepository
+from repository.async_database import AsyncSQLite3Database
+from repository.database import SQLite3ConnectionPool
+from repository.job_queue import JobQueue
+from test_agent import response
+
+
+@pytest.fixture
+async def adb(db):
+    pool = SQLite3ConnectionPool(db.db_path, readers=2)
+    adb = AsyncSQLite3Database(pool)
+    yield adb
+    adb.close()
+    pool.close()
+
+
+async def job_service(adb, tool, **kwargs) -> JobService:
+    def build_agent(body: AgentRunRequest) -> Agent:
+        client = StreamingClient([
+            tool_turn("tool"),
+            response(TextBlock(text=f"done {body.prompt}", type="text")),
+        ])
+        return Agent(
+            session_id=body.session_id,
+            aclient=client,
+            tools=[],
+            tool_registry={"tool": tool},
+            # identical tool calls of different jobs must not be coalesced
+            tool_flight=SingleFlight(),
+        )
+
+    admission = AdmissionController(AdmissionRepository(adb, "w1"))
+    await admission.repository.register()
+    return JobService(
+        JobQueue(adb), build_agent, RunRegistry(), admission,
+        worker_id="w1", poll_interval=0.01, retry_delay=0, **kwargs)
+
+
+async def wait_for(service: JobService, job_id: str, *statuses: str):
+    for _ in range(500):
+        status = await service.status(job_id)
+        if status.status in statuses:
+            return status
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {status.status}")
+
+
+async def test_jobs_run_with_bounded_concurrency(adb):
+    active = started = peak = 0
+    two_active = asyncio.Event()
+    gate = asyncio.Semaphore(0)
+
+    async def tool() -> str:
+        nonlocal active, started, peak
+        active += 1
+        started += 1
+        peak = max(peak, active)
+        if active == 2:
+            two_active.set()
+        try:
+            await gate.acquire()
+        finally:
+            active -= 1
+        return "ok"
+
+    async def until(condition) -> None:
+        async with asyncio.timeout(5):
+            while not condition():
+                await asyncio.sleep(0.01)
+
+    service = await job_service(adb, tool, concurrency=2)
+    jobs = [await service.submit(AgentRunRequest(prompt=str(i))) for i in range(5)]
+    # submitting returns at once, before any worker ran the job
+    assert all(job.status == "queued" for job in jobs)
+
+    service.start()
+    await asyncio.wait_for(two_active.wait(), 5)
+    # give a third job every chance to start; it must not
+    await asyncio.sleep(0.1)
+    assert (started, active) == (2, 2)
+
+    # one run ending lets exactly one more in
+    gate.release()
+    await until(lambda: started == 3)
+    assert active == 2
+
+    for _ in range(4):
+        gate.release()
+    done = [await wait_for(service, job.job_id, "done") for job in jobs]
+    await service.aclose()
+    assert [job.result for job in done] == [f"done {i}" for i in range(5)]
+    assert (started, peak) == (5, 2)
+
+
+async def test_failing_job_is_retried_then_dead_lettered(adb):
+    def build_agent(body: AgentRunRequest) -> Agent:
+        raise RuntimeError("no client")
+
+    service = await job_service(adb, None, max_attempts=2)
+    service.build_agent = build_agent
+    job = await service.submit(AgentRunRequest(prompt="x"))
+    service.start()
+    dead = await wait_for(service, job.job_id, "dead")
+    await service.aclose()
+
+    assert (dead.attempts, dead.error) == (2, "no client")
+    assert [j.job_id for j in await service.dead_letters()] == [job.job_id]
+
+
+async def test_shutdown_hands_running_jobs_back(adb):
+    started = asyncio.Event()
+
+    async def slow() -> str:
+        started.set()
+        await asyncio.sleep(30)
+        return "late"
+
+    service = await job_service(adb, slow)
+    job = await service.submit(AgentRunRequest(prompt="x", session_id="s1"))
+    service.start()
+    await started.wait()
+    await service.aclose()
+
+    status = await service.status(job.job_id)
+    assert (status.status, status.attempts) == ("queued", 0)
+    assert service.run_registry.get("s1").status == "cancelled"
+
+
+async def test_job_agents_call_the_model_at_batch_priority(monkeypatch):
+    monkeypatch.setattr(agent_api, "SecretManager", lambda project: StubSecretManager())
+    async with httpx.AsyncClient() as http_client:
+        state = SimpleNamespace(
+            http_client=http_client,
+            rate_limiter=RateLimitScheduler(),
+            tool_cache=None,
+            session_store=None,
+        )
+        build_job_agent = agent_api.job_agent_builder(state)
+        first = build_job_agent(AgentRunRequest(prompt="a"))
+        second = build_job_agent(AgentRunRequest(prompt="b"))
+        interactive = agent_api.anthropic_client(state)
+
+    assert first.aclient.priority == Priority.BATCH
+    # one client per priority, sharing the process's rate limiter
+    assert second.aclient is first.aclient
+    assert interactive.priority == Priority.INTERACTIVE
+    assert interactive.rate_limiter is first.aclient.rate_limiter
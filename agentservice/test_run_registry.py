@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+from agent import Agent
+from agentservice.run_registry import RunRegistry
+from clients.anthropic_models import TextBlock, ToolUseBlock
+from clients.anthropic_stub import stream_events
+from clients.streaming import parse_stream_event
+from test_agent import response
+
+
+class StreamingClient:
+    """Streams canned responses in place of AnthropicClient"""
+
+    def __init__(self, responses):
+        self.model = "claude-test"
+        self.responses = list(responses)
+
+    async def stream(self, request):
+        for chunk in stream_events(self.responses.pop(0)):
+            yield parse_stream_event(chunk.split("data: ", 1)[1])
+
+
+def tool_turn(name: str) -> object:
+    return response(
+        ToolUseBlock(id="t1", name=name, input={}, type="tool_use"),
+        stop_reason="tool_use",
+    )
+
+
+def make_agent(tool, timeout: int = 300) -> Agent:
+    client = StreamingClient([
+        tool_turn("tool"),
+        response(TextBlock(text="all done", type="text")),
+    ])
+    return Agent(
+        session_id="s1",
+        aclient=client,
+        tools=[],
+        tool_registry={"tool": tool},
+        timeout=timeout,
+    )
+
+
+async def quick() -> str:
+    return "ok"
+
+
+async def test_run_completes_and_is_inspectable():
+    registry = RunRegistry()
+    run = registry.start(make_agent(quick), "go")
+    events = [e async for e in run.subscribe()]
+
+    status = registry.get("s1").snapshot()
+    assert status.status == "done"
+    assert status.result == "all done"
+    assert status.iterations == 2
+    assert status.tool_calls == 1
+    assert events[-1].type == "message_stop"
+    assert registry.running() == []
+
+
+async def test_one_run_per_session():
+    registry = RunRegistry()
+    started = asyncio.Event()
+
+    async def blocked() -> str:
+        started.set()
+        await asyncio.sleep(30)
+        return "late"
+
+    registry.start(make_agent(blocked), "go")
+    with pytest.raises(ValueError):
+        registry.start(make_agent(quick), "again")
+    await started.wait()
+    await registry.aclose()
+
+
+async def test_cancel_stops_the_tool_and_frees_the_session():
+    registry = RunRegistry()
+    started = asyncio.Event()
+    cancelled = []
+
+    async def blocked() -> str:
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "late"
+
+    run = registry.start(make_agent(blocked), "go")
+    events = run.subscribe()
+    await started.wait()
+    assert (await registry.cancel("s1")) is run
+
+    assert cancelled == [True]
+    assert run.snapshot().status == "cancelled"
+    # subscribers see the end of the run
+    assert [e async for e in events][-1].type == "message_stop"
+    assert registry.running() == []
+    # the session can run again
+    again = registry.start(make_agent(quick), "go")
+    await again.wait()
+    assert registry.get("s1").status == "done"
+
+
+async def test_cancel_before_the_run_starts():
+    registry = RunRegistry()
+    run = registry.start(make_agent(quick), "go")
+    await registry.cancel("s1")
+    assert run.status == "cancelled"
+    assert registry.running() == []
+
+
+async def test_deadline_covers_the_whole_run():
+    registry = RunRegistry()
+
+    async def slow() -> str:
+        await asyncio.sleep(0.3)
+        return "slow"
+
+    # each tool call fits the timeout on its own; the run does not
+    agent = make_agent(slow, timeout=1)
+    agent.aclient.responses[1:1] = [tool_turn("tool") for _ in range(4)]
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    run = registry.start(agent, "go")
+    await run.wait()
+
+    assert loop.time() - start < 1.2
+    status = run.snapshot()
+    assert status.status == "timed_out"
+    assert "timed out after 1s" in status.error
+
+
+async def test_finished_runs_are_bounded():
+    registry = RunRegistry(max_finished=2)
+    for i in range(3):
+        agent = make_agent(quick)
+        agent.session_id = f"s{i}"
+        await registry.start(agent, "go").wait()
+    assert registry.get("s0") is None
+    assert registry.get("s2").status == "done"
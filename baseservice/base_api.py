@@ -1,21 +1,26 @@
 from fastapi import APIRouter, Depends, Request, HTTPException
-from repository.database import SQLite3Database
+from fastapi.responses import JSONResponse, PlainTextResponse
+from admission import AdmissionController, Capacity
+from repository.async_database import AsyncSQLite3Database
 from .base_service import BaseService
 from config import Config
 
 base_router = APIRouter()
 
 
-def get_db_conn(request: Request):
-    db_path = request.app.state.db_path
-    db = SQLite3Database(db_path=db_path)
-    with db.get_connection() as conn:
-        yield conn
+def get_db(request: Request) -> AsyncSQLite3Database:
+    return request.app.state.db
 
 
-def get_base_service(request: Request, conn=Depends(get_db_conn)):
+def get_admission(request: Request) -> AdmissionController:
+    return request.app.state.admission
+
+
+def get_base_service(
+    request: Request, db: AsyncSQLite3Database = Depends(get_db)
+):
     config = Config()
-    return BaseService(conn, config)
+    return BaseService(db, config)
 
 
 @base_router.get("/")
@@ -32,6 +37,33 @@ async def health_check() -> dict:
     return {"status": "healthy", "service": "agents"}
 
 
+@base_router.get("/health/live")
+async def liveness(admission: AdmissionController = Depends(get_admission)) -> dict:
+    """The event loop answers and the worker is still heartbeating"""
+    if not admission.alive():
+        raise HTTPException(status_code=503, detail="worker heartbeat is stale")
+    return {"status": "alive", "worker_id": admission.worker_id}
+
+
+@base_router.get("/health/ready", response_model=Capacity)
+async def readiness(admission: AdmissionController = Depends(get_admission)):
+    """Whether this worker can take an agent run now, from the shared capacity"""
+    capacity = await admission.capacity()
+    if not capacity.ready:
+        return JSONResponse(
+            status_code=503,
+            content=capacity.model_dump(),
+            headers={"Retry-After": str(admission.retry_after(capacity.queued))},
+        )
+    return capacity
+
+
+@base_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(admission: AdmissionController = Depends(get_admission)) -> str:
+    """Counters and histograms of every worker, in the Prometheus text format"""
+    return await admission.metrics()
+
+
 @base_router.get("/user/{username}")
 async def get_user(
     username: str,
@@ -1,12 +1,12 @@
-import sqlite3
 from config import Config
+from repository.async_database import AsyncSQLite3Database
 from .base_models import User
 from typing import Optional
 
 
 class BaseService:
-    def __init__(self, conn: sqlite3.Connection, config: Config):
-        self.conn = conn
+    def __init__(self, db: AsyncSQLite3Database, config: Config):
+        self.db = db
         self.config = config
 
     def test(self) -> dict:
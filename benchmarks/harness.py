@@ -0,0 +1,69 @@
+import math
+import resource
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from pydantic import BaseModel, Field
+
+
+class BenchmarkResult(BaseModel):
+    scenario: str
+    params: Dict[str, Any]
+    samples: int
+    p50_ms: float
+    p99_ms: float
+    mean_ms: float
+    max_ms: float
+    wall_s: float
+    throughput_per_s: float = Field(
+        description="Completed units (sessions, turns or files) per second")
+    peak_rss_kb: int = Field(description="Peak resident set size of the process")
+    extra: Dict[str, Any] = Field(default_factory=dict)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Stopwatch:
+    """Collects latency samples for a scenario"""
+
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def sample(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    def result(
+        self,
+        scenario: str,
+        params: Dict[str, Any],
+        units: Optional[int] = None,
+        **extra: Any,
+    ) -> BenchmarkResult:
+        wall = time.perf_counter() - self.started
+        samples = self.samples or [wall]
+        units = len(self.samples) if units is None else units
+        return BenchmarkResult(
+            scenario=scenario,
+            params=params,
+            samples=len(samples),
+            p50_ms=percentile(samples, 50) * 1000,
+            p99_ms=percentile(samples, 99) * 1000,
+            mean_ms=sum(samples) / len(samples) * 1000,
+            max_ms=max(samples) * 1000,
+            wall_s=wall,
+            throughput_per_s=units / wall if wall else 0.0,
+            # ru_maxrss is in kilobytes on linux
+            peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            extra=extra,
+        )
@@ -0,0 +1,107 @@
+"""
+Run the agent benchmarks and write the results as JSON.
+
+    uv run python -m benchmarks.run
+    uv run python -m benchmarks.run -s long_history -p turns=200
+    uv run python -m benchmarks.run --quick --output bench.json
+
+Results go to benchmarks/results/<timestamp>.json unless --output is
+given, one object per scenario, so p50/p99 and memory can be tracked
+across commits.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+from .harness import BenchmarkResult
+from .scenarios import SCENARIOS
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# small enough to finish in a few seconds, e.g. in CI
+QUICK: Dict[str, Dict[str, Any]] = {
+    "single_session": {"rounds": 3, "latency": 0.0, "cli_seconds": 0.0},
+    "concurrent_sessions": {"sessions": 4, "latency": 0.0, "cli_seconds": 0.0},
+    "long_history": {"turns": 10, "lines": 20},
+    "batch_conversion": {"files": 4, "workers": 2, "cli_seconds": 0.0, "broken_every": 2},
+}
+
+
+def parse_value(value: str) -> Any:
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return value
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(
+    names: List[str], quick: bool, overrides: Dict[str, Any]
+) -> List[BenchmarkResult]:
+    results = []
+    for name in names:
+        params = {**(QUICK[name] if quick else {}), **overrides}
+        result = await SCENARIOS[name](**params)
+        print(
+            f"{name}: p50={result.p50_ms:.1f}ms p99={result.p99_ms:.1f}ms "
+            f"throughput={result.throughput_per_s:.1f}/s "
+            f"rss={result.peak_rss_kb}KB"
+        )
+        results.append(result)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+        help="scenario to run (repeatable, default: all)")
+    parser.add_argument(
+        "-p", "--param", action="append", default=[], metavar="KEY=VALUE",
+        help="override a scenario parameter")
+    parser.add_argument("--quick", action="store_true", help="use small parameters")
+    parser.add_argument("--output", type=Path, help="where to write the JSON results")
+    args = parser.parse_args()
+
+    # the agent logs every turn at info level; keep the output readable
+    logging.basicConfig(level=logging.WARNING)
+    overrides = {}
+    for param in args.param:
+        key, _, value = param.partition("=")
+        overrides[key] = parse_value(value)
+
+    names = args.scenario or list(SCENARIOS)
+    results = asyncio.run(run(names, args.quick, overrides))
+
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"{stamp}.json"
+    output.write_text(json.dumps({
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "results": [r.model_dump() for r in results],
+    }, indent=2))
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
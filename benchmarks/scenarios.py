@@ -0,0 +1,258 @@
+"""
+Agent loop scenarios, run against the local Anthropic stub and the fake
+CLIs in benchmarks/bin. Every scenario is an async function returning a
+BenchmarkResult; keyword arguments are its tunable parameters.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+import httpx
+from yoyo import get_backend, read_migrations
+from agent import Agent
+from clients.tool_registry import registry as tool_registry
+from agentservice.batch_models import BatchSubmitRequest
+from agentservice.batch_service import BatchService
+from clients.anthropic_client import AnthropicClient
+from clients.anthropic_models import AnthropicRequest, AnthropicResponse
+from clients.anthropic_stub import (
+    StubSecretManager,
+    create_stub_app,
+    scripted_tool_responder,
+)
+from clients.rate_limiter import RateLimitScheduler
+from config import Config
+from repository.async_database import AsyncSQLite3Database
+from repository.batch_repository import BatchRepository
+from repository.database import SQLite3ConnectionPool
+from .harness import BenchmarkResult, Stopwatch
+
+BIN_DIR = Path(__file__).parent / "bin"
+MIGRATIONS = Path(__file__).parent.parent / "migrations"
+CONVERTER = "convert_markdown_to_toml_gemini"
+
+
+@contextmanager
+def fake_cli(seconds: float) -> Iterator[None]:
+    """Put the fake gemini/claude executables first on PATH"""
+    saved = {k: os.environ.get(k) for k in ("PATH", "FAKE_CLI_SECONDS")}
+    os.environ["PATH"] = f"{BIN_DIR}{os.pathsep}{saved['PATH'] or ''}"
+    os.environ["FAKE_CLI_SECONDS"] = str(seconds)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def stub_client(
+    tool_turns: int = 1,
+    latency: float = 0.0,
+    throttle_every: int = 0,
+    rate_limiter: Optional[RateLimitScheduler] = None,
+) -> AnthropicClient:
+    config = Config()
+    config.anthropic_base_url = "http://anthropic.stub"
+    app = create_stub_app(
+        scripted_tool_responder(CONVERTER, tool_turns),
+        latency=latency,
+        throttle_every=throttle_every,
+    )
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+    return AnthropicClient(
+        config, StubSecretManager(), "claude-bench",
+        http_client=http_client, rate_limiter=rate_limiter)
+
+
+def markdown(n: int, lines: int = 40) -> str:
+    # unique per session so coalescing does not merge sessions
+    body = "\n".join(f"- step {i}: do the thing carefully" for i in range(lines))
+    return f"# Command {n}\n\nConvert this command.\n\n{body}\n"
+
+
+def make_agent(
+    client: AnthropicClient,
+    max_iters: int = 4,
+    registry: Optional[Dict[str, Any]] = None,
+) -> Agent:
+    return Agent(
+        session_id=None,
+        aclient=client,
+        tools=tool_registry.schemas([CONVERTER]),
+        tool_registry=registry or tool_registry,
+        max_iters=max_iters,
+    )
+
+
+async def run_session(agent: Agent, prompt: str, stream: bool) -> None:
+    if not stream:
+        await agent.run(prompt)
+        return
+    async for _ in agent.run_stream(prompt):
+        pass
+
+
+async def single_session(
+    rounds: int = 20,
+    latency: float = 0.05,
+    cli_seconds: float = 0.05,
+    stream: bool = False,
+) -> BenchmarkResult:
+    """Latency of one session: a tool_use turn through the CLI, then an answer"""
+    params = dict(rounds=rounds, latency=latency, cli_seconds=cli_seconds, stream=stream)
+    client = stub_client(latency=latency)
+    watch = Stopwatch()
+    with fake_cli(cli_seconds):
+        for n in range(rounds):
+            with watch.sample():
+                await run_session(make_agent(client), markdown(n), stream)
+    await client.http_client.aclose()
+    return watch.result("single_session", params)
+
+
+async def concurrent_sessions(
+    sessions: int = 32,
+    latency: float = 0.05,
+    cli_seconds: float = 0.05,
+    throttle_every: int = 0,
+) -> BenchmarkResult:
+    """
+    Throughput of N sessions started together. With `throttle_every` the
+    stub rejects every n-th request with a 429 and the shared rate limit
+    scheduler has to retry them.
+    """
+    params = dict(sessions=sessions, latency=latency, cli_seconds=cli_seconds,
+                  throttle_every=throttle_every)
+    limiter = RateLimitScheduler(
+        requests_per_minute=100_000,
+        input_tokens_per_minute=100_000_000,
+        output_tokens_per_minute=100_000_000,
+        base_delay=0.01,
+    )
+    client = stub_client(
+        latency=latency, throttle_every=throttle_every, rate_limiter=limiter)
+    watch = Stopwatch()
+
+    async def session(n: int) -> None:
+        with watch.sample():
+            await run_session(make_agent(client), markdown(n), stream=False)
+
+    with fake_cli(cli_seconds):
+        await asyncio.gather(*(session(n) for n in range(sessions)))
+    await client.http_client.aclose()
+    return watch.result(
+        "concurrent_sessions", params,
+        retries=limiter.retries, throttled=limiter.throttled)
+
+
+class TurnTimer:
+    """Times whole agent turns: from one model response to the next"""
+
+    def __init__(self, client: AnthropicClient) -> None:
+        self.client = client
+        self.model = client.model
+        self.marks: List[float] = [time.perf_counter()]
+
+    async def get(self, request: AnthropicRequest) -> AnthropicResponse:
+        resp = await self.client.get(request)
+        self.marks.append(time.perf_counter())
+        return resp
+
+    def samples(self) -> List[float]:
+        return [b - a for a, b in zip(self.marks, self.marks[1:])]
+
+
+async def echo_convert(markdown_doc: str) -> str:
+    return f'prompt = """{markdown_doc}"""'
+
+
+async def long_history(turns: int = 100, lines: int = 200) -> BenchmarkResult:
+    """
+    Cost per turn as one session's history grows. The tool runs in process
+    and the stub answers instantly, so the samples are the agent's own
+    per-turn overhead (request building, compaction, encoding, parsing).
+    """
+    params = dict(turns=turns, lines=lines)
+    client = stub_client(tool_turns=turns)
+    timer = TurnTimer(client)
+    agent = make_agent(timer, max_iters=turns + 1,
+                       registry={CONVERTER: echo_convert})
+    watch = Stopwatch()
+    await agent.run(markdown(0, lines))
+    watch.samples = timer.samples()
+    await client.http_client.aclose()
+
+    tenth = max(len(watch.samples) // 10, 1)
+    encoder = client.encoder
+    return watch.result(
+        "long_history", params,
+        first_turns_ms=sum(watch.samples[:tenth]) / tenth * 1000,
+        last_turns_ms=sum(watch.samples[-tenth:]) / tenth * 1000,
+        compactions=agent.context_window.compactions,
+        encoder_hit_ratio=encoder.hits / max(encoder.hits + encoder.misses, 1),
+        **agent.messages.stats(),
+    )
+
+
+def migrated_database(directory: str) -> str:
+    db_path = os.path.join(directory, "bench.db")
+    backend = get_backend(f"sqlite:///{db_path}")
+    with backend.lock():
+        backend.apply_migrations(backend.to_apply(read_migrations(str(MIGRATIONS))))
+    return db_path
+
+
+async def batch_conversion(
+    files: int = 50,
+    workers: int = 8,
+    cli_seconds: float = 0.05,
+    broken_every: int = 10,
+    converter: str = CONVERTER,
+) -> BenchmarkResult:
+    """
+    Files per second through BatchService; every `broken_every`-th file
+    comes back from the fake gemini as invalid TOML and goes through the
+    claude repair step. `-p converter=convert_markdown_to_toml` measures
+    the in-process converter instead.
+    """
+    params = dict(files=files, workers=workers, cli_seconds=cli_seconds,
+                  broken_every=broken_every, converter=converter)
+    with tempfile.TemporaryDirectory() as tmp, fake_cli(cli_seconds):
+        source = Path(tmp, "commands")
+        source.mkdir()
+        for n in range(files):
+            text = markdown(n)
+            if broken_every and n % broken_every == 0:
+                text += "\nFAKE_CLI_BROKEN\n"
+            (source / f"cmd{n}.md").write_text(text)
+
+        pool = SQLite3ConnectionPool(migrated_database(tmp), readers=2)
+        db = AsyncSQLite3Database(pool)
+        service = BatchService(
+            BatchRepository(db), tool_registry, max_workers=workers, converter=converter,
+            root=tmp)
+        watch = Stopwatch()
+        batch_id = await service.submit(BatchSubmitRequest(directory=str(source)))
+        while (status := await service.status(batch_id)).status != "done":
+            await asyncio.sleep(0.02)
+        result = watch.result(
+            "batch_conversion", params, units=files,
+            done=status.done, failed=status.failed)
+        await service.aclose()
+        db.close()
+        pool.close()
+    return result
+
+
+SCENARIOS: Dict[str, Callable[..., Awaitable[BenchmarkResult]]] = {
+    "single_session": single_session,
+    "concurrent_sessions": concurrent_sessions,
+    "long_history": long_history,
+    "batch_conversion": batch_conversion,
+}
@@ -0,0 +1,16 @@
+import pytest
+from .run import QUICK
+from .scenarios import SCENARIOS
+
+
+@pytest.mark.parametrize("name", sorted(SCENARIOS))
+async def test_scenario_runs(name):
+    result = await SCENARIOS[name](**QUICK[name])
+    assert result.scenario == name
+    assert result.samples > 0
+    assert 0 < result.p50_ms <= result.p99_ms <= result.max_ms
+
+
+async def test_batch_repairs_broken_files():
+    result = await SCENARIOS["batch_conversion"](**QUICK["batch_conversion"])
+    assert result.extra == {"done": 4, "failed": 0}
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import random
+from typing import AsyncIterator, Dict, List, Set
+import httpx
+from clients.anthropic_client import AnthropicClient
+from clients.anthropic_models import (
+    AnthropicRequest,
+    BatchRequest,
+    BatchResult,
+    MessageBatch,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AnthropicBatchClient(AnthropicClient):
+    """
+    Client for the Message Batches API, for offline bulk workloads.
+
+    Batches run outside the interactive rate limits at a lower price.
+    Large workloads are split into several batches so results stream back
+    as each batch ends, instead of after the slowest request of one
+    giant batch.
+    """
+
+    def __init__(
+        self,
+        *args,
+        poll_interval: float = 5.0,
+        max_poll_interval: float = 60.0,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.batches_url = f"{self.config.anthropic_base_url}/v1/messages/batches"
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    async def create(self, requests: Dict[str, AnthropicRequest]) -> MessageBatch:
+        """Submit requests keyed by custom id as one batch"""
+        batch_requests = [
+            BatchRequest(custom_id=custom_id, params=request)
+            for custom_id, request in requests.items()
+        ]
+        data = {
+            "requests": [r.model_dump(exclude_none=True) for r in batch_requests]
+        }
+        return MessageBatch(**await self._request("POST", self.batches_url, json=data))
+
+    async def retrieve(self, batch_id: str) -> MessageBatch:
+        return MessageBatch(
+            **await self._request("GET", f"{self.batches_url}/{batch_id}"))
+
+    async def cancel(self, batch_id: str) -> MessageBatch:
+        return MessageBatch(
+            **await self._request("POST", f"{self.batches_url}/{batch_id}/cancel"))
+
+    async def wait(self, batch_id: str) -> MessageBatch:
+        """Poll until the batch has ended, backing off with jitter"""
+        delay = self.poll_interval
+        while True:
+            batch = await self.retrieve(batch_id)
+            if batch.processing_status == "ended":
+                return batch
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(delay * 2, self.max_poll_interval)
+
+    async def results(self, batch: MessageBatch) -> AsyncIterator[BatchResult]:
+        """Stream the JSONL results of an ended batch line by line"""
+        try:
+            async with self.http_client.stream(
+                "GET", batch.results_url, headers=self.headers
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.strip():
+                        yield BatchResult.model_validate_json(line)
+        except httpx.HTTPError as e:
+            raise RuntimeError(
+                f"Failed to fetch batch results from Anthropic API: {str(e)}")
+
+    async def run(
+        self, requests: Dict[str, AnthropicRequest], batch_size: int = 1000
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Submit, wait for and stream back every request.
+
+        Requests are split into batches of `batch_size` that are polled
+        concurrently; results are yielded as soon as their batch ends. If
+        the caller stops early or a batch fails, every batch that hasn't
+        ended yet is cancelled upstream.
+        """
+        items = list(requests.items())
+        chunks: List[Dict[str, AnthropicRequest]] = [
+            dict(items[i:i + batch_size]) for i in range(0, len(items), batch_size)
+        ]
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        # a create is its own task, so a cancelled poller can't lose the id
+        creates: List[asyncio.Task] = []
+        ended: Set[str] = set()
+
+        async def process(chunk: Dict[str, AnthropicRequest]) -> None:
+            try:
+                create = asyncio.create_task(self.create(chunk))
+                creates.append(create)
+                batch = await self.wait((await asyncio.shield(create)).id)
+                ended.add(batch.id)
+                async for result in self.results(batch):
+                    await queue.put(result)
+            except Exception as e:
+                await queue.put(e)
+            finally:
+                await queue.put(done)
+
+        tasks = [asyncio.create_task(process(chunk)) for chunk in chunks]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, *creates, return_exceptions=True)
+            unfinished = [
+                c.result().id for c in creates
+                if not c.cancelled() and c.exception() is None
+                and c.result().id not in ended
+            ]
+            await asyncio.gather(*(self.cancel_quietly(i) for i in unfinished))
+
+    async def cancel_quietly(self, batch_id: str) -> None:
+        """Cancel a batch nobody waits for any more; failures are only logged"""
+        try:
+            await self.cancel(batch_id)
+        except Exception as e:
+            logger.warning(
+                "Cancelling batch failed:", extra={"batch_id": batch_id, "error": str(e)})
+
+    async def _request(self, method: str, url: str, **kwargs) -> dict:
+        try:
+            response = await self.http_client.request(
+                method, url, headers=self.headers, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise RuntimeError(
+                f"Failed to send request to Anthropic API: {str(e)}")
@@ -1,7 +1,42 @@
 from config import Config
 from secret_manager import SecretManager
-from clients.anthropic_models import AnthropicRequest, AnthropicResponse
-import requests
+from clients.anthropic_models import (
+    AnthropicRequest,
+    AnthropicResponse,
+    StreamEvent,
+    Usage,
+)
+from clients.context_window import CHARS_PER_TOKEN
+from clients.rate_limiter import RETRYABLE_STATUS, Priority, RateLimitScheduler
+from clients.serialization import RequestEncoder
+from clients.single_flight import SingleFlight
+from clients.streaming import aiter_sse, parse_stream_event
+from telemetry import telemetry
+from importlib.util import find_spec
+import hashlib
+from typing import AsyncIterator, Optional
+import httpx
+
+
+def build_http_client(config: Config) -> httpx.AsyncClient:
+    """
+    Shared keep-alive connection pool for the Anthropic API.
+
+    Every AnthropicClient in the process should be handed the same instance
+    (created and closed in the FastAPI lifespan) so agent sessions reuse
+    warm TCP/TLS connections instead of dialing per call. The client only
+    talks to one host, so the pool limits are effectively per-host limits.
+    HTTP/2 is negotiated when the optional `h2` package is installed.
+    """
+    limits = httpx.Limits(
+        max_connections=config.anthropic_max_connections,
+        max_keepalive_connections=config.anthropic_max_keepalive,
+    )
+    return httpx.AsyncClient(
+        http2=find_spec("h2") is not None,
+        limits=limits,
+        timeout=httpx.Timeout(config.anthropic_timeout, connect=10.0),
+    )
 
 
 class AnthropicClient:
@@ -10,11 +45,25 @@ class AnthropicClient:
         config: Config,
         secret_mgr: SecretManager,
         model: str,
+        http_client: Optional[httpx.AsyncClient] = None,
+        rate_limiter: Optional[RateLimitScheduler] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        coalesce: bool = True,
     ) -> None:
         self.config = config
         self.secret_mgr = secret_mgr
         self.model = model
         self.headers = self.build_headers()
+        self.url = f"{config.anthropic_base_url}/v1/messages"
+        # only close the pool on aclose() if we created it ourselves
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or build_http_client(config)
+        # shared across clients so admission sees the whole process
+        self.rate_limiter = rate_limiter
+        self.priority = priority
+        # identical concurrent requests (e.g. a CI fan-out) share one call
+        self.single_flight = SingleFlight() if coalesce else None
+        self.encoder = RequestEncoder()
 
     def build_headers(self) -> dict:
         anthropic_key = self.secret_mgr.get_secret(
@@ -24,20 +73,143 @@ class AnthropicClient:
             "x-api-key": anthropic_key,
             "anthropic-version": "2023-06-01",
             "anthropic-beta": "prompt-tools-2025-04-02",
+            "content-type": "application/json",
         }
 
+    async def aclose(self) -> None:
+        if self._owns_http_client:
+            await self.http_client.aclose()
+
+    @staticmethod
+    def estimate_input_tokens(body: bytes) -> int:
+        # close enough for admission; usage settles the difference
+        return int(len(body) / CHARS_PER_TOKEN)
+
+    def settle_stream_usage(
+        self, event: StreamEvent, input_tokens: int, max_tokens: int
+    ) -> None:
+        # input usage arrives with message_start, output with message_delta
+        if event.type == "message_start":
+            usage = event.message.usage
+            self.rate_limiter.record_usage(input_tokens, 0, Usage(
+                input_tokens=usage.input_tokens, output_tokens=0))
+        elif event.type == "message_delta":
+            self.rate_limiter.record_usage(0, max_tokens, Usage(
+                input_tokens=0, output_tokens=event.usage.output_tokens))
+
+    def record_usage(self, model: str, usage: Usage) -> None:
+        span = telemetry.current_span()
+        for kind, tokens in usage.model_dump(exclude_none=True).items():
+            telemetry.metrics.inc(
+                "anthropic_tokens_total", tokens, model=model, type=kind)
+            if span is not None:
+                span.add(kind, tokens)
+
+    def record_stream_usage(self, model: str, event: StreamEvent) -> None:
+        if event.type == "message_start":
+            # output tokens are only final in message_delta
+            self.record_usage(model, event.message.usage.model_copy(
+                update={"output_tokens": 0}))
+        elif event.type == "message_delta":
+            self.record_usage(model, Usage(
+                input_tokens=0, output_tokens=event.usage.output_tokens))
+
     async def get(self, request: AnthropicRequest) -> AnthropicResponse:
+        with telemetry.span("anthropic.messages", model=request.model):
+            body = self.encoder.encode(request)
+            if self.single_flight is None:
+                return await self.send(request, body)
+            resp = await self.single_flight.do(
+                hashlib.sha256(body).hexdigest(), lambda: self.send(request, body))
+            # every waiter gets its own copy to append to its history
+            return resp.model_copy(deep=True)
+
+    async def send(self, request: AnthropicRequest, body: bytes) -> AnthropicResponse:
         try:
-            data = request.model_dump(exclude_none=True)
-            url = "https://api.anthropic.com/v1/messages"
-            response = requests.post(url, headers=self.headers, json=data)
+            if self.rate_limiter is None:
+                response = await self.http_client.post(
+                    self.url, headers=self.headers, content=body
+                )
+            else:
+                input_tokens = self.estimate_input_tokens(body)
+                response = await self.rate_limiter.call(
+                    lambda: self.http_client.post(
+                        self.url, headers=self.headers, content=body),
+                    input_tokens,
+                    request.max_tokens,
+                    self.priority,
+                )
+            telemetry.metrics.inc(
+                "anthropic_requests_total",
+                model=request.model,
+                status=response.status_code,
+            )
             response.raise_for_status()
-            response_data = response.json()
-
-            resp = AnthropicResponse(**response_data)
+            resp = AnthropicResponse.model_validate_json(response.content)
+            self.record_usage(request.model, resp.usage)
+            if self.rate_limiter is not None:
+                self.rate_limiter.record_usage(
+                    input_tokens, request.max_tokens, resp.usage)
             return resp
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise RuntimeError(
                 f"Failed to send request to Anthropic API: {str(e)}")
         except Exception as e:
             raise RuntimeError(f"Unexpected error in get method: {str(e)}")
+
+    async def stream(
+        self, request: AnthropicRequest
+    ) -> AsyncIterator[StreamEvent]:
+        """Send the request with `stream` enabled and yield events as they arrive"""
+        with telemetry.span("anthropic.stream", model=request.model):
+            async for event in self._stream(request):
+                yield event
+
+    async def _stream(
+        self, request: AnthropicRequest
+    ) -> AsyncIterator[StreamEvent]:
+        body = self.encoder.encode(request, stream=True)
+        limiter = self.rate_limiter
+        input_tokens = self.estimate_input_tokens(body)
+        attempt = 0
+        try:
+            while True:
+                if limiter is not None:
+                    await limiter.acquire(
+                        input_tokens, request.max_tokens, self.priority)
+                async with self.http_client.stream(
+                    "POST", self.url, headers=self.headers, content=body
+                ) as response:
+                    telemetry.metrics.inc(
+                        "anthropic_requests_total",
+                        model=request.model,
+                        status=response.status_code,
+                    )
+                    if limiter is not None:
+                        limiter.update(response.headers)
+                    if response.is_error:
+                        if limiter is not None:
+                            limiter.refund(input_tokens, request.max_tokens, response)
+                        await response.aread()
+                        # only retry before any event has been yielded
+                        if (limiter is not None
+                                and response.status_code in RETRYABLE_STATUS
+                                and attempt < limiter.max_retries):
+                            await limiter.backoff(attempt, response)
+                            attempt += 1
+                            continue
+                        response.raise_for_status()
+                    async for _, payload in aiter_sse(response.aiter_lines()):
+                        event = parse_stream_event(payload)
+                        if event.type == "error":
+                            raise RuntimeError(
+                                f"Anthropic API stream error: {event.error.message}")
+                        if limiter is not None:
+                            self.settle_stream_usage(
+                                event, input_tokens, request.max_tokens)
+                        self.record_stream_usage(request.model, event)
+                        yield event
+                    return
+        except httpx.HTTPError as e:
+            raise RuntimeError(
+                f"Failed to send request to Anthropic API: {str(e)}")
@@ -1,10 +1,17 @@
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional, Dict, Any, Union
+from typing import Annotated, List, Literal, Optional, Dict, Any, Union
+
+
+class CacheControl(BaseModel):
+    # marks the end of a prompt prefix the API should cache
+    type: Literal["ephemeral"] = "ephemeral"
+    ttl: Optional[Literal["5m", "1h"]] = None
 
 
 class TextBlock(BaseModel):
     text: str
     type: Literal["text"]
+    cache_control: Optional[CacheControl] = None
 
 
 class ToolUseBlock(BaseModel):
@@ -12,6 +19,7 @@ class ToolUseBlock(BaseModel):
     name: str  # name of the function to call
     input: Dict[str, Any]  # arguments for the function
     type: Literal["tool_use"]
+    cache_control: Optional[CacheControl] = None
 
 
 class ToolResultBlock(BaseModel):
@@ -19,6 +27,7 @@ class ToolResultBlock(BaseModel):
     content: str  # result of the tool execution
     is_error: Optional[bool] = False  # indicate if the tool exec failed
     type: Literal["tool_result"]
+    cache_control: Optional[CacheControl] = None
 
 
 ContentBlock = Union[TextBlock, ToolUseBlock, ToolResultBlock]
@@ -55,6 +64,7 @@ class Tool(BaseModel):
     name: str = Field(min_length=1, max_length=128)
     description: Optional[str] = None
     input_schema: ToolInputSchema
+    cache_control: Optional[CacheControl] = None
 
 
 class ToolChoice(BaseModel):
@@ -69,7 +79,7 @@ class AnthropicRequest(BaseModel):
     temperature: Optional[float] = Field(None, ge=0.0, le=1.0)
     thinking: Optional[Thinking] = None
     stream: Optional[bool] = False
-    system: Optional[str] = None
+    system: Optional[Union[str, List[TextBlock]]] = None
     tools: Optional[List[Tool]] = None
     tool_choice: Optional[ToolChoice] = None
 
@@ -77,6 +87,9 @@ class AnthropicRequest(BaseModel):
 class Usage(BaseModel):
     input_tokens: int
     output_tokens: int
+    # prompt caching: tokens written to / served from the cache
+    cache_creation_input_tokens: Optional[int] = None
+    cache_read_input_tokens: Optional[int] = None
 
 
 class AnthropicResponse(BaseModel):
@@ -89,3 +102,140 @@ class AnthropicResponse(BaseModel):
     ]
     stop_sequence: Optional[str] = None
     usage: Usage
+
+
+# Server-sent events emitted by /v1/messages when `stream` is true
+class TextDelta(BaseModel):
+    text: str
+    type: Literal["text_delta"]
+
+
+class InputJSONDelta(BaseModel):
+    partial_json: str  # fragment of the tool_use input JSON
+    type: Literal["input_json_delta"]
+
+
+ContentBlockDelta = Union[TextDelta, InputJSONDelta]
+
+
+class MessageStartEvent(BaseModel):
+    message: AnthropicResponse  # content is empty at this point
+    type: Literal["message_start"]
+
+
+class ContentBlockStartEvent(BaseModel):
+    index: int
+    content_block: ContentBlock
+    type: Literal["content_block_start"]
+
+
+class ContentBlockDeltaEvent(BaseModel):
+    index: int
+    delta: ContentBlockDelta
+    type: Literal["content_block_delta"]
+
+
+class ContentBlockStopEvent(BaseModel):
+    index: int
+    type: Literal["content_block_stop"]
+
+
+class MessageDelta(BaseModel):
+    stop_reason: Optional[
+        Literal["end_turn", "max_tokens", "stop_sequence", "tool_use"]
+    ] = None
+    stop_sequence: Optional[str] = None
+
+
+class MessageDeltaUsage(BaseModel):
+    output_tokens: int
+
+
+class MessageDeltaEvent(BaseModel):
+    delta: MessageDelta
+    usage: MessageDeltaUsage
+    type: Literal["message_delta"]
+
+
+class MessageStopEvent(BaseModel):
+    type: Literal["message_stop"]
+
+
+class PingEvent(BaseModel):
+    type: Literal["ping"]
+
+
+class StreamError(BaseModel):
+    type: str
+    message: str
+
+
+class ErrorEvent(BaseModel):
+    error: StreamError
+    type: Literal["error"]
+
+
+StreamEvent = Annotated[
+    Union[
+        MessageStartEvent,
+        ContentBlockStartEvent,
+        ContentBlockDeltaEvent,
+        ContentBlockStopEvent,
+        MessageDeltaEvent,
+        MessageStopEvent,
+        PingEvent,
+        ErrorEvent,
+    ],
+    Field(discriminator="type"),
+]
+
+
+# Message Batches API (/v1/messages/batches)
+class BatchRequest(BaseModel):
+    custom_id: str = Field(min_length=1, max_length=64, pattern=r"^[a-zA-Z0-9_-]+$")
+    params: AnthropicRequest
+
+
+class BatchRequestCounts(BaseModel):
+    processing: int = 0
+    succeeded: int = 0
+    errored: int = 0
+    canceled: int = 0
+    expired: int = 0
+
+
+class MessageBatch(BaseModel):
+    id: str
+    type: Literal["message_batch"] = "message_batch"
+    processing_status: Literal["in_progress", "canceling", "ended"]
+    request_counts: BatchRequestCounts
+    results_url: Optional[str] = None  # set once processing has ended
+    created_at: str
+    ended_at: Optional[str] = None
+    expires_at: Optional[str] = None
+
+
+class BatchSucceeded(BaseModel):
+    message: AnthropicResponse
+    type: Literal["succeeded"]
+
+
+class BatchErrored(BaseModel):
+    error: Dict[str, Any]
+    type: Literal["errored"]
+
+
+class BatchCanceled(BaseModel):
+    type: Literal["canceled"]
+
+
+class BatchExpired(BaseModel):
+    type: Literal["expired"]
+
+
+class BatchResult(BaseModel):
+    custom_id: str
+    result: Annotated[
+        Union[BatchSucceeded, BatchErrored, BatchCanceled, BatchExpired],
+        Field(discriminator="type"),
+    ]
@@ -0,0 +1,250 @@
+"""
+Local stand-in for the Anthropic API, for tests and offline development.
+
+Serve it with `uvicorn clients.anthropic_stub:app --port 8765` and point
+ANTHROPIC_BASE_URL at it, or mount `create_stub_app()` on an
+httpx.ASGITransport in tests. Latency, streaming, scripted tool_use turns
+and 429 injection make it usable as the upstream for benchmarks.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from clients.anthropic_models import (
+    AnthropicRequest,
+    AnthropicResponse,
+    BatchRequest,
+    BatchRequestCounts,
+    BatchResult,
+    MessageBatch,
+    ContentBlockDeltaEvent,
+    ContentBlockStartEvent,
+    ContentBlockStopEvent,
+    InputJSONDelta,
+    MessageDelta,
+    MessageDeltaEvent,
+    MessageDeltaUsage,
+    MessageStartEvent,
+    MessageStopEvent,
+    TextBlock,
+    TextDelta,
+    ToolUseBlock,
+    Usage,
+)
+
+Responder = Callable[[AnthropicRequest], AnthropicResponse]
+
+
+class StubSecretManager:
+    """SecretManager stand-in that hands out a fixed API key"""
+
+    def get_secret(self, secret_name: str) -> str:
+        return "stub-key"
+
+
+def echo_responder(request: AnthropicRequest) -> AnthropicResponse:
+    last = request.messages[-1].content
+    text = last if isinstance(last, str) else " ".join(
+        b.text for b in last if b.type == "text")
+    return AnthropicResponse(
+        id=f"msg_{uuid.uuid4().hex[:12]}",
+        model=request.model,
+        role="assistant",
+        content=[TextBlock(text=f"echo: {text}", type="text")],
+        stop_reason="end_turn",
+        usage=Usage(input_tokens=len(text) // 4 + 1, output_tokens=len(text) // 4 + 2),
+    )
+
+
+def first_user_text(request: AnthropicRequest) -> str:
+    first = request.messages[0].content
+    return first if isinstance(first, str) else " ".join(
+        b.text for b in first if b.type == "text")
+
+
+def scripted_tool_responder(
+    tool_name: str, tool_turns: int = 1, input_key: str = "markdown_doc"
+) -> Responder:
+    """
+    Ask for `tool_name` on the first `tool_turns` turns of a conversation,
+    passing the opening user message as `input_key`, then end the turn.
+
+    The script is driven by the request history alone, so any number of
+    concurrent conversations can share one responder.
+    """
+
+    def responder(request: AnthropicRequest) -> AnthropicResponse:
+        turn = sum(1 for m in request.messages if m.role == "assistant")
+        text = first_user_text(request)
+        usage = Usage(input_tokens=len(text) // 4 + 1, output_tokens=16)
+        if turn < tool_turns:
+            content = [
+                TextBlock(text=f"calling {tool_name}", type="text"),
+                ToolUseBlock(id=f"toolu_{uuid.uuid4().hex[:12]}", name=tool_name,
+                             input={input_key: text}, type="tool_use"),
+            ]
+            stop_reason = "tool_use"
+        else:
+            content = [TextBlock(text="done", type="text")]
+            stop_reason = "end_turn"
+        return AnthropicResponse(
+            id=f"msg_{uuid.uuid4().hex[:12]}",
+            model=request.model,
+            role="assistant",
+            content=content,
+            stop_reason=stop_reason,
+            usage=usage,
+        )
+
+    return responder
+
+
+def sse(event: BaseModel) -> str:
+    return f"event: {event.type}\ndata: {event.model_dump_json()}\n\n"
+
+
+def stream_events(response: AnthropicResponse, chunk_chars: int = 32) -> Iterator[str]:
+    """Replay a complete response as the SSE events /v1/messages would stream"""
+    start = response.model_copy(update={
+        "content": [],
+        "stop_reason": None,
+        "usage": response.usage.model_copy(update={"output_tokens": 1}),
+    })
+    yield sse(MessageStartEvent(message=start, type="message_start"))
+    for index, block in enumerate(response.content):
+        if block.type == "text":
+            empty, payload = block.model_copy(update={"text": ""}), block.text
+        else:
+            empty, payload = block.model_copy(update={"input": {}}), json.dumps(block.input)
+        yield sse(ContentBlockStartEvent(
+            index=index, content_block=empty, type="content_block_start"))
+        for i in range(0, len(payload), chunk_chars):
+            chunk = payload[i:i + chunk_chars]
+            if block.type == "text":
+                delta = TextDelta(text=chunk, type="text_delta")
+            else:
+                delta = InputJSONDelta(partial_json=chunk, type="input_json_delta")
+            yield sse(ContentBlockDeltaEvent(
+                index=index, delta=delta, type="content_block_delta"))
+        yield sse(ContentBlockStopEvent(index=index, type="content_block_stop"))
+    yield sse(MessageDeltaEvent(
+        delta=MessageDelta(stop_reason=response.stop_reason),
+        usage=MessageDeltaUsage(output_tokens=response.usage.output_tokens),
+        type="message_delta",
+    ))
+    yield sse(MessageStopEvent(type="message_stop"))
+
+
+class BatchCreateBody(BaseModel):
+    requests: List[BatchRequest]
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def create_stub_app(
+    responder: Responder = echo_responder,
+    polls_until_ended: int = 1,
+    latency: float = 0.0,
+    throttle_every: int = 0,
+    retry_after: float = 0.0,
+) -> FastAPI:
+    """
+    Build a stub app.
+
+    `responder` answers every message request; if it raises for a batch
+    request, that request is reported as errored. A batch ends on its
+    `polls_until_ended`-th retrieve. Message requests wait `latency`
+    seconds before answering, and with `throttle_every` set every n-th one
+    is rejected with a 429 carrying `retry-after`.
+    """
+    app = FastAPI(title="anthropic stub")
+    app.state.requests = 0
+    app.state.throttled = 0
+    batches: Dict[str, MessageBatch] = {}
+    pending: Dict[str, List[BatchRequest]] = {}
+    polls: Dict[str, int] = {}
+    results: Dict[str, List[BatchResult]] = {}
+
+    @app.post("/v1/messages")
+    async def messages(body: AnthropicRequest):
+        app.state.requests += 1
+        if throttle_every and app.state.requests % throttle_every == 0:
+            app.state.throttled += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(retry_after)},
+                content={"type": "error", "error": {
+                    "type": "rate_limit_error", "message": "stub rate limit"}},
+            )
+        if latency:
+            await asyncio.sleep(latency)
+        response = responder(body)
+        if body.stream:
+            return StreamingResponse(
+                stream_events(response), media_type="text/event-stream")
+        return response.model_dump(exclude_none=True)
+
+    @app.post("/v1/messages/batches")
+    async def create_batch(body: BatchCreateBody) -> MessageBatch:
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:12]}"
+        batches[batch_id] = MessageBatch(
+            id=batch_id,
+            processing_status="in_progress",
+            request_counts=BatchRequestCounts(processing=len(body.requests)),
+            created_at=now(),
+        )
+        pending[batch_id] = body.requests
+        polls[batch_id] = 0
+        return batches[batch_id]
+
+    @app.get("/v1/messages/batches/{batch_id}")
+    async def retrieve_batch(batch_id: str, request: Request) -> MessageBatch:
+        if batch_id not in batches:
+            raise HTTPException(status_code=404, detail="batch not found")
+        polls[batch_id] += 1
+        if batch_id in pending and polls[batch_id] >= polls_until_ended:
+            results[batch_id] = [run(r) for r in pending.pop(batch_id)]
+            counts = BatchRequestCounts()
+            for r in results[batch_id]:
+                setattr(counts, r.result.type, getattr(counts, r.result.type) + 1)
+            batches[batch_id] = batches[batch_id].model_copy(update={
+                "processing_status": "ended",
+                "request_counts": counts,
+                "ended_at": now(),
+                "results_url": f"{request.base_url}v1/messages/batches/{batch_id}/results",
+            })
+        return batches[batch_id]
+
+    @app.post("/v1/messages/batches/{batch_id}/cancel")
+    async def cancel_batch(batch_id: str) -> MessageBatch:
+        if batch_id not in batches:
+            raise HTTPException(status_code=404, detail="batch not found")
+        if batch_id in pending:
+            batches[batch_id] = batches[batch_id].model_copy(
+                update={"processing_status": "canceling"})
+        return batches[batch_id]
+
+    @app.get("/v1/messages/batches/{batch_id}/results")
+    async def batch_results(batch_id: str) -> StreamingResponse:
+        if batch_id not in results:
+            raise HTTPException(status_code=404, detail="results not ready")
+        lines = (r.model_dump_json(exclude_none=True) + "\n" for r in results[batch_id])
+        return StreamingResponse(lines, media_type="application/x-jsonl")
+
+    def run(batch_request: BatchRequest) -> BatchResult:
+        try:
+            result = {"type": "succeeded", "message": responder(batch_request.params)}
+        except Exception as e:
+            result = {"type": "errored", "error": {"type": "api_error", "message": str(e)}}
+        return BatchResult(custom_id=batch_request.custom_id, result=result)
+
+    return app
+
+
+app = create_stub_app()
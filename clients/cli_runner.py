@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+from telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+async def spawn_process(args: List[str]) -> asyncio.subprocess.Process:
+    # start_new_session puts the CLI (and anything it forks) in its own
+    # process group so a timeout can take the whole tree down
+    return await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+
+
+def kill_process_group(proc: asyncio.subprocess.Process) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class WarmProcessPool:
+    """
+    Keeps `size` CLI processes started ahead of time.
+
+    Each idle process has already paid interpreter/CLI startup and is
+    blocked reading its prompt from stdin, so a call only pays for the
+    model round-trip. Used processes are not reused; the pool refills in
+    the background after every acquire.
+    """
+
+    def __init__(self, args: List[str], size: int) -> None:
+        self.args = args
+        self.size = size
+        self._idle: Deque[asyncio.subprocess.Process] = deque()
+        self._refill: Optional[asyncio.Task] = None
+
+    async def fill(self) -> None:
+        try:
+            while len(self._idle) < self.size:
+                self._idle.append(await spawn_process(self.args))
+        except OSError as e:
+            logger.error(
+                "Failed to start warm CLI worker",
+                extra={"args": self.args[:1], "error": str(e)},
+            )
+
+    async def acquire(self) -> asyncio.subprocess.Process:
+        proc = None
+        while self._idle:
+            candidate = self._idle.popleft()
+            if candidate.returncode is None:
+                proc = candidate
+                break
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.create_task(self.fill())
+        return proc or await spawn_process(self.args)
+
+    async def aclose(self) -> None:
+        if self._refill is not None:
+            self._refill.cancel()
+        while self._idle:
+            proc = self._idle.popleft()
+            kill_process_group(proc)
+            await proc.wait()
+
+
+class CliRunner:
+    """
+    Runs external CLIs (gemini, claude) as non-blocking subprocesses.
+
+    Each CLI name gets its own concurrency limit, the prompt is fed over
+    stdin, stdout is streamed line by line, and on timeout or cancellation
+    the CLI's whole process group is killed.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        default_limit: int = 4,
+        timeout: float = 300,
+    ) -> None:
+        self.limits = limits or {}
+        self.default_limit = default_limit
+        self.timeout = timeout
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._warm_pools: Dict[Tuple[str, ...], WarmProcessPool] = {}
+
+    def semaphore(self, name: str) -> asyncio.Semaphore:
+        if name not in self._semaphores:
+            limit = self.limits.get(name, self.default_limit)
+            self._semaphores[name] = asyncio.Semaphore(limit)
+        return self._semaphores[name]
+
+    async def start_warm_pool(self, args: List[str], size: int) -> None:
+        """Pre-start `size` processes for calls made with exactly `args`"""
+        if size <= 0:
+            return
+        pool = WarmProcessPool(args, size)
+        self._warm_pools[tuple(args)] = pool
+        await pool.fill()
+
+    async def spawn(self, args: List[str]) -> asyncio.subprocess.Process:
+        pool = self._warm_pools.get(tuple(args))
+        if pool is not None:
+            return await pool.acquire()
+        return await spawn_process(args)
+
+    async def stream(
+        self,
+        name: str,
+        args: List[str],
+        input: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yield the CLI's stdout line by line.
+
+        Raises:
+            subprocess.TimeoutExpired: If the CLI runs past `timeout`
+            subprocess.CalledProcessError: If the CLI exits non-zero
+        """
+        with telemetry.span("cli.subprocess", cli=name):
+            async for line in self._stream(name, args, input, timeout):
+                yield line
+
+    async def _stream(
+        self,
+        name: str,
+        args: List[str],
+        input: Optional[str],
+        timeout: Optional[float],
+    ) -> AsyncIterator[str]:
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        queued = loop.time()
+        span = telemetry.current_span()
+
+        async with self.semaphore(name):
+            proc = await self.spawn(args)
+            span.set(queued_ms=(loop.time() - queued) * 1000, pid=proc.pid)
+            feeder = asyncio.create_task(self._feed(proc, input))
+            stderr = asyncio.create_task(proc.stderr.read())
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(args, timeout)
+                    try:
+                        line = await asyncio.wait_for(
+                            proc.stdout.readline(), remaining)
+                    except TimeoutError:
+                        raise subprocess.TimeoutExpired(args, timeout)
+                    if not line:
+                        break
+                    yield line.decode()
+                try:
+                    returncode = await asyncio.wait_for(
+                        proc.wait(), max(deadline - loop.time(), 0))
+                except TimeoutError:
+                    raise subprocess.TimeoutExpired(args, timeout)
+            finally:
+                # timeout, cancellation or the consumer walking away
+                if proc.returncode is None:
+                    kill_process_group(proc)
+                    await proc.wait()
+                feeder.cancel()
+
+            span.set(returncode=returncode)
+            telemetry.metrics.inc("cli_processes_total", cli=name, returncode=returncode)
+            if returncode != 0:
+                raise subprocess.CalledProcessError(
+                    returncode, args, stderr=(await stderr).decode())
+
+    async def run(
+        self,
+        name: str,
+        args: List[str],
+        input: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        return "".join([line async for line in self.stream(name, args, input, timeout)])
+
+    async def aclose(self) -> None:
+        for pool in self._warm_pools.values():
+            await pool.aclose()
+        self._warm_pools.clear()
+
+    @staticmethod
+    async def _feed(proc: asyncio.subprocess.Process, input: Optional[str]) -> None:
+        try:
+            if input:
+                proc.stdin.write(input.encode())
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            proc.stdin.close()
@@ -0,0 +1,225 @@
+import hashlib
+import json
+from collections import Counter
+from typing import Dict, List, Optional, Set
+from clients.anthropic_models import Message, TextBlock, ToolResultBlock, ToolUseBlock
+
+# rough chars-per-token for english, markdown and TOML; errs on the high
+# side of the real tokenizer so the budget stays under the model limit
+CHARS_PER_TOKEN = 3.5
+MESSAGE_OVERHEAD = 4
+BLOCK_OVERHEAD = 10
+
+# tools whose results are complete TOML drafts: only the newest matters
+DRAFT_TOOLS = {
+    "convert_markdown_to_toml",
+    "convert_markdown_to_toml_gemini",
+    "convert_markdown_to_toml_claude_code",
+    "repair_toml",
+    "process_errors_claude",
+}
+
+
+def estimate_tokens(message: Message) -> int:
+    if isinstance(message.content, str):
+        return MESSAGE_OVERHEAD + int(len(message.content) / CHARS_PER_TOKEN)
+    chars = 0
+    for block in message.content:
+        match block.type:
+            case "text":
+                chars += len(block.text)
+            case "tool_use":
+                chars += len(json.dumps(block.input))
+            case "tool_result":
+                chars += len(block.content)
+    overhead = MESSAGE_OVERHEAD + BLOCK_OVERHEAD * len(message.content)
+    return overhead + int(chars / CHARS_PER_TOKEN)
+
+
+def reference(payload: str, excerpt: int = 200) -> str:
+    """Short stand-in for a large payload; the full text stays in the session store"""
+    digest = hashlib.sha256(payload.encode()).hexdigest()[:16]
+    return (
+        f"[truncated {len(payload)} chars, sha256:{digest}] "
+        f"{payload[:excerpt]}..."
+    )
+
+
+class ContextWindow:
+    """
+    Keeps an agent's history under a token budget.
+
+    Token estimates are cached per message, so tracking a turn only
+    measures the messages added since the last call. When the history
+    exceeds `budget` it is compacted down to `low_water * budget` in
+    three passes, each only touching messages older than `keep_recent`:
+
+    1. results of superseded TOML drafts are dropped,
+    2. large tool results and tool inputs become short references,
+    3. the oldest turns are folded into a single summary message.
+
+    Compacting well below the budget means it runs rarely, which keeps
+    the prompt cache prefix stable between compactions.
+    """
+
+    def __init__(
+        self,
+        budget: int = 100_000,
+        low_water: float = 0.75,
+        keep_recent: int = 4,
+        max_payload_chars: int = 2_000,
+        draft_tools: Optional[Set[str]] = None,
+    ) -> None:
+        self.budget = budget
+        self.low_water = low_water
+        self.keep_recent = keep_recent
+        self.max_payload_chars = max_payload_chars
+        self.draft_tools = DRAFT_TOOLS if draft_tools is None else draft_tools
+        self.total = 0
+        self.compactions = 0
+        self._estimates: List[int] = []
+
+    def track(self, messages: List[Message]) -> int:
+        """Account for messages appended since the last call; returns the total"""
+        for message in messages[len(self._estimates):]:
+            tokens = estimate_tokens(message)
+            self._estimates.append(tokens)
+            self.total += tokens
+        return self.total
+
+    def fit(self, messages: List[Message]) -> int:
+        """
+        Compact `messages` in place if over budget.
+
+        Returns how many messages were removed from the front of the list.
+        """
+        if self.track(messages) <= self.budget:
+            return 0
+        target = int(self.budget * self.low_water)
+        stale = max(len(messages) - self.keep_recent, 0)
+        self.compactions += 1
+
+        self._drop_superseded_drafts(messages, stale)
+        if self.total > target:
+            self._truncate_payloads(messages, stale)
+        if self.total > target:
+            return self._summarize(messages, stale, target)
+        return 0
+
+    def _replace(self, messages: List[Message], i: int, message: Message) -> None:
+        messages[i] = message
+        tokens = estimate_tokens(message)
+        self.total += tokens - self._estimates[i]
+        self._estimates[i] = tokens
+
+    def _tool_names(self, messages: List[Message]) -> Dict[str, str]:
+        return {
+            block.id: block.name
+            for m in messages
+            if m.role == "assistant" and not isinstance(m.content, str)
+            for block in m.content
+            if block.type == "tool_use"
+        }
+
+    def _drop_superseded_drafts(self, messages: List[Message], stale: int) -> None:
+        names = self._tool_names(messages)
+        drafts = [
+            (i, j)
+            for i, m in enumerate(messages)
+            if m.role == "user" and not isinstance(m.content, str)
+            for j, block in enumerate(m.content)
+            if block.type == "tool_result"
+            and names.get(block.tool_use_id) in self.draft_tools
+        ]
+        # keep the newest draft wherever it is
+        for i, j in drafts[:-1]:
+            if i >= stale:
+                continue
+            block = messages[i].content[j]
+            if block.content.startswith("[superseded"):
+                continue
+            content = list(messages[i].content)
+            content[j] = block.model_copy(
+                update={"content": "[superseded TOML draft removed]"})
+            self._replace(messages, i, messages[i].model_copy(update={"content": content}))
+
+    def _truncate_payloads(self, messages: List[Message], stale: int) -> None:
+        limit = self.max_payload_chars
+        for i in range(stale):
+            m = messages[i]
+            if isinstance(m.content, str):
+                continue
+            changed = False
+            content = []
+            for block in m.content:
+                if isinstance(block, ToolResultBlock) and len(block.content) > limit:
+                    block = block.model_copy(
+                        update={"content": reference(block.content)})
+                    changed = True
+                elif isinstance(block, ToolUseBlock):
+                    args = {
+                        k: reference(v) if isinstance(v, str) and len(v) > limit else v
+                        for k, v in block.input.items()
+                    }
+                    if args != block.input:
+                        block = block.model_copy(update={"input": args})
+                        changed = True
+                content.append(block)
+            if changed:
+                self._replace(messages, i, m.model_copy(update={"content": content}))
+
+    def _summarize(self, messages: List[Message], stale: int, target: int) -> int:
+        # cutting right before an assistant message keeps every remaining
+        # tool_use paired with the tool_result that follows it
+        last = min(stale, len(messages) - 1)
+        cuts = [i for i in range(1, last + 1) if messages[i].role == "assistant"]
+        if not cuts:
+            return 0
+        cut = cuts[-1]
+        for candidate in cuts:
+            if self.total - sum(self._estimates[:candidate]) <= target:
+                cut = candidate
+                break
+
+        summary = Message(
+            role="user",
+            content=[TextBlock(text=self._summary_text(messages[:cut]), type="text")],
+        )
+        tokens = estimate_tokens(summary)
+        self.total += tokens - sum(self._estimates[:cut])
+        messages[:cut] = [summary]
+        self._estimates[:cut] = [tokens]
+        return cut - 1
+
+    def _summary_text(self, removed: List[Message]) -> str:
+        names = self._tool_names(removed)
+        calls = Counter(names.values())
+        failed = Counter(
+            names.get(block.tool_use_id)
+            for m in removed
+            if m.role == "user" and not isinstance(m.content, str)
+            for block in m.content
+            if block.type == "tool_result" and block.is_error
+        )
+        request = next(
+            (self._text(m) for m in removed if m.role == "user" and self._text(m)), "")
+        note = next(
+            (self._text(m) for m in reversed(removed)
+             if m.role == "assistant" and self._text(m)), "")
+
+        lines = [f"[Earlier conversation compacted: {len(removed)} messages]"]
+        if request:
+            lines.append(f"Original request: {request[:1000]}")
+        if calls:
+            lines.append("Tool calls so far: " + ", ".join(
+                f"{name} x{n}" + (f" ({failed[name]} failed)" if failed[name] else "")
+                for name, n in calls.items()))
+        if note:
+            lines.append(f"Last assistant note: {note[:500]}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _text(message: Message) -> str:
+        if isinstance(message.content, str):
+            return message.content
+        return "".join(b.text for b in message.content if b.type == "text")
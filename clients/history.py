@@ -0,0 +1,235 @@
+import sys
+from collections.abc import MutableSequence
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from clients.anthropic_models import (
+    CacheControl,
+    ContentBlock,
+    Message,
+    TextBlock,
+    ToolResultBlock,
+    ToolUseBlock,
+)
+
+
+class TextRecord:
+    __slots__ = ("text", "cache_control")
+
+    def __init__(self, text: str, cache_control: Optional[CacheControl]) -> None:
+        self.text = text
+        self.cache_control = cache_control
+
+    def block(self) -> TextBlock:
+        return TextBlock.model_construct(
+            text=self.text, type="text", cache_control=self.cache_control)
+
+
+class ToolUseRecord:
+    __slots__ = ("id", "name", "input", "cache_control")
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        input: Dict[str, Any],
+        cache_control: Optional[CacheControl],
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.input = input
+        self.cache_control = cache_control
+
+    def block(self) -> ToolUseBlock:
+        return ToolUseBlock.model_construct(
+            id=self.id, name=self.name, input=dict(self.input),
+            type="tool_use", cache_control=self.cache_control)
+
+
+class ToolResultRecord:
+    __slots__ = ("tool_use_id", "content", "is_error", "cache_control")
+
+    def __init__(
+        self,
+        tool_use_id: str,
+        content: str,
+        is_error: Optional[bool],
+        cache_control: Optional[CacheControl],
+    ) -> None:
+        self.tool_use_id = tool_use_id
+        self.content = content
+        self.is_error = is_error
+        self.cache_control = cache_control
+
+    def block(self) -> ToolResultBlock:
+        return ToolResultBlock.model_construct(
+            tool_use_id=self.tool_use_id, content=self.content,
+            is_error=self.is_error, type="tool_result",
+            cache_control=self.cache_control)
+
+
+BlockRecord = Union[TextRecord, ToolUseRecord, ToolResultRecord]
+
+
+class MessageRecord:
+    __slots__ = ("role", "content", "message")
+
+    def __init__(self, role: str, content: Union[str, Tuple[BlockRecord, ...]]) -> None:
+        self.role = role
+        self.content = content
+        # materialized Message, kept only while the session is active
+        self.message: Optional[Message] = None
+
+
+class HistoryStore(MutableSequence):
+    """
+    Conversation history kept as slotted records instead of pydantic models.
+
+    Reads as a list of `Message`, so the agent, ContextWindow and the
+    session store use it unchanged. Large strings (markdown, TOML drafts,
+    tool output) are interned per session, so the prompt, the tool_use
+    input that repeats it and the tool result share one object. A
+    `Message` is built on first access and reused until `release()`,
+    which the agent calls when a run finishes; idle sessions only hold
+    the records and the interned strings. The string pool is rebuilt
+    after messages are replaced or removed, so it never outlives the
+    history it serves.
+    """
+
+    def __init__(
+        self, messages: Iterable[Message] = (), min_intern_chars: int = 256
+    ) -> None:
+        self.min_intern_chars = min_intern_chars
+        self._records: List[MessageRecord] = []
+        self._strings: Dict[str, str] = {}
+        self.deduped_bytes = 0
+        self._stale_strings = False
+        self.extend(messages)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._materialize(r) for r in self._records[index]]
+        return self._materialize(self._records[index])
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            self._records[index] = [self._record(m) for m in value]
+        else:
+            self._records[index] = self._record(value)
+        self._stale_strings = True
+
+    def __delitem__(self, index) -> None:
+        del self._records[index]
+        self._stale_strings = True
+
+    def insert(self, index: int, value: Message) -> None:
+        self._records.insert(index, self._record(value))
+
+    def release(self) -> None:
+        """Drop materialized messages and unreferenced strings"""
+        for record in self._records:
+            record.message = None
+        if self._stale_strings:
+            self._rebuild_strings()
+
+    def stats(self) -> Dict[str, int]:
+        if self._stale_strings:
+            self._rebuild_strings()
+        string_bytes = sum(sys.getsizeof(s) for s in self._strings.values())
+        record_bytes = sum(self._record_size(r) for r in self._records)
+        return {
+            "messages": len(self._records),
+            "interned_strings": len(self._strings),
+            "string_bytes": string_bytes,
+            "record_bytes": record_bytes,
+            "resident_bytes": string_bytes + record_bytes,
+            "deduped_bytes": self.deduped_bytes,
+        }
+
+    def _intern(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if len(value) < self.min_intern_chars:
+                return value
+            interned = self._strings.setdefault(value, value)
+            if interned is not value:
+                self.deduped_bytes += sys.getsizeof(value)
+            return interned
+        if isinstance(value, dict):
+            return {k: self._intern(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._intern(v) for v in value]
+        return value
+
+    def _block_record(self, block: ContentBlock) -> BlockRecord:
+        match block.type:
+            case "text":
+                return TextRecord(self._intern(block.text), block.cache_control)
+            case "tool_use":
+                return ToolUseRecord(
+                    block.id, block.name, self._intern(block.input),
+                    block.cache_control)
+            case "tool_result":
+                return ToolResultRecord(
+                    block.tool_use_id, self._intern(block.content),
+                    block.is_error, block.cache_control)
+
+    def _record(self, message: Message) -> MessageRecord:
+        if isinstance(message.content, str):
+            content = self._intern(message.content)
+        else:
+            content = tuple(self._block_record(b) for b in message.content)
+        record = MessageRecord(message.role, content)
+        # the caller's object serves until release(), which keeps
+        # per-object caches (e.g. RequestEncoder) warm within a run
+        record.message = message
+        return record
+
+    def _materialize(self, record: MessageRecord) -> Message:
+        if record.message is None:
+            content = record.content
+            if not isinstance(content, str):
+                content = [block.block() for block in content]
+            record.message = Message.model_construct(role=record.role, content=content)
+        return record.message
+
+    def _rebuild_strings(self) -> None:
+        live: Dict[str, str] = {}
+
+        def collect(value: Any) -> None:
+            if isinstance(value, str):
+                if value in self._strings:
+                    live[value] = value
+            elif isinstance(value, dict):
+                for v in value.values():
+                    collect(v)
+            elif isinstance(value, list):
+                for v in value:
+                    collect(v)
+
+        for record in self._records:
+            if isinstance(record.content, str):
+                collect(record.content)
+                continue
+            for block in record.content:
+                match block:
+                    case TextRecord():
+                        collect(block.text)
+                    case ToolUseRecord():
+                        collect(block.input)
+                    case ToolResultRecord():
+                        collect(block.content)
+        self._strings = live
+        self._stale_strings = False
+
+    @staticmethod
+    def _record_size(record: MessageRecord) -> int:
+        size = sys.getsizeof(record)
+        if isinstance(record.content, str):
+            return size
+        size += sys.getsizeof(record.content)
+        for block in record.content:
+            size += sys.getsizeof(block)
+            if isinstance(block, ToolUseRecord):
+                size += sys.getsizeof(block.input)
+        return size
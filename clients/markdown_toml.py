@@ -0,0 +1,202 @@
+"""
+Deterministic markdown -> TOML conversion for slash-command files.
+
+A command file is optional YAML front matter followed by a markdown
+prompt. It becomes a Gemini CLI command: front matter keys become
+top-level TOML keys, `description` falls back to the first heading, and
+the body becomes a multi-line `prompt` string with `$ARGUMENTS` rewritten
+to `{{args}}`. The document is read in one pass over its lines; fenced
+code blocks are copied verbatim and never scanned for headings.
+
+Anything outside that layout (nested YAML, an unclosed fence, a document
+with neither front matter nor a heading) raises ValueError so the caller
+can fall back to an LLM converter.
+"""
+import itertools
+import json
+import re
+import tomllib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+HEADING = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+FRONT_MATTER_KEY = re.compile(r"^([A-Za-z0-9_-]+):(?:\s+(.*?))?\s*$")
+LIST_ITEM = re.compile(r"^\s+-\s+(.*?)\s*$")
+BARE_KEY = re.compile(r"^[A-Za-z0-9_-]+$")
+INTEGER = re.compile(r"^[+-]?\d+$")
+# control characters a TOML string can't hold as-is (tab and newline can)
+CONTROL = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+
+ARGUMENTS = "$ARGUMENTS"
+GEMINI_ARGUMENTS = "{{args}}"
+
+
+class MarkdownDocument:
+    __slots__ = ("front_matter", "headings", "body")
+
+    def __init__(self) -> None:
+        self.front_matter: Dict[str, Any] = {}
+        self.headings: List[Tuple[int, str]] = []
+        self.body: List[str] = []
+
+
+def yaml_scalar(value: str) -> Any:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    if value.startswith("[") and value.endswith("]"):
+        items = [v.strip() for v in value[1:-1].split(",")]
+        return [yaml_scalar(v) for v in items if v]
+    if value in ("true", "false"):
+        return value == "true"
+    if INTEGER.match(value):
+        return int(value)
+    if value[:1] in ("|", ">", "{", "&", "*", "!"):
+        raise ValueError(f"unsupported front matter value: {value!r}")
+    return value
+
+
+def closes(fence: str, line: str) -> bool:
+    marker = FENCE.match(line)
+    return (
+        marker is not None
+        and marker.group(1)[0] == fence[0]
+        and len(marker.group(1)) >= len(fence)
+        # a closing fence has no info string
+        and not line.strip().strip(fence[0])
+    )
+
+
+def parse_markdown(lines: Iterable[str]) -> MarkdownDocument:
+    """
+    Split a command file into front matter, headings and body.
+
+    Raises:
+        ValueError: If the front matter isn't flat `key: value` YAML or a
+            code fence is never closed
+    """
+    doc = MarkdownDocument()
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return doc
+    if first.strip() == "---":
+        parse_front_matter(lines, doc.front_matter)
+    else:
+        lines = itertools.chain([first], lines)
+
+    fence: Optional[str] = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if fence is not None:
+            if closes(fence, line):
+                fence = None
+        elif marker := FENCE.match(line):
+            fence = marker.group(1)
+        elif heading := HEADING.match(line):
+            doc.headings.append((len(heading.group(1)), heading.group(2)))
+        doc.body.append(line)
+    if fence is not None:
+        raise ValueError("unclosed code fence")
+
+    # trim blank lines around the body
+    start, end = 0, len(doc.body)
+    while start < end and not doc.body[start].strip():
+        start += 1
+    while end > start and not doc.body[end - 1].strip():
+        end -= 1
+    doc.body = doc.body[start:end]
+    return doc
+
+
+def parse_front_matter(lines: Iterator[str], front_matter: Dict[str, Any]) -> None:
+    """Read `key: value` lines up to the closing `---`"""
+    key: Optional[str] = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.strip() == "---":
+            return
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        if item := LIST_ITEM.match(line):
+            if key is None or not isinstance(front_matter[key], list):
+                raise ValueError(f"unexpected front matter line: {line!r}")
+            front_matter[key].append(yaml_scalar(item.group(1)))
+            continue
+        match = FRONT_MATTER_KEY.match(line)
+        if match is None:
+            raise ValueError(f"unsupported front matter line: {line!r}")
+        key, value = match.group(1), match.group(2)
+        # an empty value starts a block list
+        front_matter[key] = yaml_scalar(value) if value else []
+    raise ValueError("front matter is never closed")
+
+
+def toml_key(key: str) -> str:
+    return key if BARE_KEY.match(key) else json.dumps(key)
+
+
+def toml_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, list):
+        return "[" + ", ".join(toml_value(v) for v in value) + "]"
+    # a JSON string is a valid TOML basic string
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def toml_multiline(text: str) -> str:
+    """
+    `text` (ending in a newline) as a TOML multi-line string.
+
+    Literal strings need no escaping, which keeps regexes and Windows
+    paths in prompts readable; text a literal string can't hold goes
+    into a basic string with backslashes, control characters and runs
+    of three quotes escaped.
+    """
+    if "'''" not in text and not CONTROL.search(text):
+        return "'''\n" + text + "'''"
+    escaped = text.replace("\\", "\\\\")
+    escaped = CONTROL.sub(lambda m: f"\\u{ord(m.group()):04x}", escaped)
+    escaped = escaped.replace('"""', '""\\"')
+    return '"""\n' + escaped + '"""'
+
+
+def markdown_to_toml(markdown: str) -> str:
+    """
+    Convert a slash-command markdown file to a Gemini CLI command TOML.
+
+    Raises:
+        ValueError: If the document doesn't follow the command layout
+    """
+    doc = parse_markdown(markdown.splitlines())
+    if not doc.body:
+        raise ValueError("document has no prompt")
+    if not doc.front_matter and not doc.headings:
+        raise ValueError("document has neither front matter nor a heading")
+    if "prompt" in doc.front_matter:
+        raise ValueError("front matter already has a `prompt` key")
+
+    fields = dict(doc.front_matter)
+    if not fields.get("description") and doc.headings:
+        fields["description"] = doc.headings[0][1]
+    description = fields.pop("description", None)
+    prompt = "\n".join(doc.body).replace(ARGUMENTS, GEMINI_ARGUMENTS) + "\n"
+
+    out: List[str] = []
+    if description:
+        out.append(f"description = {toml_value(description)}")
+    for key, value in fields.items():
+        out.append(f"{toml_key(key)} = {toml_value(value)}")
+    out.append(f"prompt = {toml_multiline(prompt)}")
+    toml = "\n".join(out) + "\n"
+
+    # cheap next to an LLM round-trip, and nothing invalid gets out
+    try:
+        parsed = tomllib.loads(toml)
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"generated invalid TOML: {e}") from e
+    if parsed["prompt"] != prompt:
+        raise ValueError("prompt did not survive TOML escaping")
+    return toml
@@ -0,0 +1,45 @@
+from typing import List, Optional, Tuple, Union
+from clients.anthropic_models import CacheControl, Message, TextBlock, Tool
+
+# the Messages API accepts at most four cache_control breakpoints
+MAX_BREAKPOINTS = 4
+
+
+def mark_last_block(message: Message) -> Message:
+    """Copy of `message` with a breakpoint on its final content block"""
+    content = message.content
+    if isinstance(content, str):
+        content = [TextBlock(text=content, type="text")]
+    last = content[-1].model_copy(update={"cache_control": CacheControl()})
+    return message.model_copy(update={"content": [*content[:-1], last]})
+
+
+def add_cache_breakpoints(
+    tools: List[Tool],
+    system: Optional[str],
+    messages: List[Message],
+) -> Tuple[List[Tool], Optional[Union[str, List[TextBlock]]], List[Message]]:
+    """
+    Place prompt cache breakpoints on the stable prefix of a request.
+
+    The tool list and system prompt never change within a session, so
+    each gets a breakpoint. The remaining breakpoints go on the most
+    recent user messages: the newest writes the whole conversation to the
+    cache for the next iteration, and the earlier ones read back what
+    previous iterations wrote. Inputs are not mutated; only the marked
+    items are copied.
+    """
+    if tools:
+        tools = [
+            *tools[:-1],
+            tools[-1].model_copy(update={"cache_control": CacheControl()}),
+        ]
+    if system:
+        system = [TextBlock(text=system, type="text", cache_control=CacheControl())]
+
+    used = int(bool(tools)) + int(bool(system))
+    messages = list(messages)
+    user_indexes = [i for i, m in enumerate(messages) if m.role == "user"]
+    for i in user_indexes[-(MAX_BREAKPOINTS - used):]:
+        messages[i] = mark_last_block(messages[i])
+    return tools, system, messages
@@ -0,0 +1,234 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from datetime import datetime
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from clients.anthropic_models import Usage
+from telemetry import telemetry
+
+# 529 is Anthropic's "overloaded"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class TokenBucket:
+    """Capacity refilled continuously at `capacity` per minute"""
+
+    def __init__(self, capacity: float) -> None:
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.capacity
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync(self, limit: float, remaining: float) -> None:
+        # the server's view wins over our estimate
+        self.refill()
+        self.capacity = float(limit)
+        self.tokens = min(float(remaining), self.capacity)
+
+
+class RateLimitScheduler:
+    """
+    Process-wide admission control and retry policy for Anthropic calls.
+
+    Requests, input tokens and output tokens each have a token bucket,
+    seeded from config and corrected from the `anthropic-ratelimit-*`
+    response headers. Callers queue by priority (interactive before
+    batch, FIFO within a priority) and only the head of the queue may
+    take capacity, so a large request is not starved by small ones.
+    Retryable failures back off exponentially with full jitter, honoring
+    `retry-after`; a 429 pauses admission for everyone so waiting callers
+    do not stampede the API when the window reopens.
+
+    With several service processes, each one gets `share` of the limits
+    (and of what the headers say remains), so together they stay within
+    the organization's quota.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 50,
+        input_tokens_per_minute: int = 30_000,
+        output_tokens_per_minute: int = 8_000,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        share: float = 1.0,
+    ) -> None:
+        self.share = share
+        self.buckets = {
+            "requests": TokenBucket(requests_per_minute * share),
+            "input-tokens": TokenBucket(input_tokens_per_minute * share),
+            "output-tokens": TokenBucket(output_tokens_per_minute * share),
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.throttled = 0
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._changed = asyncio.Condition()
+        self._paused_until = 0.0
+
+    async def acquire(
+        self, input_tokens: int, max_tokens: int, priority: Priority
+    ) -> None:
+        cost = {"requests": 1, "input-tokens": input_tokens, "output-tokens": max_tokens}
+        entry = (int(priority), next(self._seq))
+        heapq.heappush(self._waiters, entry)
+        started = time.monotonic()
+        try:
+            async with self._changed:
+                while True:
+                    wait = self._paused_until - time.monotonic()
+                    if self._waiters[0] == entry and wait <= 0:
+                        wait = max(
+                            self.buckets[name].wait_time(amount)
+                            for name, amount in cost.items())
+                        if wait <= 0:
+                            for name, amount in cost.items():
+                                self.buckets[name].take(amount)
+                            return
+                    try:
+                        await asyncio.wait_for(
+                            self._changed.wait(), max(wait, 0.05) if wait > 0 else None)
+                    except TimeoutError:
+                        pass
+        finally:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            waited = time.monotonic() - started
+            telemetry.metrics.observe(
+                "anthropic_admission_wait_seconds", waited, priority=priority.name)
+            span = telemetry.current_span()
+            if span is not None:
+                span.add("admission_wait_ms", waited * 1000)
+            await self._notify()
+
+    def record_usage(self, input_tokens: int, max_tokens: int, usage: Usage) -> None:
+        """Settle the reservation made by `acquire` against actual usage"""
+        self.buckets["input-tokens"].give(input_tokens - usage.input_tokens)
+        self.buckets["output-tokens"].give(max_tokens - usage.output_tokens)
+
+    def refund(
+        self, input_tokens: int, max_tokens: int, response: Optional[httpx.Response] = None
+    ) -> None:
+        """
+        Give back the token reservation of an attempt that used none, e.g.
+        a transport error or an error response. The request itself stays
+        counted, and buckets the response's headers already synced are
+        left alone.
+        """
+        for name, amount in (("input-tokens", input_tokens), ("output-tokens", max_tokens)):
+            if response is None or (
+                f"anthropic-ratelimit-{name}-remaining" not in response.headers
+            ):
+                self.buckets[name].give(amount)
+
+    def update(self, headers: httpx.Headers) -> None:
+        for name, bucket in self.buckets.items():
+            limit = headers.get(f"anthropic-ratelimit-{name}-limit")
+            remaining = headers.get(f"anthropic-ratelimit-{name}-remaining")
+            if limit is not None and remaining is not None:
+                bucket.sync(int(limit) * self.share, int(remaining) * self.share)
+
+    def retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after is not None:
+                try:
+                    return min(float(retry_after), self.max_delay)
+                except ValueError:
+                    pass
+            reset = response.headers.get("anthropic-ratelimit-requests-reset")
+            if response.status_code == 429 and reset is not None:
+                try:
+                    seconds = datetime.fromisoformat(reset).timestamp() - time.time()
+                except ValueError:
+                    seconds = 0
+                if seconds > 0:
+                    return min(seconds, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def backoff(self, attempt: int, response: Optional[httpx.Response]) -> None:
+        delay = self.retry_delay(attempt, response)
+        self.retries += 1
+        status = response.status_code if response is not None else "transport_error"
+        telemetry.metrics.inc("anthropic_retries_total", status=status)
+        span = telemetry.current_span()
+        if span is not None:
+            span.add("retries")
+        if response is not None and response.status_code == 429:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            await self._notify()
+        await asyncio.sleep(delay)
+
+    async def call(
+        self,
+        send: Callable[[], Awaitable[httpx.Response]],
+        input_tokens: int,
+        max_tokens: int,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> httpx.Response:
+        """
+        Admit, send and retry; returns the last response. The caller
+        settles a successful one with `record_usage`.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(input_tokens, max_tokens, priority)
+            try:
+                response = await send()
+            except httpx.TransportError:
+                self.refund(input_tokens, max_tokens)
+                if attempt == self.max_retries:
+                    raise
+                await self.backoff(attempt, None)
+                continue
+            self.update(response.headers)
+            if response.is_error:
+                # only a successful response is settled by `record_usage`
+                self.refund(input_tokens, max_tokens, response)
+                if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                    await self.backoff(attempt, response)
+                    continue
+            return response
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "queued": len(self._waiters),
+            **{f"{name}_available": b.tokens for name, b in self.buckets.items()},
+        }
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
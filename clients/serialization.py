@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from typing import Any, Tuple
+from pydantic import BaseModel
+from pydantic_core import to_json
+from clients.anthropic_models import AnthropicRequest
+
+
+class RequestEncoder:
+    """
+    Encodes AnthropicRequests straight to JSON bytes.
+
+    Each turn of an agent resends the whole conversation, but only the
+    newest messages are new objects: history, tool definitions and
+    compaction all replace models with `model_copy` rather than mutating
+    them. The encoded bytes of each message and tool are therefore cached
+    by object identity and spliced into the body, so a turn only pays for
+    the items it added. The cache keeps a reference to every entry so an
+    id is never reused while it is cached; entries are evicted LRU.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[int, Tuple[BaseModel, bytes]] = OrderedDict()
+
+    def encode_item(self, item: BaseModel) -> bytes:
+        key = id(item)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] is item:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        encoded = to_json(item, exclude_none=True)
+        self._cache[key] = (item, encoded)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return encoded
+
+    def encode_list(self, items: list) -> bytes:
+        return b"[" + b",".join(self.encode_item(item) for item in items) + b"]"
+
+    def encode(self, request: AnthropicRequest, **extra: Any) -> bytes:
+        """Same JSON as `model_dump(exclude_none=True)` plus `extra` fields"""
+        fields = request.model_dump(
+            exclude_none=True, exclude={"messages", "tools"})
+        fields.update(extra)
+        parts = [b'"messages":' + self.encode_list(request.messages)]
+        if request.tools is not None:
+            parts.append(b'"tools":' + self.encode_list(request.tools))
+        parts.extend(
+            to_json(name) + b":" + to_json(value) for name, value in fields.items())
+        return b"{" + b",".join(parts) + b"}"
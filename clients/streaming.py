@@ -0,0 +1,89 @@
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import TypeAdapter
+from clients.anthropic_models import (
+    AnthropicResponse,
+    StreamEvent,
+    TextBlock,
+    ToolUseBlock,
+)
+
+stream_event_adapter = TypeAdapter(StreamEvent)
+
+
+async def aiter_sse(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Parse a server-sent event stream into (event, data) pairs.
+
+    Multiple `data:` lines of one event are joined with newlines and the
+    event is dispatched on the blank line that terminates it.
+    """
+    event = "message"
+    data: List[str] = []
+    async for line in lines:
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+            continue
+        if line.startswith(":"):
+            # comment / keep-alive
+            continue
+        field, _, value = line.partition(":")
+        value = value.removeprefix(" ")
+        if field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+    if data:
+        yield event, "\n".join(data)
+
+
+def parse_stream_event(data: str) -> StreamEvent:
+    return stream_event_adapter.validate_json(data)
+
+
+class StreamAccumulator:
+    """
+    Rebuilds the final AnthropicResponse from a sequence of stream events.
+
+    Text deltas are concatenated and `input_json_delta` fragments are
+    buffered per block until `content_block_stop`, when the tool input
+    JSON is complete and can be decoded.
+    """
+
+    def __init__(self) -> None:
+        self.message: Optional[AnthropicResponse] = None
+        self.blocks: Dict[int, TextBlock | ToolUseBlock] = {}
+        self.partial_json: Dict[int, List[str]] = {}
+
+    def add(self, event: StreamEvent) -> None:
+        match event.type:
+            case "message_start":
+                self.message = event.message
+            case "content_block_start":
+                self.blocks[event.index] = event.content_block.model_copy()
+                self.partial_json[event.index] = []
+            case "content_block_delta":
+                block = self.blocks[event.index]
+                match event.delta.type:
+                    case "text_delta":
+                        block.text += event.delta.text
+                    case "input_json_delta":
+                        self.partial_json[event.index].append(
+                            event.delta.partial_json)
+            case "content_block_stop":
+                block = self.blocks[event.index]
+                fragments = self.partial_json.pop(event.index, [])
+                if block.type == "tool_use" and fragments:
+                    block.input = json.loads("".join(fragments))
+            case "message_delta":
+                self.message.stop_reason = event.delta.stop_reason
+                self.message.stop_sequence = event.delta.stop_sequence
+                self.message.usage.output_tokens = event.usage.output_tokens
+
+    def response(self) -> AnthropicResponse:
+        if self.message is None:
+            raise RuntimeError("Stream ended before message_start")
+        content = [self.blocks[i] for i in sorted(self.blocks)]
+        return self.message.model_copy(update={"content": content})
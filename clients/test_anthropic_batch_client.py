@@ -0,0 +1,87 @@
+import asyncio
+import httpx
+import pytest
+from clients.anthropic_batch_client import AnthropicBatchClient
+from clients.anthropic_models import AnthropicRequest, Message
+from clients.anthropic_stub import StubSecretManager, create_stub_app, echo_responder
+from config import Config
+
+
+def responder(request: AnthropicRequest):
+    if request.messages[-1].content == "fail":
+        raise ValueError("overloaded")
+    return echo_responder(request)
+
+
+@pytest.fixture
+async def batch_client():
+    config = Config()
+    config.anthropic_base_url = "http://anthropic.stub"
+    stub = create_stub_app(responder, polls_until_ended=2)
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))
+    yield AnthropicBatchClient(
+        config, StubSecretManager(), "claude-test",
+        http_client=http_client, poll_interval=0.01,
+    )
+    await http_client.aclose()
+
+
+def request(prompt: str) -> AnthropicRequest:
+    return AnthropicRequest(
+        model="claude-test",
+        max_tokens=64,
+        messages=[Message(role="user", content=prompt)],
+    )
+
+
+async def test_run_streams_results_keyed_by_custom_id(batch_client):
+    requests = {f"doc-{i}": request(f"convert {i}") for i in range(5)}
+    requests["doc-bad"] = request("fail")
+
+    results = {
+        r.custom_id: r.result
+        async for r in batch_client.run(requests, batch_size=2)
+    }
+
+    assert set(results) == set(requests)
+    assert results["doc-3"].message.content[0].text == "echo: convert 3"
+    assert results["doc-bad"].type == "errored"
+    assert results["doc-bad"].error["message"] == "overloaded"
+
+
+async def test_wait_polls_until_ended(batch_client):
+    batch = await batch_client.create({"only": request("hi")})
+    assert batch.processing_status == "in_progress"
+    ended = await batch_client.wait(batch.id)
+    assert ended.request_counts.succeeded == 1
+    assert ended.results_url.endswith(f"{batch.id}/results")
+
+
+async def test_abandoned_run_cancels_unfinished_batches():
+    config = Config()
+    config.anthropic_base_url = "http://anthropic.stub"
+    stub = create_stub_app(responder, polls_until_ended=1000)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub)) as http_client:
+        client = AnthropicBatchClient(
+            config, StubSecretManager(), "claude-test",
+            http_client=http_client, poll_interval=0.01,
+        )
+        created = []
+        create = client.create
+
+        async def recording_create(chunk):
+            batch = await create(chunk)
+            created.append(batch.id)
+            return batch
+
+        client.create = recording_create
+        requests = {f"doc-{i}": request(f"convert {i}") for i in range(6)}
+        first = asyncio.create_task(anext(client.run(requests, batch_size=2)))
+        while len(created) < 3:
+            await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        statuses = [(await client.retrieve(i)).processing_status for i in created]
+        assert statuses == ["canceling"] * 3
@@ -1,41 +1,20 @@
 from pathlib import Path
 from typing import Optional
-from clients.tools import (
-    tool_convert_markdown_to_toml_gemini,
-    tool_convert_markdown_to_toml_claude_code,
-    tool_validate_toml,
-    tool_process_errors_claude,
-    convert_markdown_to_toml_gemini,
-    convert_markdown_to_toml_claude_code,
-    validate_toml,
-    process_errors_claude
-)
 import uuid
+import httpx
 import pytest
 from config import Config
 from secret_manager import SecretManager
 from clients.anthropic_client import AnthropicClient
+from clients.anthropic_models import AnthropicRequest, Message
+from clients.anthropic_stub import StubSecretManager
 
 from agent import Agent
+from clients.tool_registry import registry as tool_registry
 import logging
 logger = logging.getLogger()
 
 
-tools = [
-    tool_convert_markdown_to_toml_gemini,
-    tool_convert_markdown_to_toml_claude_code,
-    tool_validate_toml,
-    tool_process_errors_claude,
-]
-
-tool_registry = {
-    "convert_markdown_to_toml_gemini": convert_markdown_to_toml_gemini,
-    "convert_markdown_to_toml_claude_code": convert_markdown_to_toml_claude_code,
-    "validate_toml": validate_toml,
-    "process_errors_claude": process_errors_claude,
-}
-
-
 def read_file(file_path: str, encoding: str = "utf-8") -> Optional[str]:
     try:
         return Path(file_path).read_text(encoding=encoding)
@@ -64,7 +43,7 @@ async def test_get_request(anthropic_client):
     agent = Agent(
         session_id=str(uuid.uuid4()),
         aclient=anthropic_client,
-        tools=[convert_markdown_to_toml_gemini],
+        tools=tool_registry.schemas(["convert_markdown_to_toml_gemini"]),
         tool_registry=tool_registry,
         max_iters=10,
         timeout=30,
@@ -73,3 +52,40 @@ async def test_get_request(anthropic_client):
 
     result = await agent.run(toml_prompt)
     print(result)
+
+
+async def test_get_shares_http_client():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, json={
+            "id": "msg_1",
+            "model": "claude-test",
+            "role": "assistant",
+            "content": [{"type": "text", "text": "hello"}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": 1, "output_tokens": 1},
+        })
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    clients = [
+        AnthropicClient(Config(), StubSecretManager(), "claude-test",
+                        http_client=http_client)
+        for _ in range(2)
+    ]
+    req = AnthropicRequest(
+        model="claude-test",
+        max_tokens=16,
+        messages=[Message(role="user", content="hi")],
+    )
+    for client in clients:
+        resp = await client.get(req)
+        assert resp.content[0].text == "hello"
+        # the shared pool belongs to the caller, not the client
+        await client.aclose()
+
+    assert not http_client.is_closed
+    assert len(seen) == 2
+    assert seen[0].headers["x-api-key"] == "stub-key"
+    await http_client.aclose()
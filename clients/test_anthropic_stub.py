@@ -0,0 +1,50 @@
+import httpx
+from config import Config
+from clients.anthropic_client import AnthropicClient
+from clients.anthropic_models import AnthropicRequest, Message
+from clients.anthropic_stub import (
+    StubSecretManager,
+    create_stub_app,
+    scripted_tool_responder,
+)
+from clients.rate_limiter import RateLimitScheduler
+from clients.streaming import StreamAccumulator
+
+
+def make_client(**stub_options) -> AnthropicClient:
+    config = Config()
+    config.anthropic_base_url = "http://anthropic.stub"
+    stub = create_stub_app(scripted_tool_responder("convert"), **stub_options)
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))
+    return AnthropicClient(
+        config, StubSecretManager(), "claude-test", http_client=http_client,
+        rate_limiter=RateLimitScheduler(base_delay=0.001))
+
+
+request = AnthropicRequest(
+    model="claude-test",
+    max_tokens=64,
+    messages=[Message(role="user", content="# doc")],
+)
+
+
+async def test_streamed_response_matches_scripted_tool_use():
+    client = make_client()
+    accumulator = StreamAccumulator()
+    async for event in client.stream(request):
+        accumulator.add(event)
+    resp = accumulator.response()
+
+    assert resp.stop_reason == "tool_use"
+    assert resp.content[1].name == "convert"
+    assert resp.content[1].input == {"markdown_doc": "# doc"}
+
+
+async def test_throttled_requests_are_retried():
+    client = make_client(throttle_every=2)
+    for _ in range(3):
+        resp = await client.get(request)
+        assert resp.stop_reason == "tool_use"
+    # the 2nd and 4th requests were rejected and sent again
+    assert client.rate_limiter.throttled == 2
+    assert client.rate_limiter.retries == 2
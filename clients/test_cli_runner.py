@@ -0,0 +1,78 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import pytest
+from clients.cli_runner import CliRunner
+
+PY = sys.executable
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # killed but not yet reaped by init (linux containers)
+    if not os.path.exists(f"/proc/{pid}/stat"):
+        return True
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().split()[2] != "Z"
+
+
+async def test_prompt_is_fed_on_stdin_and_stdout_streamed():
+    runner = CliRunner()
+    lines = [
+        line async for line in runner.stream(
+            "cat", ["cat"], input="a = 1\nb = 2\n")
+    ]
+    assert lines == ["a = 1\n", "b = 2\n"]
+
+
+async def test_non_zero_exit_raises_called_process_error():
+    runner = CliRunner()
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        await runner.run("py", [PY, "-c", "import sys; sys.exit('boom')"])
+    assert "boom" in e.value.stderr
+
+
+async def test_timeout_kills_the_process_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    # the CLI forks a child that would outlive a plain proc.kill()
+    script = (
+        "import subprocess, sys, time\n"
+        "child = subprocess.Popen(['sleep', '30'])\n"
+        f"open({str(pid_file)!r}, 'w').write(str(child.pid))\n"
+        "time.sleep(30)\n"
+    )
+    runner = CliRunner()
+    with pytest.raises(subprocess.TimeoutExpired):
+        await runner.run("py", [PY, "-c", script], timeout=1)
+
+    child_pid = int(pid_file.read_text())
+    await asyncio.sleep(0.1)
+    assert not is_running(child_pid)
+
+
+async def test_concurrency_is_limited_per_cli():
+    runner = CliRunner(limits={"sleepy": 1})
+    args = [PY, "-c", "import time; time.sleep(0.3)"]
+    start = time.perf_counter()
+    await asyncio.gather(*(runner.run("sleepy", args) for _ in range(2)))
+    assert time.perf_counter() - start >= 0.6
+
+
+async def test_warm_pool_hands_out_prestarted_processes():
+    runner = CliRunner()
+    await runner.start_warm_pool(["cat"], 2)
+    pool = runner._warm_pools[("cat",)]
+    warm_pids = {proc.pid for proc in pool._idle}
+
+    proc = await runner.spawn(["cat"])
+    assert proc.pid in warm_pids
+    proc.kill()
+    await proc.wait()
+
+    assert await runner.run("cat", ["cat"], input="warm") == "warm"
+    await runner.aclose()
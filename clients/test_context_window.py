@@ -0,0 +1,69 @@
+from clients.anthropic_models import Message, TextBlock, ToolResultBlock, ToolUseBlock
+from clients.context_window import ContextWindow, estimate_tokens
+
+
+def tool_turn(n: int, name: str, payload: str):
+    return [
+        Message(role="assistant", content=[
+            TextBlock(text=f"step {n}", type="text"),
+            ToolUseBlock(id=f"t{n}", name=name, input={"markdown_doc": payload},
+                         type="tool_use"),
+        ]),
+        Message(role="user", content=[
+            ToolResultBlock(tool_use_id=f"t{n}", content=payload, type="tool_result"),
+        ]),
+    ]
+
+
+def conversation(turns: int, payload: str):
+    messages = [Message(role="user", content="convert this " + payload)]
+    for n in range(turns):
+        messages += tool_turn(n, "convert_markdown_to_toml_gemini", payload)
+    return messages
+
+
+def test_tracking_is_incremental():
+    window = ContextWindow()
+    messages = conversation(2, "x" * 100)
+    total = window.track(messages)
+    assert total == sum(estimate_tokens(m) for m in messages)
+    messages += tool_turn(9, "validate_toml", "y")
+    assert window.track(messages) == total + sum(
+        estimate_tokens(m) for m in messages[-2:])
+
+
+def test_under_budget_history_is_untouched():
+    messages = conversation(3, "x" * 100)
+    before = list(messages)
+    assert ContextWindow(budget=100_000).fit(messages) == 0
+    assert messages == before
+
+
+def test_superseded_drafts_and_large_payloads_are_compacted():
+    messages = conversation(6, "x" * 5_000)
+    window = ContextWindow(budget=8_000, keep_recent=2, max_payload_chars=500)
+    assert window.fit(messages) == 0
+    assert window.total <= 8_000 * window.low_water
+    assert window.total == sum(estimate_tokens(m) for m in messages)
+
+    results = [m.content[0].content for m in messages[2::2]]
+    assert results[0] == "[superseded TOML draft removed]"
+    # the newest draft is kept verbatim
+    assert results[-1] == "x" * 5_000
+    assert messages[1].content[1].input["markdown_doc"].startswith("[truncated 5000")
+
+
+def test_stale_turns_are_summarized_into_a_valid_conversation():
+    messages = conversation(12, "x" * 400)
+    window = ContextWindow(budget=1_000, keep_recent=2, draft_tools=set())
+    removed = window.fit(messages)
+    assert removed > 0
+    assert window.total == sum(estimate_tokens(m) for m in messages)
+
+    assert messages[0].role == "user"
+    assert "Earlier conversation compacted" in messages[0].content[0].text
+    assert "convert_markdown_to_toml_gemini x" in messages[0].content[0].text
+    # every remaining tool_result still follows its tool_use
+    assert messages[1].role == "assistant"
+    for assistant, user in zip(messages[1::2], messages[2::2]):
+        assert assistant.content[1].id == user.content[0].tool_use_id
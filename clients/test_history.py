@@ -0,0 +1,85 @@
+from clients.anthropic_models import Message, TextBlock, ToolResultBlock, ToolUseBlock
+from clients.context_window import ContextWindow
+from clients.history import HistoryStore
+
+
+def copy_of(text: str) -> str:
+    # equal but a distinct object, like a string decoded from a response
+    return "".join(list(text))
+
+
+markdown = "# Title\n\n" + "some markdown body\n" * 50
+
+
+def conversation(turns: int):
+    messages = [Message(role="user", content=copy_of(markdown))]
+    for n in range(turns):
+        messages += [
+            Message(role="assistant", content=[
+                TextBlock(text=f"step {n}", type="text"),
+                ToolUseBlock(id=f"t{n}", name="convert",
+                             input={"markdown_doc": copy_of(markdown)},
+                             type="tool_use"),
+            ]),
+            Message(role="user", content=[
+                ToolResultBlock(tool_use_id=f"t{n}", content=copy_of(markdown),
+                                type="tool_result"),
+            ]),
+        ]
+    return messages
+
+
+def test_round_trips_messages():
+    messages = conversation(2)
+    store = HistoryStore(messages)
+    store.release()
+
+    assert len(store) == len(messages)
+    assert [m.model_dump() for m in store] == [m.model_dump() for m in messages]
+    assert [m.role for m in store[1:3]] == ["assistant", "user"]
+
+
+def test_large_strings_are_interned():
+    store = HistoryStore(conversation(3))
+    store.release()
+
+    stats = store.stats()
+    assert stats["interned_strings"] == 1
+    assert stats["deduped_bytes"] > 6 * len(markdown)
+    prompt = store[0].content
+    assert store[1].content[1].input["markdown_doc"] is prompt
+    assert store[2].content[0].content is prompt
+
+
+def test_materialized_messages_are_reused_until_release():
+    messages = conversation(1)
+    store = HistoryStore(messages)
+    # the appended objects themselves are served during a run
+    assert store[1] is messages[1]
+    assert store[1] is store[1]
+
+    store.release()
+    first = store[1]
+    assert first is not messages[1]
+    assert store[1] is first
+
+
+def test_replaced_messages_release_their_strings():
+    store = HistoryStore(conversation(1))
+    store[:] = [Message(role="user", content="short")]
+    store.release()
+
+    assert store.stats()["interned_strings"] == 0
+    assert store[0].content == "short"
+
+
+def test_context_window_compacts_the_store():
+    store = HistoryStore(conversation(10))
+    window = ContextWindow(budget=1_000, keep_recent=2, max_payload_chars=100)
+
+    removed = window.fit(store)
+
+    assert removed > 0
+    assert len(store) == 21 - removed
+    assert window.total <= 1_000
+    assert store[0].content[0].text.startswith("[Earlier conversation compacted")
@@ -0,0 +1,76 @@
+import tomllib
+import pytest
+from clients import tools
+from clients.markdown_toml import markdown_to_toml
+
+COMMAND = """---
+description: Review a pull request
+allowed-tools: Bash(gh pr view:*), Bash(gh pr diff:*)
+argument-hint: "[pr-number]"
+tags:
+  - review
+  - git
+---
+
+# Review PR
+
+Review pull request $ARGUMENTS.
+
+```bash
+# a comment, not a heading
+gh pr diff $ARGUMENTS | grep -E '\\d+'
+```
+"""
+
+
+def test_command_file_becomes_a_gemini_command():
+    parsed = tomllib.loads(markdown_to_toml(COMMAND))
+    assert parsed["description"] == "Review a pull request"
+    assert parsed["allowed-tools"] == "Bash(gh pr view:*), Bash(gh pr diff:*)"
+    assert parsed["argument-hint"] == "[pr-number]"
+    assert parsed["tags"] == ["review", "git"]
+    assert parsed["prompt"].startswith("# Review PR\n\nReview pull request {{args}}.")
+    assert "gh pr diff {{args}} | grep -E '\\d+'\n```\n" in parsed["prompt"]
+
+
+def test_heading_is_the_fallback_description():
+    parsed = tomllib.loads(markdown_to_toml("\n# Fix lint ##\n\nRun the linter.\n"))
+    assert parsed == {
+        "description": "Fix lint",
+        "prompt": "# Fix lint ##\n\nRun the linter.\n",
+    }
+
+
+def test_prompt_escaping_round_trips():
+    body = "# Quotes\n\n''' and \"\"\"\"\" and C:\\path\\ and \x07 bell\nends with \""
+    parsed = tomllib.loads(markdown_to_toml(body))
+    assert parsed["prompt"] == body + "\n"
+
+
+@pytest.mark.parametrize("markdown, reason", [
+    ("Just a paragraph of prose.", "neither front matter nor a heading"),
+    ("---\nsettings:\n  nested: 1\n---\n# Title\n", "unsupported front matter"),
+    ("---\ndescription: |\n  multi\n---\n# Title\n", "unsupported front matter"),
+    ("---\ndescription: never closed\n# Title\n", "never closed"),
+    ("# Title\n\n```python\nprint()\n", "unclosed code fence"),
+    ("---\ndescription: only front matter\n---\n", "no prompt"),
+])
+def test_unrecognized_layouts_are_rejected(markdown, reason):
+    with pytest.raises(ValueError, match=reason):
+        markdown_to_toml(markdown)
+
+
+async def test_tool_falls_back_to_gemini_only_when_needed(monkeypatch):
+    calls = []
+
+    async def fake_gemini(markdown_doc: str) -> str:
+        calls.append(markdown_doc)
+        return 'prompt = "from gemini"'
+
+    monkeypatch.setattr(tools, "convert_markdown_to_toml_gemini", fake_gemini)
+    native = await tools.convert_markdown_to_toml(COMMAND)
+    assert tomllib.loads(native)["description"] == "Review a pull request"
+    assert calls == []
+
+    assert await tools.convert_markdown_to_toml("prose") == 'prompt = "from gemini"'
+    assert calls == ["prose"]
@@ -0,0 +1,146 @@
+import asyncio
+import httpx
+from config import Config
+from clients.anthropic_client import AnthropicClient
+from clients.anthropic_models import AnthropicRequest, Message
+from clients.anthropic_stub import StubSecretManager
+from clients.rate_limiter import Priority, RateLimitScheduler
+
+
+def ok_response(**headers) -> httpx.Response:
+    return httpx.Response(200, headers=headers, json={
+        "id": "msg_1",
+        "model": "claude-test",
+        "role": "assistant",
+        "content": [{"type": "text", "text": "hello"}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": 10, "output_tokens": 4},
+    })
+
+
+def make_client(handler, limiter: RateLimitScheduler) -> AnthropicClient:
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AnthropicClient(Config(), StubSecretManager(), "claude-test",
+                           http_client=http_client, rate_limiter=limiter)
+
+
+def make_request() -> AnthropicRequest:
+    return AnthropicRequest(
+        model="claude-test",
+        max_tokens=100,
+        messages=[Message(role="user", content="hi")],
+    )
+
+
+async def test_retries_429_and_529():
+    statuses = [429, 529]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if statuses:
+            return httpx.Response(statuses.pop(0), headers={"retry-after": "0"})
+        return ok_response()
+
+    limiter = RateLimitScheduler(base_delay=0.01)
+    resp = await make_client(handler, limiter).get(make_request())
+
+    assert resp.content[0].text == "hello"
+    assert limiter.retries == 2
+    assert limiter.throttled == 1
+
+
+async def test_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503)
+
+    limiter = RateLimitScheduler(max_retries=2, base_delay=0.001)
+    try:
+        await make_client(handler, limiter).get(make_request())
+        assert False, "expected RuntimeError"
+    except RuntimeError as e:
+        assert "503" in str(e)
+    assert len(calls) == 3
+    # none of the failed attempts used tokens, so all of them are back
+    assert limiter.buckets["input-tokens"].tokens == 30_000
+    assert limiter.buckets["output-tokens"].tokens == 8_000
+
+
+async def test_transport_errors_return_their_reservation():
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        if len(attempts) < 3:
+            raise httpx.ConnectError("connection refused")
+        return ok_response()
+
+    limiter = RateLimitScheduler(base_delay=0.001)
+    await make_client(handler, limiter).get(make_request())
+
+    # only the successful attempt is charged: the 4 output tokens it used
+    assert limiter.buckets["output-tokens"].tokens >= 7_990
+
+
+async def test_headers_update_buckets_and_usage_settles():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return ok_response(**{
+            "anthropic-ratelimit-requests-limit": "1000",
+            "anthropic-ratelimit-requests-remaining": "999",
+            "anthropic-ratelimit-output-tokens-limit": "90000",
+            "anthropic-ratelimit-output-tokens-remaining": "80000",
+        })
+
+    limiter = RateLimitScheduler()
+    await make_client(handler, limiter).get(make_request())
+
+    assert limiter.buckets["requests"].capacity == 1000
+    # the 100 reserved for max_tokens is refunded down to the 4 used
+    assert 80_090 <= limiter.buckets["output-tokens"].tokens + 4 <= 80_100
+    assert limiter.buckets["output-tokens"].capacity == 90_000
+
+
+async def test_interactive_admitted_before_batch():
+    limiter = RateLimitScheduler(requests_per_minute=600)
+    limiter.buckets["requests"].tokens = 0
+    order = []
+
+    async def admit(name: str, priority: Priority) -> None:
+        await limiter.acquire(1, 1, priority)
+        order.append(name)
+
+    batch = asyncio.create_task(admit("batch", Priority.BATCH))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(admit("interactive", Priority.INTERACTIVE))
+    await asyncio.gather(batch, interactive)
+
+    assert order == ["interactive", "batch"]
+
+
+async def test_cancelled_waiter_leaves_queue():
+    limiter = RateLimitScheduler(requests_per_minute=600)
+    limiter.buckets["requests"].tokens = 0
+
+    waiter = asyncio.create_task(limiter.acquire(1, 1, Priority.INTERACTIVE))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    assert limiter.stats()["queued"] == 0
+    limiter.buckets["requests"].tokens = 1
+    await asyncio.wait_for(limiter.acquire(1, 1, Priority.BATCH), 1)
+
+
+async def test_retry_after_is_capped():
+    limiter = RateLimitScheduler(max_delay=5)
+    response = httpx.Response(429, headers={"retry-after": "120"})
+    assert limiter.retry_delay(0, response) == 5
+    assert 0 <= limiter.retry_delay(3, None) <= 5
+
+
+def test_malformed_reset_header_falls_back_to_backoff():
+    limiter = RateLimitScheduler(base_delay=1)
+    response = httpx.Response(
+        429, headers={"anthropic-ratelimit-requests-reset": "soon"})
+    assert 0 <= limiter.retry_delay(2, response) <= 4
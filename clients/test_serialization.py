@@ -0,0 +1,74 @@
+import json
+from clients.anthropic_models import (
+    AnthropicRequest,
+    CacheControl,
+    Message,
+    TextBlock,
+    Tool,
+    ToolResultBlock,
+    ToolUseBlock,
+)
+from clients.serialization import RequestEncoder
+
+tool = Tool(
+    name="echo",
+    description="echo the text",
+    input_schema={"type": "object", "properties": {"text": {"type": "string"}}},
+)
+
+
+def make_request(messages) -> AnthropicRequest:
+    return AnthropicRequest(
+        model="claude-test",
+        max_tokens=64,
+        messages=messages,
+        system="be brief",
+        tools=[tool],
+    )
+
+
+history = [
+    Message(role="user", content="convert this"),
+    Message(role="assistant", content=[
+        TextBlock(text="on it", type="text"),
+        ToolUseBlock(id="t1", name="echo", input={"text": "x"}, type="tool_use"),
+    ]),
+    Message(role="user", content=[
+        ToolResultBlock(tool_use_id="t1", content="x", type="tool_result"),
+    ]),
+]
+
+
+def test_encoding_matches_model_dump():
+    request = make_request(history)
+    body = RequestEncoder().encode(request, stream=True)
+    expected = request.model_dump(exclude_none=True)
+    expected["stream"] = True
+    assert json.loads(body) == expected
+
+
+def test_only_new_items_are_encoded():
+    encoder = RequestEncoder()
+    encoder.encode(make_request(history[:1]))
+    assert encoder.misses == 2  # one message, one tool
+
+    encoder.encode(make_request(history))
+    assert encoder.hits == 2
+    assert encoder.misses == 4
+
+
+def test_copies_are_not_served_stale():
+    encoder = RequestEncoder()
+    encoder.encode(make_request(history))
+    marked = history[-1].model_copy(update={"content": [
+        history[-1].content[0].model_copy(update={"cache_control": CacheControl()})
+    ]})
+    body = encoder.encode(make_request([*history[:-1], marked]))
+    assert json.loads(body)["messages"][-1]["content"][0]["cache_control"] == {
+        "type": "ephemeral"}
+
+
+def test_lru_bound():
+    encoder = RequestEncoder(max_entries=2)
+    encoder.encode(make_request(history))
+    assert len(encoder._cache) == 2
@@ -0,0 +1,125 @@
+import asyncio
+import httpx
+import pytest
+from config import Config
+from clients.anthropic_client import AnthropicClient
+from clients.anthropic_models import AnthropicRequest, Message
+from clients.anthropic_stub import StubSecretManager
+from clients.single_flight import SingleFlight, request_key
+
+
+class Upstream:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return "result"
+
+
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    upstream = Upstream()
+    waiters = [asyncio.create_task(flight.do("k", upstream)) for _ in range(5)]
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await asyncio.gather(*waiters) == ["result"] * 5
+    assert upstream.calls == 1
+    assert flight.shared == 4
+    # finished calls are forgotten, the next caller starts a new one
+    assert flight.in_flight() == 0
+    await flight.do("k", upstream)
+    assert upstream.calls == 2
+
+
+async def test_errors_fan_out():
+    flight = SingleFlight()
+
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(
+        flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+    assert [str(r) for r in results] == ["boom", "boom"]
+
+
+async def test_cancelled_waiter_detaches():
+    flight = SingleFlight()
+    upstream = Upstream()
+    first = asyncio.create_task(flight.do("k", upstream))
+    second = asyncio.create_task(flight.do("k", upstream))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await second == "result"
+    assert first.cancelled()
+    assert not upstream.cancelled
+
+
+async def test_last_waiter_leaving_cancels_the_call():
+    flight = SingleFlight()
+    upstream = Upstream()
+    waiter = asyncio.create_task(flight.do("k", upstream))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    await asyncio.sleep(0)
+
+    assert upstream.cancelled
+    assert flight.in_flight() == 0
+
+
+def test_request_key_is_canonical():
+    assert request_key({"a": 1, "b": [1, 2]}) == request_key({"b": [1, 2], "a": 1})
+    assert request_key({"a": 1}) != request_key({"a": 2})
+
+
+async def test_identical_model_requests_are_coalesced():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={
+            "id": "msg_1",
+            "model": "claude-test",
+            "role": "assistant",
+            "content": [{"type": "text", "text": "hello"}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": 1, "output_tokens": 1},
+        })
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = AnthropicClient(Config(), StubSecretManager(), "claude-test",
+                             http_client=http_client)
+
+    def make_request(text: str) -> AnthropicRequest:
+        return AnthropicRequest(
+            model="claude-test",
+            max_tokens=16,
+            messages=[Message(role="user", content=text)],
+        )
+
+    same = await asyncio.gather(*(client.get(make_request("hi")) for _ in range(3)))
+    assert len(calls) == 1
+    # each caller owns its copy of the response
+    assert same[0] is not same[1]
+    assert same[0].content[0] is not same[1].content[0]
+
+    await asyncio.gather(client.get(make_request("a")), client.get(make_request("b")))
+    assert len(calls) == 3
+    await http_client.aclose()
@@ -0,0 +1,64 @@
+import json
+from clients.streaming import StreamAccumulator, aiter_sse, parse_stream_event
+
+
+def sse(event: str, data: dict) -> list:
+    return [f"event: {event}", f"data: {json.dumps(data)}", ""]
+
+
+STREAM = [
+    *sse("message_start", {"type": "message_start", "message": {
+        "id": "msg_1", "model": "claude-test", "role": "assistant",
+        "content": [], "stop_reason": None,
+        "usage": {"input_tokens": 10, "output_tokens": 1}}}),
+    ": keep-alive",
+    *sse("content_block_start", {"type": "content_block_start", "index": 0,
+         "content_block": {"type": "text", "text": ""}}),
+    *sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+         "delta": {"type": "text_delta", "text": "Convert"}}),
+    *sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+         "delta": {"type": "text_delta", "text": "ing"}}),
+    *sse("content_block_stop", {"type": "content_block_stop", "index": 0}),
+    *sse("content_block_start", {"type": "content_block_start", "index": 1,
+         "content_block": {"type": "tool_use", "id": "toolu_1",
+                           "name": "validate_toml", "input": {}}}),
+    *sse("content_block_delta", {"type": "content_block_delta", "index": 1,
+         "delta": {"type": "input_json_delta", "partial_json": "{\"tomlf"}}),
+    *sse("content_block_delta", {"type": "content_block_delta", "index": 1,
+         "delta": {"type": "input_json_delta", "partial_json": "ile\": \"a = 1\"}"}}),
+    *sse("content_block_stop", {"type": "content_block_stop", "index": 1}),
+    *sse("message_delta", {"type": "message_delta",
+         "delta": {"stop_reason": "tool_use"}, "usage": {"output_tokens": 42}}),
+    *sse("message_stop", {"type": "message_stop"}),
+]
+
+
+async def lines():
+    for line in STREAM:
+        yield line
+
+
+async def test_stream_rebuilds_response():
+    accumulator = StreamAccumulator()
+    types = []
+    async for event, data in aiter_sse(lines()):
+        parsed = parse_stream_event(data)
+        assert parsed.type == event
+        types.append(parsed.type)
+        accumulator.add(parsed)
+
+    assert types.count("content_block_delta") == 4
+    resp = accumulator.response()
+    assert resp.stop_reason == "tool_use"
+    assert resp.usage.output_tokens == 42
+    assert resp.content[0].text == "Converting"
+    assert resp.content[1].input == {"tomlfile": "a = 1"}
+
+
+async def test_multiline_data_is_joined():
+    async def multiline():
+        for line in ["data: first", "data: second", ""]:
+            yield line
+
+    events = [e async for e in aiter_sse(multiline())]
+    assert events == [("message", "first\nsecond")]
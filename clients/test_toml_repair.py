@@ -0,0 +1,65 @@
+import tomllib
+import pytest
+from clients import tools
+from clients.toml_repair import repair, validate
+
+
+def test_errors_are_located_and_classified():
+    report = validate('title = "x"\npath = "C:\\Users"\n')
+    assert not report.valid
+    error = report.errors[0]
+    assert (error.line, error.kind, error.span) == (2, "invalid-escape", 'path = "C:\\Users"')
+
+    # tomllib reports these at the end of the document
+    error = validate("a = 1\na = 2\nb = 3").errors[0]
+    assert (error.line, error.kind, error.span) == (2, "duplicate-key", "a = 2")
+    assert "line 2, column 1 (duplicate-key)" in validate("a = 1\na = 2").describe()
+
+
+@pytest.mark.parametrize("broken, expected, fixes", [
+    ('```toml\ntitle = "x"\n```', {"title": "x"}, ["code-fence"]),
+    ('Here it is:\n```\ntitle = "x"\n```\nDone.', {"title": "x"}, ["code-fence"]),
+    ('path = "C:\\Users\\me"', {"path": "C:\\Users\\me"}, ["invalid-escape"]),
+    ('title = "say "hi" twice"', {"title": 'say "hi" twice'}, ["trailing-content"]),
+    ('a = 1\nb = 2\na = 3', {"a": 1, "b": 2}, ["duplicate-key"]),
+    ('a = """\nx\n"""\na = """\ny\n"""', {"a": "x\n"}, ["duplicate-key"]),
+    ("description = Convert a file", {"description": "Convert a file"}, ["invalid-value"]),
+    ('prompt = "one\ntwo"', {"prompt": "one\ntwo"}, ["multiline-string"]),
+])
+def test_common_mistakes_are_fixed_locally(broken, expected, fixes):
+    result = repair(broken)
+    assert result.valid
+    assert result.fixes == fixes
+    assert tomllib.loads(result.toml) == expected
+
+
+def test_code_fences_inside_strings_are_kept():
+    text = "prompt = '''\n```bash\nls\n```\n'''\n"
+    assert repair(text).toml == text
+
+
+def test_unfixable_documents_are_returned_as_is():
+    for text in ('title = "unterminated', "[t]\na = 1\n[t]\nb = 2\n"):
+        result = repair(text)
+        assert not result.valid
+        assert result.toml == text
+        assert result.fixes == []
+
+
+async def test_repair_tool_escalates_only_what_it_cannot_fix(monkeypatch):
+    calls = []
+
+    async def fake_claude(tomlfile: str, errors: str) -> str:
+        calls.append(errors)
+        return "```toml\n" + tomlfile + '"\n```'
+
+    monkeypatch.setattr(tools, "process_errors_claude", fake_claude)
+    assert await tools.repair_toml('title = "say "hi""') == 'title = "say \\"hi\\""\n'
+    assert calls == []
+
+    assert await tools.repair_toml('title = "cut') == 'title = "cut"\n'
+    assert len(calls) == 1 and "unterminated-string" in calls[0]
+
+
+def test_validate_tool_returns_json():
+    assert tools.validate_toml('a = 1') == '{"valid":true,"errors":[]}'
@@ -0,0 +1,41 @@
+from clients.tool_cache import ToolResultCache
+from repository.tool_cache_repository import ToolCacheRepository
+
+POLICIES = {"convert": "gemini-test"}
+
+
+async def test_equivalent_arguments_share_a_key():
+    cache = ToolResultCache(POLICIES)
+    a = cache.key("convert", {"markdown_doc": "# Title\r\nbody\n"})
+    b = cache.key("convert", {"markdown_doc": "# Title\nbody"})
+    assert a == b
+    assert cache.key("validate", {"markdown_doc": "# Title"}) is None
+    other_model = ToolResultCache({"convert": "gemini-next"})
+    assert other_model.key("convert", {"markdown_doc": "# Title\nbody"}) != a
+
+
+async def test_persistent_tier_survives_a_new_process(db):
+    first = ToolResultCache(POLICIES, ToolCacheRepository(db))
+    key = first.key("convert", {"markdown_doc": "# Title"})
+    assert await first.get("convert", key) is None
+    await first.put("convert", key, 'title = "Title"')
+    assert await first.get("convert", key) == 'title = "Title"'
+
+    second = ToolResultCache(POLICIES, ToolCacheRepository(db))
+    assert await second.get("convert", key) == 'title = "Title"'
+    assert first.stats() == {"convert": {"miss": 1, "memory": 1}}
+    assert second.stats() == {"convert": {"db": 1}}
+
+
+async def test_lru_and_ttl_eviction(db):
+    cache = ToolResultCache(POLICIES, max_entries=2, ttl=60)
+    keys = [cache.key("convert", {"markdown_doc": str(i)}) for i in range(3)]
+    for k in keys:
+        await cache.put("convert", k, k)
+    assert await cache.get("convert", keys[0]) is None
+    assert await cache.get("convert", keys[2]) == keys[2]
+
+    expired = ToolResultCache(POLICIES, ToolCacheRepository(db), ttl=0)
+    await expired.put("convert", keys[0], "stale")
+    assert await expired.get("convert", keys[0]) is None
+    assert ToolCacheRepository(db).evict(0, max_entries=0) == 1
@@ -0,0 +1,94 @@
+import asyncio
+import sys
+import time
+from typing import List, Optional
+import pytest
+from agent import Agent
+from clients.tool_registry import ToolRegistry
+
+
+def test_schema_is_generated_from_the_signature_once():
+    registry = ToolRegistry()
+
+    @registry.tool(cache="v1")
+    def summarize(text: str, max_words: int = 50, tags: Optional[List[str]] = None) -> str:
+        """
+        Summarize a document.
+        Keeps the original language.
+
+        Args:
+            text: The document to summarize
+            max_words: Upper bound on the summary
+                length, in words
+        """
+        return text
+
+    tool = registry.schemas(["summarize"])[0]
+    assert tool.description == "Summarize a document. Keeps the original language."
+    schema = tool.input_schema
+    assert schema.required == ["text"]
+    assert schema.properties["text"] == {
+        "type": "string", "description": "The document to summarize"}
+    assert schema.properties["max_words"]["type"] == "integer"
+    assert schema.properties["max_words"]["description"] == (
+        "Upper bound on the summary length, in words")
+    assert "tags" in schema.properties
+    # the same object every time, so encoded requests can reuse it
+    assert registry.schemas(["summarize"])[0] is tool
+    assert registry["summarize"] is summarize
+    assert dict(registry.cache_policies()) == {"summarize": "v1"}
+
+    with pytest.raises(ValueError, match="not found"):
+        registry.schemas(["missing"])
+    with pytest.raises(ValueError, match="already registered"):
+        registry.tool("summarize")(lambda text: text)
+
+
+def test_lazy_modules_load_on_first_lookup(tmp_path, monkeypatch):
+    (tmp_path / "lazy_tools_mod.py").write_text(
+        "from clients.tool_registry import registry\n"
+        "\n"
+        "@registry.tool(cache='shout-1')\n"
+        "def shout(text: str) -> str:\n"
+        "    \"\"\"Upper-case the text\"\"\"\n"
+        "    return text.upper()\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    from clients.tool_registry import registry
+
+    registry.lazy("lazy_tools_mod", ["shout"])
+    assert "shout" in registry
+    assert "lazy_tools_mod" not in sys.modules
+
+    assert registry.cache_policies().get("shout") == "shout-1"
+    assert "lazy_tools_mod" in sys.modules
+    assert registry["shout"]("hi") == "HI"
+
+
+async def test_agent_applies_tool_timeout_and_concurrency():
+    registry = ToolRegistry()
+    running = []
+    peak = []
+
+    @registry.tool(concurrency=1)
+    async def exclusive(n: int) -> str:
+        running.append(n)
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(n)
+        return str(n)
+
+    @registry.tool(timeout=0.05)
+    def slow() -> str:
+        time.sleep(0.2)
+        return "late"
+
+    agent = Agent(session_id=None, aclient=None, tools=[], tool_registry=registry)
+    results = await asyncio.gather(*(
+        agent.execute_tool(f"t{n}", "exclusive", {"n": n}) for n in range(3)))
+    assert [r.tool_result for r in results] == ["0", "1", "2"]
+    assert max(peak) == 1
+
+    result = await agent.execute_tool("t", "slow", {})
+    assert not result.success
+    assert "timed out after 0.05s" in result.error_msg
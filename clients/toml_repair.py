@@ -0,0 +1,318 @@
+"""
+Structured TOML validation and rule-based repair.
+
+`validate` turns a tomllib error into a location (line and column), an
+error kind and the offending line. `repair` runs validate -> fix ->
+validate locally, one rule per error kind, for the mistakes LLM
+converters make most: code fences around the document, unescaped quotes
+and backslashes, duplicate keys, unquoted strings and single-line
+strings that run over several lines. Whatever is still invalid when no
+rule applies is left for an LLM to fix.
+"""
+import re
+import tomllib
+from typing import Callable, Dict, List, Optional
+from pydantic import BaseModel
+
+LOCATION = re.compile(r"\s*\((?:at line (\d+), column (\d+)|at end of document)\)$")
+FENCE = re.compile(r"^\s*(```|~~~)[\w-]*\s*$")
+KEY_VALUE = re.compile(r"""^(\s*(?:[A-Za-z0-9_-]+|"[^"]*"|'[^']*')(?:\s*\.\s*(?:[A-Za-z0-9_-]+|"[^"]*"|'[^']*'))*\s*=\s*)(.*)$""")
+TABLE = re.compile(r"^\s*\[\[?\s*(.*?)\s*\]\]?\s*(?:#.*)?$")
+# values TOML can parse without quotes, or that open a bracketed value
+BARE_VALUE = re.compile(
+    r"""^(?:true|false|[+-]?(?:inf|nan)|[+-]?[\d_]+(?:\.[\d_]+)?(?:[eE][+-]?\d+)?|0x[\da-fA-F_]+|0o[0-7_]+|0b[01_]+|\d{2}:\d{2}.*|\d{4}-\d{2}-\d{2}.*|["'\[{]).*$"""
+)
+# a backslash and what follows it; group 1 is set for valid escapes
+ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|[btnfr"\\])?')
+
+# tomllib message prefix -> error kind
+KINDS = (
+    ("Unterminated string", "unterminated-string"),
+    ("Illegal character '\\n'", "multiline-string"),
+    ("Found invalid character '\\n'", "multiline-string"),
+    ("Unescaped '\\'", "invalid-escape"),
+    ("Unrecognized escape sequence", "invalid-escape"),
+    ("Invalid hex value", "invalid-escape"),
+    ("Cannot overwrite a value", "duplicate-key"),
+    ("Cannot declare", "duplicate-key"),
+    ("Expected newline or end of document after a statement", "trailing-content"),
+    ("Invalid statement", "invalid-statement"),
+    ("Invalid value", "invalid-value"),
+)
+
+
+class TomlError(BaseModel):
+    line: int  # 1-based
+    column: int  # 1-based
+    kind: str
+    message: str
+    span: str  # the offending line
+
+
+class ValidationReport(BaseModel):
+    valid: bool
+    errors: List[TomlError] = []
+
+    def describe(self) -> str:
+        """One line per error, for a repair prompt"""
+        return "\n".join(
+            f"line {e.line}, column {e.column} ({e.kind}): {e.message}: {e.span.strip()}"
+            for e in self.errors
+        )
+
+
+class RepairResult(BaseModel):
+    toml: str
+    report: ValidationReport  # of `toml`
+    fixes: List[str] = []  # kinds of the errors fixed, in order
+
+    @property
+    def valid(self) -> bool:
+        return self.report.valid
+
+
+def statement_lines(lines: List[str]) -> List[bool]:
+    """Marks the lines that start outside a multi-line string"""
+    outside: List[bool] = []
+    delimiter: Optional[str] = None
+    for line in lines:
+        outside.append(delimiter is None)
+        rest = line
+        if delimiter is None:
+            match = KEY_VALUE.match(line)
+            if match is None:
+                continue
+            rest = match.group(2)
+            if rest[:3] not in ('"""', "'''"):
+                continue
+            delimiter, rest = rest[:3], rest[3:]
+        if delimiter == '"""':
+            rest = rest.replace("\\\\", "").replace('\\"', "")
+        if delimiter in rest:
+            delimiter = None
+    return outside
+
+
+def duplicate_key_line(lines: List[str]) -> Optional[int]:
+    """Index of the first key or table defined a second time"""
+    outside = statement_lines(lines)
+    tables = set()
+    keys = set()
+    for i, line in enumerate(lines):
+        if not outside[i]:
+            continue
+        if (table := TABLE.match(line)) and not KEY_VALUE.match(line):
+            name = table.group(1)
+            array = line.lstrip().startswith("[[")
+            if not array and name in tables:
+                return i
+            tables.add(name)
+            keys = set()
+        elif match := KEY_VALUE.match(line):
+            key = re.sub(r"\s+", "", match.group(1).rstrip()[:-1])
+            if key in keys:
+                return i
+            keys.add(key)
+    return None
+
+
+def unterminated_line(lines: List[str]) -> Optional[int]:
+    """Index of the last statement whose single-line string never closes"""
+    outside = statement_lines(lines)
+    found = None
+    for i, line in enumerate(lines):
+        match = KEY_VALUE.match(line) if outside[i] else None
+        if match and match.group(2)[:1] in "\"'" and match.group(2)[:3] not in ('"""', "'''"):
+            if closing_quote(match.group(2)) is None:
+                found = i
+    return found
+
+
+def closing_quote(value: str) -> Optional[int]:
+    """Index in `value` of the quote closing the string it starts with"""
+    quote = value[0]
+    i = 1
+    while i < len(value):
+        if quote == '"' and value[i] == "\\":
+            i += 2
+            continue
+        if value[i] == quote:
+            return i
+        i += 1
+    return None
+
+
+def to_error(text: str, error: tomllib.TOMLDecodeError) -> TomlError:
+    message = str(error)
+    lines = text.splitlines() or [""]
+    location = LOCATION.search(message)
+    if location and location.group(1):
+        line, column = int(location.group(1)), int(location.group(2))
+    else:
+        line, column = len(lines), len(lines[-1]) + 1
+    message = LOCATION.sub("", message)
+    kind = next((k for prefix, k in KINDS if message.startswith(prefix)), "syntax")
+    # tomllib only notices these once the document has ended
+    if location and not location.group(1):
+        index = None
+        if kind == "duplicate-key":
+            index = duplicate_key_line(lines)
+        elif kind == "unterminated-string":
+            index = unterminated_line(lines)
+        if index is not None:
+            line, column = index + 1, 1
+    span = lines[line - 1] if 0 < line <= len(lines) else ""
+    return TomlError(line=line, column=column, kind=kind, message=message, span=span)
+
+
+def validate(text: str) -> ValidationReport:
+    try:
+        tomllib.loads(text)
+    except tomllib.TOMLDecodeError as e:
+        return ValidationReport(valid=False, errors=[to_error(text, e)])
+    return ValidationReport(valid=True)
+
+
+def strip_code_fences(lines: List[str]) -> Optional[List[str]]:
+    """Drop a ``` fence (and any prose outside it) wrapped around the document"""
+    outside = statement_lines(lines)
+    fences = [i for i, line in enumerate(lines) if outside[i] and FENCE.match(line)]
+    if not fences:
+        return None
+    start = fences[0]
+    end = fences[-1] if len(fences) > 1 else len(lines)
+    # whatever is outside the fence must not look like TOML
+    for line in lines[:start] + lines[end + 1:]:
+        if KEY_VALUE.match(line) or TABLE.match(line):
+            return None
+    return lines[start + 1:end]
+
+
+def escape_backslashes(lines: List[str], error: TomlError) -> Optional[List[str]]:
+    index = error.line - 1
+    line = lines[index]
+    match = KEY_VALUE.match(line)
+    prefix, value = (match.group(1), match.group(2)) if match else ("", line)
+
+    def escape(m: re.Match) -> str:
+        return m.group(0) if m.group(1) else "\\\\"
+
+    fixed = ESCAPE.sub(escape, value)
+    if fixed == value:
+        return None
+    return lines[:index] + [prefix + fixed] + lines[index + 1:]
+
+
+def escape_quotes(lines: List[str], error: TomlError) -> Optional[List[str]]:
+    """`key = "say "hi""` -> `key = "say \\"hi\\""`"""
+    index = error.line - 1
+    match = KEY_VALUE.match(lines[index])
+    if match is None:
+        return None
+    value = match.group(2).rstrip()
+    if len(value) < 2 or value[0] != '"' or value[-1] != '"' or value.startswith('"""'):
+        return None
+    inner = re.sub(r'(?<!\\)"', '\\"', value[1:-1])
+    return lines[:index] + [f'{match.group(1)}"{inner}"'] + lines[index + 1:]
+
+
+def join_multiline(lines: List[str], error: TomlError) -> Optional[List[str]]:
+    """Turn a single-line string that runs over several lines into a multi-line one"""
+    index = error.line - 1
+    match = KEY_VALUE.match(lines[index])
+    if match is None:
+        return None
+    value = match.group(2)
+    quote = value[:1]
+    if quote not in ('"', "'") or value[:3] == quote * 3:
+        return None
+    for end in range(index + 1, len(lines)):
+        closing = lines[end].rstrip()
+        if closing.endswith(quote) and not closing.endswith("\\" + quote):
+            body = [value[1:], *lines[index + 1:end], closing[:-1]]
+            if any(quote * 3 in part for part in body):
+                return None
+            return (
+                lines[:index]
+                + [match.group(1) + quote * 3 + value[1:], *lines[index + 1:end],
+                   closing[:-1] + quote * 3]
+                + lines[end + 1:]
+            )
+    return None
+
+
+def drop_duplicate(lines: List[str], error: TomlError) -> Optional[List[str]]:
+    """Keep the first definition of a key; later ones are usually repeats"""
+    index = duplicate_key_line(lines)
+    if index is None or not KEY_VALUE.match(lines[index]):
+        # a table declared twice can't be dropped without moving its keys
+        return None
+    outside = statement_lines(lines)
+    end = index + 1
+    # a multi-line string value goes with it
+    while end < len(lines) and not outside[end]:
+        end += 1
+    return lines[:index] + lines[end:]
+
+
+def quote_bare_value(lines: List[str], error: TomlError) -> Optional[List[str]]:
+    """`key = some text` -> `key = "some text"`"""
+    index = error.line - 1
+    match = KEY_VALUE.match(lines[index])
+    if match is None:
+        return None
+    value = match.group(2).strip()
+    if not value or BARE_VALUE.match(value):
+        return None
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return lines[:index] + [f'{match.group(1)}"{escaped}"'] + lines[index + 1:]
+
+
+Rule = Callable[[List[str], TomlError], Optional[List[str]]]
+
+RULES: Dict[str, Rule] = {
+    "invalid-escape": escape_backslashes,
+    "trailing-content": escape_quotes,
+    "multiline-string": join_multiline,
+    "unterminated-string": join_multiline,
+    "duplicate-key": drop_duplicate,
+    "invalid-value": quote_bare_value,
+}
+
+
+def repair(text: str, max_passes: int = 20) -> RepairResult:
+    """
+    Fix what the rules can, one error at a time.
+
+    A document that is already valid comes back unchanged; otherwise the
+    result holds the best attempt and the report of its first remaining
+    error.
+    """
+    initial = validate(text)
+    if initial.valid:
+        return RepairResult(toml=text, report=initial)
+
+    fixes: List[str] = []
+    lines = text.splitlines()
+    if (stripped := strip_code_fences(lines)) is not None:
+        lines = stripped
+        fixes.append("code-fence")
+    for _ in range(max_passes):
+        toml = "\n".join(lines) + "\n"
+        report = validate(toml)
+        if report.valid:
+            break
+        error = report.errors[0]
+        rule = RULES.get(error.kind)
+        fixed = rule(lines, error) if rule else None
+        if fixed is None or fixed == lines:
+            break
+        lines = fixed
+        fixes.append(error.kind)
+    else:
+        toml = "\n".join(lines) + "\n"
+        report = validate(toml)
+    if not fixes:
+        # nothing applied: hand back the document as it came
+        return RepairResult(toml=text, report=initial)
+    return RepairResult(toml=toml, report=report, fixes=fixes)
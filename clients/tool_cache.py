@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+from repository.tool_cache_repository import ToolCacheRepository
+from telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_arguments(tool_input: Dict[str, Any]) -> str:
+    """
+    Canonical JSON for tool arguments.
+
+    Keys are sorted and string values have their line endings and outer
+    whitespace normalized, so the same markdown file read on different
+    machines hashes to the same key.
+    """
+
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return value.replace("\r\n", "\n").strip()
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [normalize(v) for v in value]
+        return value
+
+    return json.dumps(
+        normalize(tool_input),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+class ToolResultCache:
+    """
+    Content-addressed cache for deterministic tool calls.
+
+    Keys are tool name + model identifier + sha256 of the normalized
+    arguments. Lookups hit an in-memory LRU first and fall back to the
+    `tool_cache` table, so results survive restarts and are shared by
+    every worker using the same database. Only tools listed in `policies`
+    (tool name -> model identifier) are cached.
+    """
+
+    def __init__(
+        self,
+        policies: Mapping[str, str],
+        repository: Optional[ToolCacheRepository] = None,
+        max_entries: int = 1024,
+        max_persistent_entries: int = 100_000,
+        ttl: float = 7 * 24 * 3600,
+        evict_every: int = 100,
+    ) -> None:
+        self.policies = policies
+        self.repository = repository
+        self.max_entries = max_entries
+        self.max_persistent_entries = max_persistent_entries
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._puts = 0
+        # keyed by (tool_name, "memory" | "db" | "miss")
+        self.counters: Counter = Counter()
+
+    def key(self, tool_name: str, tool_input: Dict[str, Any]) -> Optional[str]:
+        """Cache key for the call, or None if the tool has not opted in"""
+        model = self.policies.get(tool_name)
+        if model is None:
+            return None
+        payload = f"{tool_name}\0{model}\0{normalize_arguments(tool_input)}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, tool_name: str, cache_key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._memory.get(cache_key)
+        if entry is not None:
+            result, created_at = entry
+            if now - created_at < self.ttl:
+                self._memory.move_to_end(cache_key)
+                self._count(tool_name, "memory")
+                return result
+            del self._memory[cache_key]
+
+        if self.repository is not None:
+            try:
+                result = await asyncio.to_thread(
+                    self.repository.get, cache_key, now - self.ttl)
+            except sqlite3.Error as e:
+                # a broken cache must never fail the tool call
+                logger.error("Tool cache read failed", extra={"error": str(e)})
+                result = None
+            if result is not None:
+                self._remember(cache_key, result, now)
+                self._count(tool_name, "db")
+                return result
+
+        self._count(tool_name, "miss")
+        return None
+
+    async def put(self, tool_name: str, cache_key: str, result: str) -> None:
+        self._remember(cache_key, result, time.time())
+        if self.repository is None:
+            return
+        try:
+            await asyncio.to_thread(
+                self.repository.put, cache_key, tool_name, result)
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                await asyncio.to_thread(
+                    self.repository.evict,
+                    time.time() - self.ttl,
+                    self.max_persistent_entries,
+                )
+        except sqlite3.Error as e:
+            logger.error("Tool cache write failed", extra={"error": str(e)})
+
+    def _count(self, tool_name: str, outcome: str) -> None:
+        self.counters[(tool_name, outcome)] += 1
+        telemetry.metrics.inc("tool_cache_lookups_total", tool=tool_name, outcome=outcome)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats: Dict[str, Dict[str, int]] = {}
+        for (tool_name, outcome), count in self.counters.items():
+            stats.setdefault(tool_name, {})[outcome] = count
+        return stats
+
+    def _remember(self, cache_key: str, result: str, created_at: float) -> None:
+        self._memory[cache_key] = (result, created_at)
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
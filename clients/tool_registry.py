@@ -0,0 +1,267 @@
+"""
+Decorator-based tool registry.
+
+Tools register themselves with `@registry.tool(...)` in the module that
+defines them, declaring how they run: whether results are cacheable (and
+under which model/version), a concurrency limit and a timeout. The
+Anthropic `Tool` schema is generated from the function signature and
+docstring the first time the tool is offered to the model, then reused.
+
+Modules declared with `registry.lazy(...)` are imported the first time
+one of their tools is looked up, so importing the agent (or growing the
+catalog) doesn't pay for tool modules a process never uses.
+"""
+import asyncio
+import importlib
+import inspect
+import re
+from collections.abc import Mapping
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    get_type_hints,
+)
+from pydantic import TypeAdapter
+from clients.anthropic_models import Tool, ToolInputSchema
+
+ARG_LINE = re.compile(r"^    (\w+)(?:\s*\([^)]*\))?:\s*(.*)$")
+SECTIONS = {"Args:", "Returns:", "Raises:", "Yields:", "Example:"}
+
+
+def parse_docstring(doc: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """Summary paragraph and `Args:` descriptions of a Google-style docstring"""
+    if not doc:
+        return "", {}
+    lines = inspect.cleandoc(doc).splitlines()
+    summary: List[str] = []
+    for line in lines:
+        if not line.strip() or line.strip() in SECTIONS:
+            break
+        summary.append(line.strip())
+
+    args: Dict[str, str] = {}
+    if "Args:" in lines:
+        current = None
+        for line in lines[lines.index("Args:") + 1:]:
+            # a blank line or the next section ends the arguments
+            if not line.startswith(" "):
+                break
+            match = ARG_LINE.match(line)
+            if match:
+                current = match.group(1)
+                args[current] = match.group(2).strip()
+            elif current is not None:
+                args[current] = f"{args[current]} {line.strip()}"
+    return " ".join(summary), args
+
+
+def input_schema(fn: Callable) -> ToolInputSchema:
+    """JSON schema of `fn`'s keyword arguments"""
+    hints = get_type_hints(fn)
+    _, described = parse_docstring(fn.__doc__)
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+    for name, param in inspect.signature(fn).parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        schema = TypeAdapter(hints.get(name, Any)).json_schema()
+        schema.pop("title", None)
+        if name in described:
+            schema["description"] = described[name]
+        properties[name] = schema
+        if param.default is param.empty:
+            required.append(name)
+    return ToolInputSchema(properties=properties, required=required or None)
+
+
+class ToolSpec:
+    """A registered tool and how it runs"""
+
+    __slots__ = (
+        "name", "fn", "description", "is_async", "cache_version",
+        "concurrency", "timeout", "_tool", "_semaphore",
+    )
+
+    def __init__(
+        self,
+        fn: Callable,
+        name: str,
+        description: Optional[str] = None,
+        cache_version: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.description = description
+        # decided once here instead of inspecting on every call
+        self.is_async = inspect.iscoroutinefunction(fn)
+        self.cache_version = cache_version
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._tool: Optional[Tool] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def tool(self) -> Tool:
+        """Schema for the Messages API, generated on first use"""
+        if self._tool is None:
+            summary, _ = parse_docstring(self.fn.__doc__)
+            self._tool = Tool(
+                name=self.name,
+                description=self.description or summary or None,
+                input_schema=input_schema(self.fn),
+            )
+        return self._tool
+
+    @property
+    def semaphore(self) -> Optional[asyncio.Semaphore]:
+        if self.concurrency is None:
+            return None
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+
+class ToolRegistry(Mapping):
+    """
+    Tool name -> callable, loading tool modules on first lookup.
+
+    A plain dict of callables works wherever a registry is expected; the
+    registry adds the per-tool metadata and generated schemas.
+    """
+
+    def __init__(self) -> None:
+        self._specs: Dict[str, ToolSpec] = {}
+        # tool name -> module that registers it when imported
+        self._lazy: Dict[str, str] = {}
+
+    def tool(
+        self,
+        name: Optional[str] = None,
+        *,
+        description: Optional[str] = None,
+        cache: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Callable[[Callable], Callable]:
+        """
+        Register the decorated function as a tool.
+
+        Args:
+            name: Tool name; defaults to the function name
+            description: Defaults to the docstring summary
+            cache: Model or version the result depends on; results are
+                only cached for tools that set it
+            concurrency: Calls allowed to run at once across the process
+            timeout: Seconds per call; the agent's timeout applies if unset
+        """
+
+        def register(fn: Callable) -> Callable:
+            spec = ToolSpec(fn, name or fn.__name__, description, cache, concurrency, timeout)
+            existing = self._specs.get(spec.name)
+            if existing is not None and existing.fn is not fn:
+                raise ValueError(f"Tool '{spec.name}' is already registered")
+            self._specs[spec.name] = spec
+            self._lazy.pop(spec.name, None)
+            return fn
+
+        return register
+
+    def lazy(self, module: str, names: Iterable[str]) -> None:
+        """Declare tools that `module` registers, without importing it yet"""
+        for name in names:
+            if name not in self._specs:
+                self._lazy[name] = module
+
+    def spec(self, name: str) -> ToolSpec:
+        """
+        Raises:
+            KeyError: If no tool is registered under `name`
+        """
+        spec = self._specs.get(name)
+        if spec is None and name in self._lazy:
+            module = self._lazy[name]
+            importlib.import_module(module)
+            spec = self._specs.get(name)
+            if spec is None:
+                raise KeyError(f"Module '{module}' did not register tool '{name}'")
+        if spec is None:
+            raise KeyError(name)
+        return spec
+
+    def __getitem__(self, name: str) -> Callable:
+        return self.spec(name).fn
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._specs or name in self._lazy
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([*self._specs, *self._lazy])
+
+    def __len__(self) -> int:
+        return len(self._specs) + len(self._lazy)
+
+    def schemas(self, names: Iterable[str]) -> List[Tool]:
+        """
+        Tool definitions to send with a request, in the order given.
+
+        Raises:
+            ValueError: If a name is not a registered tool
+        """
+        tools = []
+        for name in names:
+            if name not in self:
+                available = ", ".join(self)
+                raise ValueError(f"Tool '{name}' not found. Available tools: {available}")
+            tools.append(self.spec(name).tool)
+        return tools
+
+    def cache_policies(self) -> "CachePolicies":
+        return CachePolicies(self)
+
+
+class CachePolicies(Mapping):
+    """Tool name -> cache version, for ToolResultCache; resolved lazily"""
+
+    def __init__(self, registry: ToolRegistry) -> None:
+        self.registry = registry
+
+    def __getitem__(self, name: str) -> str:
+        version = self.registry.spec(name).cache_version if name in self.registry else None
+        if version is None:
+            raise KeyError(name)
+        return version
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name in self.registry if name in self)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, name: object) -> bool:
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+
+# shared by every agent in the process, like the cli runner
+registry = ToolRegistry()
+
+# built-in tools
+registry.lazy("clients.tools", [
+    "convert_markdown_to_toml",
+    "convert_markdown_to_toml_gemini",
+    "convert_markdown_to_toml_claude_code",
+    "validate_toml",
+    "repair_toml",
+    "process_errors_claude",
+])
@@ -1,34 +1,60 @@
+import logging
 import subprocess
-import tomllib
-from typing import Tuple
-from clients.anthropic_models import Tool, ToolInputSchema
+from clients.cli_runner import CliRunner
+from clients.markdown_toml import markdown_to_toml
+from clients.tool_registry import registry
+from clients.toml_repair import repair, validate
+from telemetry import telemetry
+
+logger = logging.getLogger(__name__)
 
 
 CLAUDE_MODEL = "claude-opus-4-20250514"
 GEMINI_MODEL = "gemini-2.5-flash"
 
-# Define `convert_markdown_to_toml_gemini` as a Tool
-# with ToolInputSchema for the Anthropic API
-tool_convert_markdown_to_toml_gemini = Tool(
-    name="convert_markdown_to_toml_gemini",
-    description="""
-        Convert markdown document to TOML format using Gemini CLI.
-        Extracts key information and structures it as valid TOML.""",
-    input_schema=ToolInputSchema(
-        properties={
-            "markdown_doc": {
-                "type": "string",
-                "description": "The markdown document content to convert to TOML format",
-            },
-        },
-        required=["markdown_doc"],
-    ),
-)
-
-
-def convert_markdown_to_toml_gemini(markdown_doc: str) -> str:
+# both CLIs read the prompt from stdin when it is piped, which keeps large
+# documents out of argv and lets a warm process wait for its prompt
+GEMINI_CMD = ["gemini", "--model", GEMINI_MODEL]
+CLAUDE_CMD = ["claude", "--print", "--model", CLAUDE_MODEL]
+
+cli_runner = CliRunner(limits={"gemini": 8, "claude": 4})
+
+# cacheable tools name the model (or rules version) that produces their
+# output, so an upgrade never serves stale results
+
+
+@registry.tool(cache=f"native-1+{GEMINI_MODEL}")
+async def convert_markdown_to_toml(markdown_doc: str) -> str:
+    """
+    Convert a slash-command markdown document (front matter and a prompt)
+    to a Gemini CLI command TOML. Runs in-process in milliseconds; falls
+    back to Gemini CLI for documents without that structure.
+
+    Args:
+        markdown_doc: The markdown document content to convert to TOML format
+
+    Raises:
+        subprocess.TimeoutExpired: If the Gemini fallback runs past its timeout
+        RuntimeError: If the Gemini fallback exits with an error
+    """
+    try:
+        toml = markdown_to_toml(markdown_doc)
+    except ValueError as e:
+        logger.info("Native conversion not possible, using gemini: %s", e)
+        telemetry.metrics.inc("markdown_conversions_total", converter="gemini")
+        return await convert_markdown_to_toml_gemini(markdown_doc)
+    telemetry.metrics.inc("markdown_conversions_total", converter="native")
+    return toml
+
+
+@registry.tool(cache=GEMINI_MODEL)
+async def convert_markdown_to_toml_gemini(markdown_doc: str) -> str:
     """
-    Convert markdown to TOML using Gemini CLI.
+    Convert markdown document to TOML format using Gemini CLI.
+    Extracts key information and structures it as valid TOML.
+
+    Args:
+        markdown_doc: The markdown document content to convert to TOML format
     """
 
     prompt = """Convert the following markdown document to a TOML format.
@@ -42,42 +68,23 @@ def convert_markdown_to_toml_gemini(markdown_doc: str) -> str:
     prompt_with_args = prompt.format(content=markdown_doc)
 
     try:
-        result = subprocess.run(
-            ["gemini", "--model", GEMINI_MODEL, "--prompt", prompt_with_args],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        return result.stdout.strip()
+        result = await cli_runner.run(
+            "gemini", GEMINI_CMD, input=prompt_with_args)
+        return result.strip()
     except subprocess.CalledProcessError as e:
-        print(f"Error calling gemini: {e}")
-        return f"#Error converting markdown\n# {str(e)}"
-
-
-# Define `convert_markdown_to_toml_claude_code` as a Tool
-# with ToolInputSchema for the Anthropic API
-tool_convert_markdown_to_toml_claude_code = Tool(
-    name="convert_markdown_to_toml_claude_code",
-    description="""
-        Convert markdown document to TOML format using Claude CLI.
-        Extracts key information and structures it as valid TOML.""",
-    input_schema=ToolInputSchema(
-        properties={
-            "markdown_doc": {
-                "type": "string",
-                "description": """
-                The markdown document content to convert to TOML format
-                """,
-            },
-        },
-        required=["markdown_doc"],
-    ),
-)
-
-
-def convert_markdown_to_toml_claude_code(markdown_doc: str) -> str:
+        # raise so the agent reports an error result instead of a
+        # successful (and cacheable) one
+        raise RuntimeError(f"Error calling gemini: {e.stderr or e}") from e
+
+
+@registry.tool(cache=CLAUDE_MODEL)
+async def convert_markdown_to_toml_claude_code(markdown_doc: str) -> str:
     """
-    Convert markdown to TOML using Gemini CLI.
+    Convert markdown document to TOML format using Claude CLI.
+    Extracts key information and structures it as valid TOML.
+
+    Args:
+        markdown_doc: The markdown document content to convert to TOML format
     """
 
     prompt = """Convert the following markdown document to a TOML format.
@@ -90,88 +97,64 @@ def convert_markdown_to_toml_claude_code(markdown_doc: str) -> str:
     prompt_with_args = prompt.format(content=markdown_doc)
 
     try:
-        result = subprocess.run(
-            ["claude", "--model", CLAUDE_MODEL, "--prompt", prompt_with_args],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        return result.stdout.strip()
+        result = await cli_runner.run(
+            "claude", CLAUDE_CMD, input=prompt_with_args)
+        return result.strip()
     except subprocess.CalledProcessError as e:
-        print(f"Error calling claude: {e}")
-        return f"# Error converting markdown\n# {str(e)}"
-
-
-# Define `validate_toml` as a Tool
-# with ToolInputSchema for the Anthropic API
-tool_validate_toml = Tool(
-    name="validate_toml",
-    description="""
-        Validate a TOML file for syntax errors.
-        Returns validation status, original file content, and any error messages.""",
-    input_schema=ToolInputSchema(
-        properties={
-            "tomlfile": {
-                "type": "string",
-                "description": "TOML content as string to validate",
-            },
-        },
-        required=["tomlfile"],
-    ),
-)
-
-
-def validate_toml(tomlfile: str) -> Tuple[bool, str, str]:
+        raise RuntimeError(f"Error calling claude: {e.stderr or e}") from e
+
+
+@registry.tool(cache="tomllib", timeout=10)
+def validate_toml(tomlfile: str) -> str:
     """
     Validate a TOML file for syntax errors.
+    Returns JSON with `valid` and, for an invalid file, `errors` giving the
+    line, column, kind, message and offending line of each error.
+
     Args:
-        tomlfile: TOML content as string
+        tomlfile: TOML content as string to validate
 
     Returns:
-        Tuple of (is_valid, tomlfile, list_of_errors)
-        - is_valid: True if valid TOML, False otherwise
-        - the original toml file
-        - errors: Empty str if valide, list of error messages if invalid
+        The ValidationReport as JSON
     """
+    return validate(tomlfile).model_dump_json()
 
-    print("Validating TOML File")
 
-    try:
-        tomllib.loads(tomlfile)
-        return (True, tomlfile, "")
-    except tomllib.TOMLDecodeError as e:
-        return (False, tomlfile, str(e))
-
-    except Exception as e:
-        return (False, tomlfile, f"Unexpected error while parsing: {str(e)}")
-
-
-# Define `process_errors_claude` as a Tool
-# with ToolInputSchema for the Anthropic API
-tool_process_errors_claude = Tool(
-    name="process_errors_claude",
-    description="""
-        Process TOML content errors using Claude AI to generate fixes.
-        Takes TOML content and error messages, returns corrected TOML.""",
-    input_schema=ToolInputSchema(
-        properties={
-            "tomlfile": {
-                "type": "string",
-                "description": "TOML file content as a string",
-            },
-            "errors": {
-                "type": "string",
-                "description": "Error description/messages to be fixed",
-            },
-        },
-        required=["tomlfile", "errors"],
-    ),
-)
-
-
-def process_errors_claude(tomlfile: str, errors: str) -> str:
+@registry.tool(cache=f"rules-1+{CLAUDE_MODEL}")
+async def repair_toml(tomlfile: str) -> str:
+    """
+    Fix syntax errors in a TOML file and return the corrected TOML.
+    Common mistakes (code fences, unescaped quotes or backslashes,
+    duplicate keys, unquoted or unterminated strings) are fixed locally;
+    anything else is sent to Claude.
+
+    Args:
+        tomlfile: TOML file content as a string
+
+    Raises:
+        subprocess.TimeoutExpired: If the Claude CLI runs past its timeout
+        RuntimeError: If the TOML is still invalid after Claude's fix
+    """
+    result = repair(tomlfile)
+    if result.valid:
+        telemetry.metrics.inc("toml_repairs_total", outcome="local")
+        return result.toml
+
+    errors = result.report.describe()
+    logger.info("TOML needs an LLM repair: %s", errors)
+    fixed = repair(await process_errors_claude(result.toml, errors))
+    if not fixed.valid:
+        telemetry.metrics.inc("toml_repairs_total", outcome="failed")
+        raise RuntimeError(f"TOML still invalid: {fixed.report.describe()}")
+    telemetry.metrics.inc("toml_repairs_total", outcome="escalated")
+    return fixed.toml
+
+
+@registry.tool(cache=CLAUDE_MODEL)
+async def process_errors_claude(tomlfile: str, errors: str) -> str:
     """
     Process TOML content errors using Claude AI to generate fixes.
+    Takes TOML content and error messages, returns corrected TOML.
 
     Args:
         tomlfile: TOML file content as a string
@@ -181,8 +164,8 @@ def process_errors_claude(tomlfile: str, errors: str) -> str:
         The fixed TOML content as a string
 
     Raises:
-        subprocess.CalledProcessError: If Claude command fails
-        ValueError: If Claude returns empty or invalid response
+        subprocess.TimeoutExpired: If the Claude CLI runs past its timeout
+        RuntimeError: If the Claude CLI exits with an error
     """
 
     prompt = f"""
@@ -204,13 +187,7 @@ def process_errors_claude(tomlfile: str, errors: str) -> str:
     """
 
     try:
-        result = subprocess.run(
-            ["claude", "--model", CLAUDE_MODEL, "--prompt", prompt],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        return result.stdout.strip()
+        result = await cli_runner.run("claude", CLAUDE_CMD, input=prompt)
+        return result.strip()
     except subprocess.CalledProcessError as e:
-        print(f"Error calling claude: {e}")
-        return f"# Error converting markdown\n# {str(e)}"
+        raise RuntimeError(f"Error calling claude: {e.stderr or e}") from e
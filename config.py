@@ -9,9 +9,64 @@ class Config:
 
     def __init__(self) -> None:
         self.port = os.getenv("PORT")
+        # uvicorn worker processes; 0 runs one per cpu core
+        self.workers = int(os.getenv("WORKERS", "1")) or os.cpu_count() or 1
         self.gcp_project_id = os.getenv("GCP_PROJECT_ID")
         self.db_path = os.getenv("DB_PATH")
+        self.db_pool_readers = int(os.getenv("DB_POOL_READERS", "4"))
         self.anthropic_key_path = os.getenv("ANTHROPIC_API_KEY_PATH")
         self.anthropic_model_sonnet = os.getenv("ANTHROPIC_MODEL_SONNET")
         self.anthropic_model_opus = os.getenv("ANTHROPIC_MODEL_OPUS")
+        self.anthropic_base_url = os.getenv(
+            "ANTHROPIC_BASE_URL", "https://api.anthropic.com"
+        )
+        # shared http connection pool for the anthropic api
+        self.anthropic_max_connections = int(
+            os.getenv("ANTHROPIC_MAX_CONNECTIONS", "100")
+        )
+        self.anthropic_max_keepalive = int(
+            os.getenv("ANTHROPIC_MAX_KEEPALIVE", "20"))
+        self.anthropic_timeout = float(os.getenv("ANTHROPIC_TIMEOUT", "600"))
+        # starting rate limits; corrected from response headers at runtime
+        self.anthropic_rpm = int(os.getenv("ANTHROPIC_RPM", "50"))
+        self.anthropic_itpm = int(os.getenv("ANTHROPIC_ITPM", "30000"))
+        self.anthropic_otpm = int(os.getenv("ANTHROPIC_OTPM", "8000"))
+        self.anthropic_max_retries = int(
+            os.getenv("ANTHROPIC_MAX_RETRIES", "5"))
         self.github_url = os.getenv("GITHUB_URL", "")
+        # pre-started gemini cli processes for markdown -> toml conversion
+        self.cli_warm_workers = int(os.getenv("CLI_WARM_WORKERS", "2"))
+        # tool result cache (in-memory lru + sqlite)
+        self.tool_cache_max_entries = int(
+            os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+        self.tool_cache_ttl = float(os.getenv("TOOL_CACHE_TTL", "604800"))
+        # concurrent file conversions across all batches
+        self.batch_workers = int(os.getenv("BATCH_WORKERS", "8"))
+        # batch requests can only read and write files under this directory
+        self.batch_root = os.getenv("BATCH_ROOT", "data/batches")
+        # finished agent runs kept for GET /agent/runs/{session_id}
+        self.finished_runs_kept = int(os.getenv("FINISHED_RUNS_KEPT", "1000"))
+        # admission control shared by every worker process
+        self.max_concurrent_runs = int(os.getenv("MAX_CONCURRENT_RUNS", "16"))
+        self.max_queued_runs = int(os.getenv("MAX_QUEUED_RUNS", "32"))
+        self.admission_queue_timeout = float(
+            os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+        # a worker missing heartbeats this long is dead and its slots freed
+        self.worker_heartbeat_ttl = float(os.getenv("WORKER_HEARTBEAT_TTL", "15"))
+        # durable agent run queue: concurrent jobs per worker process
+        self.job_workers = int(os.getenv("JOB_WORKERS", "4"))
+        self.job_visibility_timeout = float(
+            os.getenv("JOB_VISIBILITY_TIMEOUT", "60"))
+        self.job_max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.job_retry_delay = float(os.getenv("JOB_RETRY_DELAY", "5"))
+        self.job_poll_interval = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+        # logging: bounded queue drained by a writer thread
+        self.log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.log_queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+        self.log_debug_sample_rate = float(
+            os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+        # span export: a json lines file and/or an otlp/http collector
+        self.telemetry_file = os.getenv("TELEMETRY_FILE")
+        self.otlp_endpoint = os.getenv("OTLP_ENDPOINT")
+        self.telemetry_flush_interval = float(
+            os.getenv("TELEMETRY_FLUSH_INTERVAL", "5"))
@@ -0,0 +1,17 @@
+from pathlib import Path
+import pytest
+from yoyo import get_backend, read_migrations
+from repository.database import SQLite3Database
+
+MIGRATIONS = Path(__file__).parent / "migrations"
+
+
+@pytest.fixture
+def db(tmp_path) -> SQLite3Database:
+    """A fresh database with every yoyo migration applied"""
+    db_path = tmp_path / "agents.db"
+    backend = get_backend(f"sqlite:///{db_path}")
+    with backend.lock():
+        backend.apply_migrations(
+            backend.to_apply(read_migrations(str(MIGRATIONS))))
+    return SQLite3Database(db_path=str(db_path))
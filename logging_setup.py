@@ -0,0 +1,139 @@
+"""
+Non-blocking structured logging.
+
+Records are handed to a bounded queue on the calling thread and formatted
+and written by a background thread, so a slow stdout never stalls the
+event loop. Messages use %-style arguments and are only rendered on the
+writer thread. Fields bound with `log_context` (session id, batch id) and
+the current trace/span ids are attached to every record automatically.
+High-volume debug records can be sampled, and when the queue is full
+records are dropped and counted instead of blocking the caller.
+"""
+import atexit
+import logging
+import queue
+import random
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, Optional, TextIO
+from pythonjsonlogger.json import JsonFormatter
+from telemetry import telemetry
+
+_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Attach `fields` to every record logged here and in tasks started here"""
+    previous = _context.get()
+    token = _context.set({**previous, **fields})
+    try:
+        yield
+    finally:
+        try:
+            _context.reset(token)
+        except ValueError:
+            # an async generator finalized from another context
+            _context.set(previous)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound context and trace ids onto the record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            # explicit `extra` fields win over the bound context
+            record.__dict__.setdefault(key, value)
+        span = telemetry.current_span()
+        if span is not None:
+            record.__dict__.setdefault("trace_id", span.trace_id)
+            record.__dict__.setdefault("span_id", span.span_id)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a `rate` fraction of records at or below `level`"""
+
+    def __init__(self, rate: float, level: int = logging.DEBUG) -> None:
+        super().__init__()
+        self.rate = rate
+        self.level = level
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level or random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Puts records on a bounded queue; drops and counts them when it is full"""
+
+    def __init__(self, maxsize: int = 10_000) -> None:
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler would render the message here, on the caller's
+        # thread; the writer thread does it instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            telemetry.metrics.inc("log_records_dropped_total")
+
+
+class ReportingQueueListener(QueueListener):
+    """Writer thread that also reports records the handler had to drop"""
+
+    def __init__(self, source: NonBlockingQueueHandler, *handlers: logging.Handler) -> None:
+        super().__init__(source.queue, *handlers, respect_handler_level=True)
+        self.source = source
+        self.reported = 0
+
+    def handle(self, record: logging.LogRecord) -> None:
+        dropped = self.source.dropped
+        if dropped > self.reported:
+            notice = logging.makeLogRecord({
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": "Dropped %d log records: queue full",
+                "args": (dropped - self.reported,),
+            })
+            self.reported = dropped
+            super().handle(notice)
+        super().handle(record)
+
+
+def configure_logging(
+    level: int = logging.INFO,
+    queue_size: int = 10_000,
+    debug_sample_rate: float = 1.0,
+    stream: Optional[TextIO] = None,
+) -> ReportingQueueListener:
+    """Route the root logger through the queue to a JSON stream handler"""
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    writer.setLevel(level)
+
+    handler = NonBlockingQueueHandler(queue_size)
+    handler.setLevel(level)
+    handler.addFilter(SamplingFilter(debug_sample_rate))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+
+    listener = ReportingQueueListener(handler, writer)
+    listener.start()
+    # drain what is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
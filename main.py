@@ -1,37 +1,134 @@
 from config import Config
+import uuid
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-from pythonjsonlogger.json import JsonFormatter
-import sys
 from contextlib import asynccontextmanager
 from baseservice.base_api import base_router
-
-# Configure JSON logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-handler = logging.StreamHandler(stream=sys.stdout)
-handler.setFormatter(JsonFormatter())
-handler.setLevel(logging.INFO)
-logger.addHandler(handler)
+from agentservice.agent_api import agent_router, job_agent_builder
+from agentservice.batch_api import batch_router
+from agentservice.batch_service import BatchService
+from agentservice.run_registry import RunRegistry
+from agentservice.job_service import JobService
+from clients.tool_registry import registry as tool_registry
+from clients.anthropic_client import build_http_client
+from clients.rate_limiter import RateLimitScheduler
+from clients.tools import cli_runner, GEMINI_CMD
+from clients.tool_cache import ToolResultCache
+from repository.database import SQLite3ConnectionPool
+from repository.async_database import AsyncSQLite3Database
+from repository.tool_cache_repository import ToolCacheRepository
+from repository.session_repository import SessionRepository
+from repository.batch_repository import BatchRepository
+from repository.admission_repository import AdmissionRepository
+from repository.job_queue import JobQueue
+from admission import AdmissionController
+from logging_setup import configure_logging
+from telemetry import FileSpanExporter, OTLPSpanExporter, telemetry
 
 config = Config()
 
+# Configure JSON logging: records are written by a background thread
+logger = logging.getLogger()
+configure_logging(
+    level=logging.getLevelNamesMapping()[config.log_level],
+    queue_size=config.log_queue_size,
+    debug_sample_rate=config.log_debug_sample_rate,
+)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
     logger.info("Starting agents service...")
+    if config.telemetry_file:
+        telemetry.add_exporter(FileSpanExporter(config.telemetry_file))
+    if config.otlp_endpoint:
+        telemetry.add_exporter(OTLPSpanExporter(config.otlp_endpoint))
+    telemetry.start(config.telemetry_flush_interval)
     app.state.db_path = config.db_path
-    logger.info(f"database path set to: {app.state.db_path}")
-    logger.info(f"service running on port: {config.port}")
+    logger.info("database path set to: %s", app.state.db_path)
+    app.state.db_pool = SQLite3ConnectionPool(
+        config.db_path, readers=config.db_pool_readers)
+    # async endpoints go through here; one executor thread per connection
+    app.state.db = AsyncSQLite3Database(
+        app.state.db_pool, max_workers=config.db_pool_readers + 1)
+    logger.info("service running on port: %s", config.port)
+    # one keep-alive connection pool shared by every agent session
+    app.state.http_client = build_http_client(config)
+    # and one rate limit budget, so sessions don't race each other into 429s;
+    # each worker process gets an equal share of the organization's limits
+    app.state.rate_limiter = RateLimitScheduler(
+        requests_per_minute=config.anthropic_rpm,
+        input_tokens_per_minute=config.anthropic_itpm,
+        output_tokens_per_minute=config.anthropic_otpm,
+        max_retries=config.anthropic_max_retries,
+        share=1 / config.workers,
+    )
+    app.state.run_registry = RunRegistry(max_finished=config.finished_runs_kept)
+    # concurrent agent runs are limited across every worker process, and
+    # runs cancelled through another worker are stopped here
+    worker_id = uuid.uuid4().hex
+    app.state.admission = AdmissionController(
+        AdmissionRepository(app.state.db, worker_id, ttl=config.worker_heartbeat_ttl),
+        max_running=config.max_concurrent_runs,
+        max_queued=config.max_queued_runs,
+        queue_timeout=config.admission_queue_timeout,
+        on_cancel=app.state.run_registry.cancel_nowait,
+    )
+    await app.state.admission.start()
+    logger.info("worker registered: %s", worker_id)
+    await cli_runner.start_warm_pool(GEMINI_CMD, config.cli_warm_workers)
+    app.state.tool_cache = ToolResultCache(
+        tool_registry.cache_policies(),
+        ToolCacheRepository(app.state.db_pool),
+        max_entries=config.tool_cache_max_entries,
+        ttl=config.tool_cache_ttl,
+    )
+    app.state.session_store = SessionRepository(app.state.db_pool)
+    app.state.batch_service = BatchService(
+        BatchRepository(app.state.db),
+        tool_registry,
+        app.state.tool_cache,
+        max_workers=config.batch_workers,
+        worker_id=worker_id,
+        worker_ttl=config.worker_heartbeat_ttl,
+        root=config.batch_root,
+    )
+    app.state.batch_service.watch()
+
+    # queued agent runs, worked off by every worker process
+    app.state.job_service = JobService(
+        JobQueue(app.state.db),
+        job_agent_builder(app.state),
+        app.state.run_registry,
+        app.state.admission,
+        worker_id=worker_id,
+        concurrency=config.job_workers,
+        visibility_timeout=config.job_visibility_timeout,
+        max_attempts=config.job_max_attempts,
+        retry_delay=config.job_retry_delay,
+        poll_interval=config.job_poll_interval,
+    )
+    app.state.job_service.start()
 
     yield
 
     # shutdown
     logger.info("Shutting down service...")
+    # readiness fails first so the load balancer stops sending runs here
+    app.state.admission.drain()
+    # jobs in progress go back to the queue for another worker
+    await app.state.job_service.aclose()
+    await app.state.run_registry.aclose()
+    await app.state.batch_service.aclose()
+    await app.state.admission.aclose()
+    await telemetry.aclose()
+    await app.state.http_client.aclose()
+    await cli_runner.aclose()
+    app.state.db.close()
+    app.state.db_pool.close()
 
 
 app = FastAPI(
@@ -50,14 +147,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # root span for everything the request does; the id goes back to the
+    # caller so a slow response can be found in the exported traces
+    with telemetry.span(
+        "http.request", method=request.method, path=request.url.path
+    ) as span:
+        response = await call_next(request)
+        span.set(status_code=response.status_code)
+        response.headers["X-Trace-Id"] = span.trace_id
+        return response
+
+
 app.include_router(base_router, tags=["base_api"])
+app.include_router(agent_router, tags=["agent_api"])
+app.include_router(batch_router, tags=["batch_api"])
 
 
 def main():
     logger.info("Hello from agents!", extra={"more_data": True})
 
-    logger.info("Server configuration", extra={"port": config.port})
-    uvicorn.run("main:app", host="0.0.0.0", port=int(config.port))
+    logger.info(
+        "Server configuration",
+        extra={"port": config.port, "workers": config.workers},
+    )
+    # every worker process runs the lifespan above with its own pools
+    uvicorn.run(
+        "main:app", host="0.0.0.0", port=int(config.port), workers=config.workers)
 
 
 if __name__ == "__main__":
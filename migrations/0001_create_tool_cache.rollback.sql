@@ -0,0 +1 @@
+DROP TABLE tool_cache;
@@ -0,0 +1,10 @@
+-- persistent tier of the tool result cache (clients/tool_cache.py)
+CREATE TABLE tool_cache (
+    cache_key TEXT PRIMARY KEY,
+    tool_name TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+
+CREATE INDEX idx_tool_cache_last_used_at ON tool_cache (last_used_at);
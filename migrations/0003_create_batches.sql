@@ -0,0 +1,24 @@
+-- depends: 0002_create_sessions
+-- bulk markdown -> toml conversion jobs, checkpointed per item
+CREATE TABLE batches (
+    batch_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    output_dir TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE batch_items (
+    batch_id TEXT NOT NULL REFERENCES batches (batch_id) ON DELETE CASCADE,
+    item_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (batch_id, item_id)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_batch_items_status ON batch_items (batch_id, status);
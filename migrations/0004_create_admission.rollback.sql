@@ -0,0 +1,3 @@
+ALTER TABLE batches DROP COLUMN worker_id;
+DROP TABLE admission_slots;
+DROP TABLE workers;
@@ -0,0 +1,21 @@
+-- depends: 0003_create_batches
+-- cross-process admission control: live service workers and the agent
+-- runs they have admitted or queued, one per session
+CREATE TABLE workers (
+    worker_id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+
+CREATE TABLE admission_slots (
+    session_id TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL REFERENCES workers (worker_id) ON DELETE CASCADE,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE INDEX idx_admission_slots_state ON admission_slots (state, created_at);
+
+-- the worker running a batch; another worker resumes it once that one is gone
+ALTER TABLE batches ADD COLUMN worker_id TEXT;
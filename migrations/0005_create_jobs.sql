@@ -0,0 +1,20 @@
+-- depends: 0004_create_admission
+-- durable queue of agent runs; a job is leased by one worker at a time
+CREATE TABLE jobs (
+    job_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE INDEX idx_jobs_status ON jobs (status, available_at);
+CREATE INDEX idx_jobs_session ON jobs (session_id, status);
@@ -0,0 +1,2 @@
+ALTER TABLE workers DROP COLUMN metrics;
+ALTER TABLE admission_slots DROP COLUMN cancel_requested_at;
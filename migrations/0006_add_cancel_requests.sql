@@ -0,0 +1,8 @@
+-- depends: 0005_create_jobs
+-- a cancel asked for through another worker; the slot's own worker polls
+-- for it and stops the run
+ALTER TABLE admission_slots ADD COLUMN cancel_requested_at REAL;
+
+-- each worker's counters and histograms as of its last heartbeat, so any
+-- worker can answer GET /metrics for all of them
+ALTER TABLE workers ADD COLUMN metrics TEXT;
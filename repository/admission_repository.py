@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+from repository.async_database import AsyncSQLite3Database
+
+
+class AdmissionRepository:
+    """
+    Admission state shared by every service worker, in `workers` /
+    `admission_slots`.
+
+    Each worker heartbeats its row in `workers`; slots belong to a worker
+    and are deleted with it, so a crashed process can't hold capacity
+    forever. Decisions run in `BEGIN IMMEDIATE` transactions, which SQLite
+    serializes across processes, so two workers never both take the last
+    slot. The slots also tell any worker where a session's run lives, and
+    carry cancel requests to the worker that owns it.
+    """
+
+    def __init__(self, db: AsyncSQLite3Database, worker_id: str, ttl: float = 15.0) -> None:
+        self.db = db
+        self.worker_id = worker_id
+        # a worker that hasn't heartbeated for this long is considered dead
+        self.ttl = ttl
+
+    async def register(self) -> None:
+        now = time.time()
+        await self.db.execute(
+            "INSERT OR REPLACE INTO workers (worker_id, pid, started_at, heartbeat_at) "
+            "VALUES (?, ?, ?, ?)",
+            (self.worker_id, os.getpid(), now, now),
+        )
+
+    async def heartbeat(self, metrics: Optional[str] = None) -> None:
+        """
+        Refresh this worker, with its `metrics` snapshot, and drop the ones
+        that stopped heartbeating
+        """
+        now = time.time()
+
+        def beat(conn: sqlite3.Connection) -> None:
+            updated = conn.execute(
+                "UPDATE workers SET heartbeat_at = ?, metrics = ? WHERE worker_id = ?",
+                (now, metrics, self.worker_id),
+            ).rowcount
+            if not updated:
+                # reaped while the process was stalled; its slots are gone
+                conn.execute(
+                    "INSERT INTO workers (worker_id, pid, started_at, heartbeat_at, "
+                    "metrics) VALUES (?, ?, ?, ?, ?)",
+                    (self.worker_id, os.getpid(), now, now, metrics),
+                )
+            conn.execute(
+                "DELETE FROM workers WHERE heartbeat_at < ?", (now - self.ttl,))
+
+        await self.db.run(beat)
+
+    async def unregister(self) -> None:
+        await self.db.execute(
+            "DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+
+    async def admit(self, session_id: str, max_running: int, max_queued: int) -> str:
+        """
+        Take a running slot, or a place in the queue behind the runs
+        already waiting.
+
+        Returns 'running', 'queued', 'full' (the queue is full) or
+        'duplicate' (the session already has a run on some worker).
+        """
+        now = time.time()
+
+        def decide(conn: sqlite3.Connection) -> str:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM workers WHERE heartbeat_at < ?", (now - self.ttl,))
+            if conn.execute(
+                "SELECT 1 FROM admission_slots WHERE session_id = ?", (session_id,)
+            ).fetchone():
+                return "duplicate"
+            counts = self._counts(conn)
+            if counts["running"] < max_running and counts["queued"] == 0:
+                state = "running"
+            elif counts["queued"] < max_queued:
+                state = "queued"
+            else:
+                return "full"
+            conn.execute(
+                "INSERT INTO admission_slots (session_id, worker_id, state, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (session_id, self.worker_id, state, now),
+            )
+            return state
+
+        return await self.db.run(decide)
+
+    async def promote(self, session_id: str, max_running: int) -> Optional[bool]:
+        """
+        Move a queued run to running once the runs ahead of it fit.
+
+        Returns None if the slot is gone: its worker was reaped, or the run
+        was cancelled while queued, which drops the slot here.
+        """
+
+        def decide(conn: sqlite3.Connection) -> Optional[bool]:
+            conn.execute("BEGIN IMMEDIATE")
+            slot = conn.execute(
+                "SELECT state, created_at, cancel_requested_at FROM admission_slots "
+                "WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if slot is None:
+                return None
+            if slot["cancel_requested_at"] is not None:
+                conn.execute(
+                    "DELETE FROM admission_slots WHERE session_id = ?", (session_id,))
+                return None
+            if slot["state"] == "running":
+                return True
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM admission_slots WHERE state = 'queued' "
+                "AND (created_at < ? OR (created_at = ? AND session_id < ?))",
+                (slot["created_at"], slot["created_at"], session_id),
+            ).fetchone()[0]
+            if self._counts(conn)["running"] + ahead >= max_running:
+                return False
+            conn.execute(
+                "UPDATE admission_slots SET state = 'running' WHERE session_id = ?",
+                (session_id,),
+            )
+            return True
+
+        return await self.db.run(decide)
+
+    async def release(self, session_id: str) -> None:
+        await self.db.execute(
+            "DELETE FROM admission_slots WHERE session_id = ? AND worker_id = ?",
+            (session_id, self.worker_id),
+        )
+
+    async def slot(self, session_id: str) -> Optional[sqlite3.Row]:
+        """The session's slot on any live worker"""
+        return await self.db.fetchone(
+            "SELECT s.* FROM admission_slots AS s JOIN workers AS w USING (worker_id) "
+            "WHERE s.session_id = ? AND w.heartbeat_at >= ?",
+            (session_id, time.time() - self.ttl),
+        )
+
+    async def others(self) -> List[sqlite3.Row]:
+        """Slots held by the other live workers, oldest first"""
+        return await self.db.fetchall(
+            "SELECT s.* FROM admission_slots AS s JOIN workers AS w USING (worker_id) "
+            "WHERE s.worker_id != ? AND w.heartbeat_at >= ? ORDER BY s.created_at",
+            (self.worker_id, time.time() - self.ttl),
+        )
+
+    async def request_cancel(self, session_id: str) -> bool:
+        """Flag the session's run for its worker to cancel; False if there is none"""
+        return bool(await self.db.execute(
+            "UPDATE admission_slots SET cancel_requested_at = "
+            "COALESCE(cancel_requested_at, ?) WHERE session_id = ?",
+            (time.time(), session_id),
+        ))
+
+    async def cancel_requests(self) -> List[str]:
+        """Sessions of this worker whose runs were asked to stop"""
+        rows = await self.db.fetchall(
+            "SELECT session_id FROM admission_slots "
+            "WHERE worker_id = ? AND cancel_requested_at IS NOT NULL",
+            (self.worker_id,),
+        )
+        return [r["session_id"] for r in rows]
+
+    async def worker_metrics(self) -> Dict[str, str]:
+        """The other live workers' metrics snapshots, by worker id"""
+        rows = await self.db.fetchall(
+            "SELECT worker_id, metrics FROM workers WHERE worker_id != ? "
+            "AND heartbeat_at >= ? AND metrics IS NOT NULL",
+            (self.worker_id, time.time() - self.ttl),
+        )
+        return {r["worker_id"]: r["metrics"] for r in rows}
+
+    async def counts(self) -> Dict[str, int]:
+        """Running and queued slots and live workers, across every worker"""
+
+        def read(conn: sqlite3.Connection) -> Dict[str, int]:
+            counts = self._counts(conn)
+            counts["workers"] = conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat_at >= ?",
+                (time.time() - self.ttl,),
+            ).fetchone()[0]
+            return counts
+
+        return await self.db.run(read, read_only=True)
+
+    @staticmethod
+    def _counts(conn: sqlite3.Connection) -> Dict[str, int]:
+        rows = conn.execute(
+            "SELECT state, COUNT(*) AS n FROM admission_slots GROUP BY state"
+        ).fetchall()
+        counts = {"running": 0, "queued": 0}
+        counts.update({r["state"]: r["n"] for r in rows})
+        return counts
@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, List, Optional, Sequence, TypeVar
+from repository.database import SQLite3ConnectionPool
+from telemetry import telemetry
+
+T = TypeVar("T")
+
+
+class AsyncSQLite3Database:
+    """
+    Async access to the connection pool for FastAPI endpoints.
+
+    Every query runs on a dedicated executor sized to the pool, so
+    database waits never block the event loop and never queue behind
+    blocking tool calls in the default executor.
+    """
+
+    def __init__(self, pool: SQLite3ConnectionPool, max_workers: int = 5) -> None:
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sqlite")
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(fn, *args))
+
+    async def run(
+        self, fn: Callable[[sqlite3.Connection], T], read_only: bool = False
+    ) -> T:
+        """Run `fn(conn)` as one transaction on a pooled connection"""
+        with telemetry.span("db.transaction", read_only=read_only) as span:
+            submitted = time.monotonic()
+
+            def transaction() -> T:
+                # executor queue time plus waiting for a pooled connection
+                with self.pool.get_connection(read_only=read_only) as conn:
+                    span.set(queued_ms=(time.monotonic() - submitted) * 1000)
+                    return fn(conn)
+
+            return await self._run(transaction)
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return await self.run(
+            lambda conn: conn.execute(sql, params).fetchall(), read_only=True)
+
+    async def fetchone(
+        self, sql: str, params: Sequence[Any] = ()
+    ) -> Optional[sqlite3.Row]:
+        return await self.run(
+            lambda conn: conn.execute(sql, params).fetchone(), read_only=True)
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Run a write statement; returns the affected row count"""
+        return await self.run(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def executemany(
+        self, sql: str, seq_of_params: Iterable[Sequence[Any]]
+    ) -> int:
+        """Bulk insert/update in a single transaction"""
+        rows = list(seq_of_params)
+        return await self.run(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    async def stream(
+        self, sql: str, params: Sequence[Any] = (), batch_size: int = 500
+    ) -> AsyncIterator[sqlite3.Row]:
+        """
+        Yield rows lazily for large result sets.
+
+        Rows are fetched `batch_size` at a time on the executor; the read
+        connection stays borrowed until the iterator is exhausted or closed.
+        """
+        borrowed = self.pool.get_connection(read_only=True)
+        conn = await self._run(borrowed.__enter__)
+        try:
+            cursor = await self._run(conn.execute, sql, params)
+            while rows := await self._run(cursor.fetchmany, batch_size):
+                for row in rows:
+                    yield row
+        finally:
+            await self._run(borrowed.__exit__, None, None, None)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,112 @@
+import sqlite3
+import time
+from typing import Dict, List, Optional
+from repository.async_database import AsyncSQLite3Database
+
+
+class BatchRepository:
+    """Batches and their per-file checkpoints in `batches` / `batch_items`"""
+
+    def __init__(self, db: AsyncSQLite3Database) -> None:
+        self.db = db
+
+    async def create(
+        self,
+        batch_id: str,
+        source: str,
+        output_dir: Optional[str],
+        paths: List[str],
+        worker_id: Optional[str] = None,
+    ) -> None:
+        now = time.time()
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO batches "
+                "(batch_id, source, output_dir, status, worker_id, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'running', ?, ?, ?)",
+                (batch_id, source, output_dir, worker_id, now, now),
+            )
+            conn.executemany(
+                "INSERT INTO batch_items (batch_id, item_id, path, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(batch_id, i, path, now) for i, path in enumerate(paths)],
+            )
+
+        await self.db.run(insert)
+
+    async def get(self, batch_id: str) -> Optional[sqlite3.Row]:
+        return await self.db.fetchone(
+            "SELECT * FROM batches WHERE batch_id = ?", (batch_id,))
+
+    async def counts(self, batch_id: str) -> Dict[str, int]:
+        rows = await self.db.fetchall(
+            "SELECT status, COUNT(*) AS n FROM batch_items "
+            "WHERE batch_id = ? GROUP BY status",
+            (batch_id,),
+        )
+        return {r["status"]: r["n"] for r in rows}
+
+    async def unfinished_items(self, batch_id: str) -> List[sqlite3.Row]:
+        # 'running' items belong to a worker that died mid-conversion
+        return await self.db.fetchall(
+            "SELECT item_id, path FROM batch_items "
+            "WHERE batch_id = ? AND status IN ('pending', 'running') "
+            "ORDER BY item_id",
+            (batch_id,),
+        )
+
+    async def claim_orphaned(self, worker_id: str, live_since: float) -> List[str]:
+        """
+        Take over running batches whose worker is gone (no heartbeat since
+        `live_since`); one statement, so only one worker wins each batch.
+        """
+
+        def claim(conn: sqlite3.Connection) -> List[str]:
+            rows = conn.execute(
+                "UPDATE batches SET worker_id = ?, updated_at = ? "
+                "WHERE status = 'running' AND (worker_id IS NULL OR worker_id NOT IN ("
+                "SELECT worker_id FROM workers WHERE heartbeat_at >= ?)) "
+                "RETURNING batch_id",
+                (worker_id, time.time(), live_since),
+            ).fetchall()
+            return [r["batch_id"] for r in rows]
+
+        return await self.db.run(claim)
+
+    async def start_item(self, batch_id: str, item_id: int) -> None:
+        await self.db.execute(
+            "UPDATE batch_items SET status = 'running', attempts = attempts + 1, "
+            "updated_at = ? WHERE batch_id = ? AND item_id = ?",
+            (time.time(), batch_id, item_id),
+        )
+
+    async def finish_item(
+        self,
+        batch_id: str,
+        item_id: int,
+        result: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        await self.db.execute(
+            "UPDATE batch_items SET status = ?, result = ?, error = ?, "
+            "updated_at = ? WHERE batch_id = ? AND item_id = ?",
+            ("failed" if error else "done", result, error, time.time(),
+             batch_id, item_id),
+        )
+
+    async def finish(self, batch_id: str) -> None:
+        await self.db.execute(
+            "UPDATE batches SET status = 'done', updated_at = ? WHERE batch_id = ?",
+            (time.time(), batch_id),
+        )
+
+    async def items(
+        self, batch_id: str, offset: int, limit: int
+    ) -> List[sqlite3.Row]:
+        return await self.db.fetchall(
+            "SELECT item_id, path, status, attempts, result, error "
+            "FROM batch_items WHERE batch_id = ? "
+            "ORDER BY item_id LIMIT ? OFFSET ?",
+            (batch_id, limit, offset),
+        )
@@ -1,7 +1,9 @@
+import queue
 import sqlite3
+import threading
 
 from contextlib import contextmanager
-from typing import Generator
+from typing import Generator, Union
 
 
 class SQLite3Database:
@@ -41,3 +43,111 @@ class SQLite3Database:
         finally:
             # Cleanup phase: always runs when exiting 'with' block
             conn.close()
+
+
+class SQLite3ConnectionPool:
+    """
+    Process-wide pool of long-lived sqlite3 connections.
+
+    A fixed set of read connections plus one writer guarded by a lock
+    (SQLite allows a single writer at a time anyway). PRAGMAs are applied
+    once per connection, so the page cache and mmap survive across
+    requests. Exposes the same `get_connection` context manager as
+    SQLite3Database; it blocks while waiting for a connection, so call it
+    from a worker thread (sync FastAPI dependencies, asyncio.to_thread),
+    never directly on the event loop.
+    """
+
+    def __init__(
+        self, db_path: str = "../data/agents.db", readers: int = 4, timeout: float = 30.0
+    ):
+        self.db_path = db_path
+        self.timeout = timeout
+        # writer first: it switches the database to WAL for the readers
+        self._writer = self._connect(read_only=False)
+        self._write_lock = threading.Lock()
+        self._readers: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect(read_only=True))
+        self._closed = False
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # connections are handed between threadpool workers
+            check_same_thread=False,
+            timeout=self.timeout,
+        )
+        conn.row_factory = sqlite3.Row
+
+        conn.execute("PRAGMA foreign_keys = ON")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -64000")  # 64MB cache
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA mmap_size = 268435456")  # 256MB memory-mapped I/O
+        return conn
+
+    def _healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @contextmanager
+    def get_connection(
+        self, read_only: bool = False
+    ) -> Generator[sqlite3.Connection, None, None]:
+        """Borrow a pooled connection; writes are committed on exit"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        if read_only:
+            conn = self._readers.get(timeout=self.timeout)
+            if not self._healthy(conn):
+                conn.close()
+                conn = self._connect(read_only=True)
+            try:
+                yield conn
+            finally:
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except sqlite3.Error:
+                    # closed or broken while borrowed: replace it
+                    conn = self._connect(read_only=True)
+                self._readers.put(conn)
+            return
+
+        if not self._write_lock.acquire(timeout=self.timeout):
+            raise TimeoutError("Timed out waiting for the database writer")
+        try:
+            if not self._healthy(self._writer):
+                self._writer.close()
+                self._writer = self._connect(read_only=False)
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        finally:
+            self._write_lock.release()
+
+    def close(self) -> None:
+        self._closed = True
+        with self._write_lock:
+            self._writer.execute("PRAGMA optimize")
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+
+# anything repositories can borrow connections from
+Database = Union[SQLite3Database, SQLite3ConnectionPool]
@@ -0,0 +1,137 @@
+import sqlite3
+import time
+import uuid
+from typing import List, Optional
+from repository.async_database import AsyncSQLite3Database
+
+# a job that can be leased: queued and due, or leased by a worker that
+# stopped heartbeating
+READY = (
+    "((j.status = 'queued' AND j.available_at <= :now) "
+    "OR (j.status = 'leased' AND j.lease_expires_at < :now))"
+)
+
+
+class JobQueue:
+    """
+    Durable job queue in the `jobs` table.
+
+    A worker leases a job for `visibility_timeout` seconds and keeps the
+    lease alive with heartbeats; a lease that runs out makes the job
+    visible to other workers again, so a crashed worker's jobs are picked
+    up elsewhere. Every lease counts as an attempt. A failed job is
+    retried after a delay until `max_attempts`, then dead-lettered with
+    status 'dead'. Jobs of one session are leased one at a time, oldest
+    first, so a conversation's turns never run concurrently.
+    """
+
+    def __init__(self, db: AsyncSQLite3Database) -> None:
+        self.db = db
+
+    async def enqueue(self, session_id: str, payload: str, max_attempts: int = 3) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        await self.db.execute(
+            "INSERT INTO jobs (job_id, session_id, payload, max_attempts, "
+            "available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, session_id, payload, max_attempts, now, now, now),
+        )
+        return job_id
+
+    async def lease(
+        self, owner: str, visibility_timeout: float, limit: int = 1
+    ) -> List[sqlite3.Row]:
+        """Lease up to `limit` due jobs for `owner`, in the order they were enqueued"""
+        now = time.time()
+        params = {"now": now, "owner": owner, "expires": now + visibility_timeout,
+                  "limit": limit}
+
+        def lease(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            conn.execute("BEGIN IMMEDIATE")
+            # out of attempts while leased: the worker died on the last one
+            conn.execute(
+                "UPDATE jobs SET status = 'dead', lease_owner = NULL, "
+                "lease_expires_at = NULL, updated_at = :now, "
+                "error = COALESCE(error, 'Lease expired on the last attempt') "
+                "WHERE status = 'leased' AND lease_expires_at < :now "
+                "AND attempts >= max_attempts",
+                params,
+            )
+            return conn.execute(
+                "UPDATE jobs SET status = 'leased', attempts = attempts + 1, "
+                "lease_owner = :owner, lease_expires_at = :expires, updated_at = :now "
+                "WHERE job_id IN ("
+                f"SELECT j.job_id FROM jobs AS j WHERE {READY} "
+                "AND NOT EXISTS (SELECT 1 FROM jobs AS o "
+                "WHERE o.session_id = j.session_id AND o.job_id != j.job_id AND ("
+                "(o.status = 'leased' AND o.lease_expires_at >= :now) "
+                "OR (o.status IN ('queued', 'leased') AND o.rowid < j.rowid))) "
+                "ORDER BY j.rowid LIMIT :limit) "
+                "RETURNING *",
+                params,
+            ).fetchall()
+
+        return await self.db.run(lease)
+
+    async def heartbeat(self, job_id: str, owner: str, visibility_timeout: float) -> bool:
+        """Extend the lease; False if `owner` no longer holds it"""
+        now = time.time()
+        return bool(await self.db.execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+            "WHERE job_id = ? AND lease_owner = ? AND status = 'leased'",
+            (now + visibility_timeout, now, job_id, owner),
+        ))
+
+    async def ack(self, job_id: str, owner: str, result: Optional[str]) -> bool:
+        """Mark the job done; False if the lease was lost in the meantime"""
+        return bool(await self.db.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, "
+            "lease_owner = NULL, lease_expires_at = NULL, updated_at = ? "
+            "WHERE job_id = ? AND lease_owner = ? AND status = 'leased'",
+            (result, time.time(), job_id, owner),
+        ))
+
+    async def fail(
+        self, job_id: str, owner: str, error: str, retry_delay: float, retry: bool = True
+    ) -> Optional[str]:
+        """
+        Requeue the job after `retry_delay` seconds, or dead-letter it once
+        it is out of attempts (or `retry` is False).
+
+        Returns the new status, or None if the lease was lost.
+        """
+        now = time.time()
+
+        def fail(conn: sqlite3.Connection) -> Optional[str]:
+            row = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN ? AND attempts < max_attempts "
+                "THEN 'queued' ELSE 'dead' END, "
+                "available_at = ?, error = ?, lease_owner = NULL, "
+                "lease_expires_at = NULL, updated_at = ? "
+                "WHERE job_id = ? AND lease_owner = ? AND status = 'leased' "
+                "RETURNING status",
+                (retry, now + retry_delay, error, now, job_id, owner),
+            ).fetchone()
+            return row["status"] if row else None
+
+        return await self.db.run(fail)
+
+    async def release(self, job_id: str, owner: str, delay: float = 0.0) -> bool:
+        """Give the job back without using up an attempt, e.g. on shutdown"""
+        now = time.time()
+        return bool(await self.db.execute(
+            "UPDATE jobs SET status = 'queued', attempts = attempts - 1, "
+            "available_at = ?, lease_owner = NULL, lease_expires_at = NULL, "
+            "updated_at = ? WHERE job_id = ? AND lease_owner = ? AND status = 'leased'",
+            (now + delay, now, job_id, owner),
+        ))
+
+    async def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        return await self.db.fetchone("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+
+    async def by_status(self, status: str, limit: int = 100) -> List[sqlite3.Row]:
+        """Most recently updated jobs with `status`, e.g. the dead letters"""
+        return await self.db.fetchall(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+            (status, limit),
+        )
@@ -0,0 +1,77 @@
+import time
+from typing import List, Tuple
+from clients.anthropic_models import Message
+from repository.database import Database
+
+
+def is_conversation_start(message: Message) -> bool:
+    """A user message that is not answering a tool call"""
+    if message.role != "user":
+        return False
+    if isinstance(message.content, str):
+        return True
+    return all(block.type != "tool_result" for block in message.content)
+
+
+class SessionRepository:
+    """
+    Agent conversations stored as append-only rows in `session_messages`.
+
+    Messages are never rewritten: each turn appends its new messages in a
+    single batch, and a session is read back from its tail so long
+    histories never have to be loaded in full.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+
+    def load_tail(self, session_id: str, limit: int) -> Tuple[int, List[Message]]:
+        """
+        Returns (message_count, messages) for the last `limit` messages.
+
+        The tail is trimmed to start at a plain user message so it is a
+        valid conversation for the Messages API on its own.
+        """
+        with self.db.get_connection(read_only=True) as conn:
+            count = conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM session_messages "
+                "WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT message FROM session_messages WHERE session_id = ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (session_id, limit),
+            ).fetchall()
+
+        messages = [Message.model_validate_json(r["message"]) for r in reversed(rows)]
+        while messages and not is_conversation_start(messages[0]):
+            messages.pop(0)
+        return count, messages
+
+    def append(self, session_id: str, start_seq: int, messages: List[Message]) -> None:
+        """
+        Append `messages` starting at `start_seq`.
+
+        Raises sqlite3.IntegrityError if another worker already wrote
+        those sequence numbers.
+        """
+        if not messages:
+            return
+        now = time.time()
+        with self.db.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, created_at, updated_at) "
+                "VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (session_id, now, now),
+            )
+            conn.executemany(
+                "INSERT INTO session_messages (session_id, seq, message, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (session_id, start_seq + i,
+                     m.model_dump_json(exclude_none=True), now)
+                    for i, m in enumerate(messages)
+                ],
+            )
@@ -0,0 +1,37 @@
+import pytest
+from repository.async_database import AsyncSQLite3Database
+from repository.database import SQLite3ConnectionPool
+
+
+@pytest.fixture
+def adb(db):
+    pool = SQLite3ConnectionPool(db.db_path, readers=1)
+    adb = AsyncSQLite3Database(pool, max_workers=2)
+    yield adb
+    adb.close()
+    pool.close()
+
+
+async def test_bulk_insert_and_fetch(adb):
+    inserted = await adb.executemany(
+        "INSERT INTO sessions VALUES (?, ?, ?)",
+        ((f"s{i}", i, i) for i in range(10)),
+    )
+    assert inserted == 10
+    row = await adb.fetchone("SELECT COUNT(*) AS n FROM sessions")
+    assert row["n"] == 10
+    assert await adb.execute("DELETE FROM sessions WHERE created_at < 5") == 5
+
+
+async def test_stream_yields_lazily_and_returns_the_connection(adb):
+    await adb.executemany(
+        "INSERT INTO sessions VALUES (?, 0, 0)", ((str(i),) for i in range(7)))
+    rows = adb.stream(
+        "SELECT session_id FROM sessions ORDER BY session_id", batch_size=3)
+    first = await anext(rows)
+    assert first["session_id"] == "0"
+    await rows.aclose()
+
+    # the single reader went back to the pool when the stream was closed
+    ids = [r["session_id"] async for r in adb.stream("SELECT session_id FROM sessions")]
+    assert len(ids) == 7
@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+import pytest
+from repository.database import SQLite3ConnectionPool
+
+
+@pytest.fixture
+def pool(db):
+    pool = SQLite3ConnectionPool(db.db_path, readers=2)
+    yield pool
+    pool.close()
+
+
+def test_connections_are_reused_and_configured_once(pool):
+    with pool.get_connection(read_only=True) as first:
+        pass
+    with pool.get_connection(read_only=True) as second:
+        with pool.get_connection(read_only=True) as third:
+            assert second is not third
+            assert first in (second, third)
+            assert second.execute("PRAGMA cache_size").fetchone()[0] == -64000
+            with pytest.raises(sqlite3.OperationalError):
+                second.execute("DELETE FROM tool_cache")
+    with pool.get_connection() as writer:
+        assert writer.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_writer_commits_and_rolls_back(pool):
+    with pool.get_connection() as conn:
+        conn.execute("INSERT INTO sessions VALUES ('a', 0, 0)")
+    with pytest.raises(ValueError):
+        with pool.get_connection() as conn:
+            conn.execute("INSERT INTO sessions VALUES ('b', 0, 0)")
+            raise ValueError("boom")
+    with pool.get_connection(read_only=True) as conn:
+        rows = conn.execute("SELECT session_id FROM sessions").fetchall()
+    assert [r["session_id"] for r in rows] == ["a"]
+
+
+def test_broken_connection_is_replaced(pool):
+    with pool.get_connection(read_only=True) as conn:
+        conn.close()
+    for _ in range(2):
+        with pool.get_connection(read_only=True) as conn:
+            assert conn.execute("SELECT 1").fetchone()[0] == 1
+
+
+def test_connections_cross_threads(pool):
+    errors = []
+
+    def write(i):
+        try:
+            with pool.get_connection() as conn:
+                conn.execute("INSERT INTO sessions VALUES (?, 0, 0)", (str(i),))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
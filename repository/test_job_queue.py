@@ -0,0 +1,74 @@
+import pytest
+from repository.async_database import AsyncSQLite3Database
+from repository.database import SQLite3ConnectionPool
+from repository.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(db):
+    pool = SQLite3ConnectionPool(db.db_path, readers=1)
+    adb = AsyncSQLite3Database(pool, max_workers=2)
+    yield JobQueue(adb)
+    adb.close()
+    pool.close()
+
+
+async def test_lease_heartbeat_ack(queue):
+    first = await queue.enqueue("s1", "{}")
+    second = await queue.enqueue("s2", "{}")
+
+    leased = await queue.lease("w1", visibility_timeout=30, limit=5)
+    assert [j["job_id"] for j in leased] == [first, second]
+    assert leased[0]["attempts"] == 1
+    # leased jobs are invisible to other workers
+    assert await queue.lease("w2", visibility_timeout=30) == []
+
+    assert await queue.heartbeat(first, "w1", 30)
+    assert not await queue.heartbeat(first, "w2", 30)
+    assert await queue.ack(first, "w1", "result")
+    job = await queue.get(first)
+    assert (job["status"], job["result"], job["lease_owner"]) == ("done", "result", None)
+
+
+async def test_failed_jobs_retry_then_dead_letter(queue):
+    job_id = await queue.enqueue("s1", "{}", max_attempts=2)
+    await queue.lease("w1", 30)
+    assert await queue.fail(job_id, "w1", "boom", retry_delay=0) == "queued"
+    await queue.lease("w1", 30)
+    assert await queue.fail(job_id, "w1", "boom again", retry_delay=0) == "dead"
+
+    assert await queue.lease("w1", 30) == []
+    dead = await queue.by_status("dead")
+    assert [(j["job_id"], j["attempts"], j["error"]) for j in dead] == [
+        (job_id, 2, "boom again")]
+
+
+async def test_expired_lease_is_picked_up_by_another_worker(queue):
+    job_id = await queue.enqueue("s1", "{}", max_attempts=2)
+    await queue.lease("w1", visibility_timeout=-1)  # w1 died
+
+    leased = await queue.lease("w2", visibility_timeout=-1)
+    assert [(j["job_id"], j["attempts"]) for j in leased] == [(job_id, 2)]
+    # and w1 can no longer settle it
+    assert not await queue.ack(job_id, "w1", "late")
+
+    # died on the last attempt too: dead-lettered instead of leased again
+    assert await queue.lease("w3", 30) == []
+    assert (await queue.get(job_id))["status"] == "dead"
+
+
+async def test_one_job_per_session_at_a_time_in_order(queue):
+    first = await queue.enqueue("s1", "{}")
+    second = await queue.enqueue("s1", "{}")
+    other = await queue.enqueue("s2", "{}")
+
+    leased = await queue.lease("w1", 30, limit=5)
+    assert [j["job_id"] for j in leased] == [first, other]
+
+    # giving a job back doesn't use up an attempt or lose its place
+    assert await queue.release(first, "w1")
+    assert (await queue.get(first))["attempts"] == 0
+    assert [j["job_id"] for j in await queue.lease("w2", 30, limit=5)] == [first]
+
+    await queue.ack(first, "w2", None)
+    assert [j["job_id"] for j in await queue.lease("w2", 30, limit=5)] == [second]
@@ -0,0 +1,49 @@
+import time
+from typing import Optional
+from repository.database import Database
+
+
+class ToolCacheRepository:
+    """Persistent tier of the tool result cache, stored in `tool_cache`"""
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+
+    def get(self, cache_key: str, min_created_at: float) -> Optional[str]:
+        with self.db.get_connection() as conn:
+            row = conn.execute(
+                "SELECT result FROM tool_cache "
+                "WHERE cache_key = ? AND created_at >= ?",
+                (cache_key, min_created_at),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tool_cache SET last_used_at = ? WHERE cache_key = ?",
+                (time.time(), cache_key),
+            )
+            return row["result"]
+
+    def put(self, cache_key: str, tool_name: str, result: str) -> None:
+        now = time.time()
+        with self.db.get_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tool_cache "
+                "(cache_key, tool_name, result, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key, tool_name, result, now, now),
+            )
+
+    def evict(self, min_created_at: float, max_entries: int) -> int:
+        """Drop expired rows, then the least recently used beyond `max_entries`"""
+        with self.db.get_connection() as conn:
+            expired = conn.execute(
+                "DELETE FROM tool_cache WHERE created_at < ?", (min_created_at,)
+            ).rowcount
+            overflow = conn.execute(
+                "DELETE FROM tool_cache WHERE cache_key IN ("
+                "SELECT cache_key FROM tool_cache "
+                "ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            ).rowcount
+            return expired + overflow
@@ -0,0 +1,363 @@
+"""
+In-process tracing and metrics.
+
+Spans follow the OpenTelemetry model (trace id, span id, parent, start and
+end time, attributes) and nest through a context variable, so a span
+opened in a coroutine is the parent of every span opened in the tasks it
+spawns. Finished spans feed a duration histogram and any configured
+exporters; counters and histograms are rendered in the Prometheus text
+format for `GET /metrics`.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# seconds; covers a sqlite query up to a long CLI conversion
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    60.0, 120.0, 300.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Span:
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+        "attributes", "status",
+    )
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """Increment a numeric attribute, e.g. retries within this span"""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration * 1000,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def labels_key(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """Labelled counters and histograms"""
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: Any) -> None:
+        series = self.counters.setdefault(name, {})
+        key = labels_key(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        series = self.histograms.setdefault(name, {})
+        key = labels_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def value(self, name: str, **labels: Any) -> float:
+        return self.counters.get(name, {}).get(labels_key(labels), 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every series as plain JSON, for `merge` in another process"""
+        return {
+            "counters": [
+                [name, list(labels), value]
+                for name, series in self.counters.items()
+                for labels, value in series.items()
+            ],
+            "histograms": [
+                [name, list(labels), list(h.buckets), h.counts, h.sum, h.count]
+                for name, series in self.histograms.items()
+                for labels, h in series.items()
+            ],
+        }
+
+    def merge(self, snapshot: Dict[str, Any], **labels: Any) -> None:
+        """Add another process's `snapshot` to these series, with `labels` added"""
+        extra = list(labels_key(labels))
+        for name, series_labels, value in snapshot["counters"]:
+            series = self.counters.setdefault(name, {})
+            key = labels_key(dict(series_labels + extra))
+            series[key] = series.get(key, 0) + value
+        for name, series_labels, buckets, counts, total, count in snapshot["histograms"]:
+            series = self.histograms.setdefault(name, {})
+            key = labels_key(dict(series_labels + extra))
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(tuple(buckets))
+            histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+            histogram.sum += total
+            histogram.count += count
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines: List[str] = []
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{format_labels(labels)} {value:g}")
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    le = format_labels(labels, f'le="{bound:g}"')
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                le = format_labels(labels, 'le="+Inf"')
+                lines.append(f"{name}_bucket{le} {h.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {h.sum:g}")
+                lines.append(f"{name}_count{format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+    async def flush(self) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+class FileSpanExporter:
+    """Appends finished spans to a file as JSON lines"""
+
+    def __init__(self, path: str, max_buffer: int = 10_000) -> None:
+        self.path = path
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer: List[str] = []
+
+    def export(self, span: Span) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(json.dumps(span.to_dict(), default=str))
+
+    def write(self, lines: List[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def flush(self) -> None:
+        lines, self._buffer = self._buffer, []
+        if lines:
+            await asyncio.to_thread(self.write, lines)
+
+    async def aclose(self) -> None:
+        await self.flush()
+
+
+def otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPSpanExporter:
+    """
+    Sends finished spans to an OpenTelemetry collector over OTLP/HTTP
+    (JSON encoding), e.g. `http://localhost:4318/v1/traces`.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str = "agents",
+        http_client: Optional[httpx.AsyncClient] = None,
+        max_buffer: int = 10_000,
+    ) -> None:
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(timeout=10.0)
+        self._buffer: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(span)
+
+    def payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": otlp_value(self.service_name)}]},
+            "scopeSpans": [{
+                "scope": {"name": "agents"},
+                "spans": [{
+                    "traceId": s.trace_id,
+                    "spanId": s.span_id,
+                    **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                    "name": s.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns),
+                    "attributes": [
+                        {"key": k, "value": otlp_value(v)}
+                        for k, v in s.attributes.items()
+                    ],
+                    # 1 = ok, 2 = error
+                    "status": {"code": 1 if s.status == "ok" else 2},
+                } for s in spans],
+            }],
+        }]}
+
+    async def flush(self) -> None:
+        spans, self._buffer = self._buffer, []
+        if not spans:
+            return
+        try:
+            response = await self.http_client.post(self.endpoint, json=self.payload(spans))
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # telemetry must never take the service down with it
+            self.dropped += len(spans)
+            logger.warning("Span export failed:", extra={"error": str(e)})
+
+    async def aclose(self) -> None:
+        await self.flush()
+        if self._owns_http_client:
+            await self.http_client.aclose()
+
+
+class Telemetry:
+    def __init__(self) -> None:
+        self.metrics = Metrics()
+        self.exporters: List[SpanExporter] = []
+        self._current: ContextVar[Optional[Span]] = ContextVar(
+            "current_span", default=None)
+        self._flusher: Optional[asyncio.Task] = None
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time a block as a child of the current span"""
+        parent = self._current.get()
+        span = Span(name, parent, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "error"
+            span.attributes["error"] = type(e).__name__
+            raise
+        except BaseException:
+            # cancelled, or a generator closed by its consumer
+            span.attributes["cancelled"] = True
+            raise
+        finally:
+            try:
+                self._current.reset(token)
+            except ValueError:
+                # an async generator finalized from another context
+                self._current.set(parent)
+            self.finish(span)
+
+    def finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        self.metrics.observe("span_duration_seconds", span.duration, span=span.name)
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    def add_exporter(self, exporter: SpanExporter) -> None:
+        self.exporters.append(exporter)
+
+    def start(self, interval: float = 5.0) -> None:
+        """Flush exporters in the background every `interval` seconds"""
+
+        async def flush_forever() -> None:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush()
+
+        if self.exporters and self._flusher is None:
+            self._flusher = asyncio.create_task(flush_forever())
+
+    async def flush(self) -> None:
+        for exporter in self.exporters:
+            await exporter.flush()
+
+    async def aclose(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        for exporter in self.exporters:
+            await exporter.aclose()
+        self.exporters = []
+
+
+# shared by every component in the process, like the cli runner
+telemetry = Telemetry()
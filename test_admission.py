@@ -0,0 +1,143 @@
+import asyncio
+import json
+import pytest
+from admission import AdmissionController, Cancelled, Saturated
+from repository.admission_repository import AdmissionRepository
+from repository.async_database import AsyncSQLite3Database
+from repository.database import SQLite3ConnectionPool
+from telemetry import Metrics, telemetry
+
+
+@pytest.fixture
+def adb(db):
+    pool = SQLite3ConnectionPool(db.db_path, readers=2)
+    adb = AsyncSQLite3Database(pool)
+    yield adb
+    adb.close()
+    pool.close()
+
+
+async def worker(adb, worker_id: str, **kwargs) -> AdmissionController:
+    """A worker process sharing the database with the others"""
+    controller = AdmissionController(
+        AdmissionRepository(adb, worker_id, ttl=5),
+        poll_interval=0.01,
+        **kwargs,
+    )
+    await controller.repository.register()
+    return controller
+
+
+async def test_capacity_is_shared_across_workers_and_excess_is_shed(adb):
+    a = await worker(adb, "a", max_running=2, max_queued=1, queue_timeout=0.05)
+    b = await worker(adb, "b", max_running=2, max_queued=1, queue_timeout=0.05)
+    await a.acquire("s1")
+    await b.acquire("s2")
+
+    with pytest.raises(ValueError):
+        await b.acquire("s1")
+    # the third run queues on b, then times out
+    with pytest.raises(Saturated) as timed_out:
+        await b.acquire("s3")
+    assert timed_out.value.status_code == 503
+
+    # a queued run fills the queue, so the next one is refused at once
+    queued = asyncio.create_task(a.acquire("s4"))
+    await asyncio.sleep(0.01)
+    with pytest.raises(Saturated) as full:
+        await b.acquire("s5")
+    assert full.value.status_code == 429
+    assert full.value.retry_after >= 1
+
+    capacity = await b.capacity()
+    assert (capacity.running, capacity.queued, capacity.workers) == (2, 1, 2)
+    assert not capacity.ready and capacity.reason == "saturated"
+
+    # a run ending on one worker admits the run queued on the other
+    b.release("s2")
+    await queued
+    assert (await a.capacity()).ready
+
+
+async def test_dead_workers_slots_are_reaped(adb):
+    a = await worker(adb, "a", max_running=1)
+    b = await worker(adb, "b", max_running=1, queue_timeout=0.05)
+    await a.acquire("s1")
+    with pytest.raises(Saturated):
+        await b.acquire("s2")
+
+    # a stops heartbeating
+    await adb.execute("UPDATE workers SET heartbeat_at = 0 WHERE worker_id = 'a'")
+    await b.acquire("s2")
+    assert (await b.capacity()).workers == 1
+
+
+async def test_draining_worker_sheds_and_is_not_ready(adb):
+    a = await worker(adb, "a")
+    a.drain()
+    with pytest.raises(Saturated) as shed:
+        await a.acquire("s1")
+    assert shed.value.status_code == 503
+    assert (await a.capacity()).reason == "draining"
+    await a.aclose()
+    assert (await adb.fetchone("SELECT COUNT(*) AS n FROM workers"))["n"] == 0
+
+
+async def test_cancel_through_another_worker_reaches_the_run(adb):
+    cancelled = []
+    a = await worker(adb, "a", queue_timeout=1, cancel_poll_interval=0.01,
+                     on_cancel=cancelled.append)
+    b = await worker(adb, "b", queue_timeout=1)
+    a._cancels = asyncio.create_task(a.watch_cancels())
+    await a.acquire("s1")
+
+    # b sees where the run lives
+    slot = await b.repository.slot("s1")
+    assert (slot["worker_id"], slot["state"]) == ("a", "running")
+    assert [s["session_id"] for s in await b.repository.others()] == ["s1"]
+    assert await a.repository.others() == []
+
+    # a cancels the run and releases the slot, which ends b's wait
+    cancelling = asyncio.create_task(b.cancel("s1"))
+    while not cancelled:
+        await asyncio.sleep(0.01)
+    a.release("s1")
+    assert await cancelling is True
+    assert cancelled[0] == "s1"
+    assert await b.cancel("s1") is None
+    await a.aclose()
+
+
+async def test_cancelling_a_queued_run_stops_its_waiter(adb):
+    a = await worker(adb, "a", max_running=1, queue_timeout=5)
+    b = await worker(adb, "b", max_running=1, queue_timeout=5)
+    await a.acquire("s1")
+    queued = asyncio.create_task(b.acquire("s2"))
+    await asyncio.sleep(0.05)
+    assert (await a.repository.slot("s2"))["state"] == "queued"
+
+    # b drops the slot on its next poll instead of running the session later
+    assert await a.cancel("s2") is True
+    with pytest.raises(Cancelled):
+        await queued
+    a.release("s1")
+    await b.acquire("s3")
+
+
+async def test_metrics_cover_every_worker(adb):
+    a = await worker(adb, "a")
+    b = await worker(adb, "b")
+    snapshot = Metrics()
+    snapshot.inc("remote_runs_total", 2, status="done")
+    snapshot.observe("remote_wait_seconds", 0.3)
+    await a.repository.heartbeat(json.dumps(snapshot.snapshot()))
+
+    # every series stays apart per worker, so none can go down between
+    # scrapes answered by different workers
+    telemetry.metrics.inc("remote_runs_total", status="done")
+    merged = await b.metrics()
+    assert 'remote_runs_total{status="done",worker_id="a"} 2' in merged
+    assert 'remote_runs_total{status="done",worker_id="b"} 1' in merged
+    assert 'remote_wait_seconds_bucket{worker_id="a",le="0.5"} 1' in merged
+    # a's own snapshot isn't read back on top of its live metrics
+    assert await a.repository.worker_metrics() == {}
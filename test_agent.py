@@ -0,0 +1,192 @@
+import asyncio
+import time
+import pytest
+from agent import Agent
+from clients.anthropic_models import (
+    AnthropicResponse,
+    TextBlock,
+    ToolChoice,
+    ToolUseBlock,
+    Usage,
+)
+from clients.tool_registry import ToolRegistry
+from repository.session_repository import SessionRepository
+
+
+class ScriptedClient:
+    """Replays canned responses in place of AnthropicClient"""
+
+    def __init__(self, responses):
+        self.model = "claude-test"
+        self.responses = list(responses)
+        self.requests = []
+
+    async def get(self, request):
+        self.requests.append(request)
+        return self.responses.pop(0)
+
+
+def response(*content, stop_reason="end_turn") -> AnthropicResponse:
+    return AnthropicResponse(
+        id="msg",
+        model="claude-test",
+        role="assistant",
+        content=list(content),
+        stop_reason=stop_reason,
+        usage=Usage(input_tokens=1, output_tokens=1),
+    )
+
+
+def slow_echo(text: str) -> str:
+    time.sleep(0.3)
+    return text
+
+
+def make_agent(tool_choice=None) -> Agent:
+    client = ScriptedClient([
+        response(
+            ToolUseBlock(id="t1", name="echo", input={"text": "one"},
+                         type="tool_use"),
+            ToolUseBlock(id="t2", name="echo", input={"text": "two"},
+                         type="tool_use"),
+            ToolUseBlock(id="t3", name="missing", input={}, type="tool_use"),
+            stop_reason="tool_use",
+        ),
+        response(TextBlock(text="done", type="text")),
+    ])
+    registry = ToolRegistry()
+    registry.tool("echo")(slow_echo)
+    return Agent(
+        session_id=None,
+        aclient=client,
+        tools=registry.schemas(["echo"]),
+        tool_registry=registry,
+        tool_choice=tool_choice,
+    )
+
+
+async def test_tool_uses_run_concurrently_in_order():
+    agent = make_agent()
+    start = time.perf_counter()
+    assert await agent.run("go") == "done"
+    assert time.perf_counter() - start < 0.5
+
+    # one user message carries every result, in the original order
+    results = agent.messages[2].content
+    assert [r.tool_use_id for r in results] == ["t1", "t2", "t3"]
+    assert [r.content for r in results[:2]] == ["one", "two"]
+    assert results[2].is_error
+
+
+async def test_disable_parallel_tool_use_runs_sequentially():
+    agent = make_agent(
+        ToolChoice(type="auto", disable_parallel_tool_use=True))
+    start = time.perf_counter()
+    await agent.run("go")
+    assert time.perf_counter() - start >= 0.6
+
+
+async def test_session_survives_a_new_agent(db):
+    store = SessionRepository(db)
+    first = make_agent()
+    first.session_store = store
+    await first.run("go")
+    assert store.load_tail(first.session_id, 50)[0] == 4
+
+    second = Agent(
+        session_id=first.session_id,
+        aclient=ScriptedClient([response(TextBlock(text="again", type="text"))]),
+        tools=[],
+        tool_registry={},
+        session_store=store,
+        history_limit=3,
+    )
+    assert await second.run("and again") == "again"
+    # the 3-message tail started on a tool_result, so it was trimmed
+    sent = second.aclient.requests[0].messages
+    assert [m.content[-1].text for m in sent] == ["and again"]
+    count, tail = store.load_tail(first.session_id, 50)
+    assert count == 6
+    assert [m.role for m in tail] == ["user", "assistant"] * 3
+
+
+async def test_cache_breakpoints_mark_the_stable_prefix():
+    agent = make_agent()
+    agent.system = "You convert markdown to TOML."
+    await agent.run("go")
+
+    req = agent.aclient.requests[1]
+    assert req.tools[-1].cache_control is not None
+    assert req.system[0].cache_control is not None
+    marked = [m for m in req.messages if m.content[-1].cache_control]
+    assert [m.role for m in marked] == ["user", "user"]
+    body = req.model_dump(exclude_none=True)
+    assert body["messages"][0]["content"][0]["cache_control"] == {
+        "type": "ephemeral"}
+    # the stored history is untouched
+    assert agent.messages[0].content == "go"
+    assert agent.messages[2].content[-1].cache_control is None
+
+
+async def test_identical_tool_calls_share_one_execution():
+    calls = []
+
+    def convert(text: str) -> str:
+        calls.append(text)
+        time.sleep(0.2)
+        return text.upper()
+
+    agents = [
+        Agent(session_id=None, aclient=None, tools=[],
+              tool_registry={"convert": convert})
+        for _ in range(3)
+    ]
+    results = await asyncio.gather(*(
+        agent.execute_tool(f"t{i}", "convert", {"text": "same"})
+        for i, agent in enumerate(agents)
+    ))
+
+    assert calls == ["same"]
+    assert [r.tool_result for r in results] == ["SAME"] * 3
+    assert [r.tool_use_id for r in results] == ["t0", "t1", "t2"]
+
+
+async def test_same_name_in_other_registries_is_not_shared():
+    def tool(suffix: str):
+        def convert(text: str) -> str:
+            time.sleep(0.1)
+            return text + suffix
+        return convert
+
+    agents = [
+        Agent(session_id=None, aclient=None, tools=[],
+              tool_registry={"convert": tool(suffix)})
+        for suffix in ("-a", "-b")
+    ]
+    results = await asyncio.gather(*(
+        agent.execute_tool(f"t{i}", "convert", {"text": "same"})
+        for i, agent in enumerate(agents)
+    ))
+
+    assert [r.tool_result for r in results] == ["same-a", "same-b"]
+
+
+async def test_timeout_is_a_deadline_for_the_whole_run():
+    async def slow(text: str) -> str:
+        await asyncio.sleep(0.3)
+        return text
+
+    turn = response(
+        ToolUseBlock(id="t1", name="slow", input={"text": "x"}, type="tool_use"),
+        stop_reason="tool_use",
+    )
+    agent = Agent(
+        session_id=None,
+        aclient=ScriptedClient([turn] * 5 + [response(TextBlock(text="done", type="text"))]),
+        tools=[],
+        tool_registry={"slow": slow},
+        max_iters=6,
+        timeout=1,
+    )
+    with pytest.raises(TimeoutError, match="Agent run timed out after 1s"):
+        await agent.run("go")
@@ -0,0 +1,126 @@
+import asyncio
+import io
+import json
+import logging
+import threading
+import pytest
+from logging_setup import (
+    ContextFilter,
+    NonBlockingQueueHandler,
+    ReportingQueueListener,
+    SamplingFilter,
+    configure_logging,
+    log_context,
+)
+from telemetry import telemetry
+
+
+class Capture(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+        self.threads = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+        self.threads.append(threading.current_thread().name)
+        self.format(record)
+
+
+@pytest.fixture
+def pipeline():
+    capture = Capture()
+    handler = NonBlockingQueueHandler(maxsize=100)
+    handler.addFilter(ContextFilter())
+    listener = ReportingQueueListener(handler, capture)
+    logger = logging.getLogger("test_logging_setup")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.addHandler(handler)
+    listener.start()
+    yield logger, handler, listener, capture
+    logger.removeHandler(handler)
+    listener.stop()
+
+
+async def test_context_follows_tasks(pipeline):
+    logger, _, listener, capture = pipeline
+
+    async def work() -> None:
+        logger.info("inside task")
+
+    with log_context(session_id="s1"), telemetry.span("test") as span:
+        await asyncio.create_task(work())
+        logger.info("explicit", extra={"session_id": "override"})
+    logger.info("outside")
+    listener.stop()
+
+    inside, explicit, outside = capture.records
+    assert inside.session_id == "s1"
+    assert inside.trace_id == span.trace_id
+    assert explicit.session_id == "override"
+    assert not hasattr(outside, "session_id")
+
+
+def test_messages_are_rendered_on_the_writer_thread(pipeline):
+    logger, _, listener, capture = pipeline
+    rendered_on = []
+
+    class Payload:
+        def __str__(self) -> str:
+            rendered_on.append(threading.current_thread().name)
+            return "payload"
+
+    logger.info("value: %s", Payload())
+    listener.stop()
+
+    assert capture.records[0].getMessage() == "value: payload"
+    assert rendered_on[0] != threading.current_thread().name
+
+
+def test_debug_records_are_sampled():
+    sampler = SamplingFilter(rate=0.0)
+    debug = logging.makeLogRecord({"levelno": logging.DEBUG})
+    info = logging.makeLogRecord({"levelno": logging.INFO})
+    assert not sampler.filter(debug)
+    assert sampler.filter(info)
+    assert sampler.sampled_out == 1
+
+
+def test_full_queue_drops_and_reports():
+    capture = Capture()
+    handler = NonBlockingQueueHandler(maxsize=2)
+    logger = logging.getLogger("test_logging_setup.full")
+    logger.propagate = False
+    logger.addHandler(handler)
+    for i in range(5):
+        logger.warning("record %d", i)
+    assert handler.dropped == 3
+
+    listener = ReportingQueueListener(handler, capture)
+    listener.start()
+    logger.warning("after")
+    listener.stop()
+    logger.removeHandler(handler)
+
+    messages = [r.getMessage() for r in capture.records]
+    assert messages == [
+        "Dropped 3 log records: queue full", "record 0", "record 1", "after"]
+
+
+def test_configure_logging_writes_json():
+    stream = io.StringIO()
+    root = logging.getLogger()
+    level, handlers = root.level, list(root.handlers)
+    listener = configure_logging(stream=stream)
+    try:
+        with log_context(batch_id="b1"):
+            logging.getLogger("json_pipeline").info("hello %s", "world")
+    finally:
+        listener.stop()
+        root.handlers = handlers
+        root.setLevel(level)
+
+    line = json.loads(stream.getvalue().splitlines()[-1])
+    assert line["message"] == "hello world"
+    assert line["batch_id"] == "b1"
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import httpx
+import pytest
+from clients.anthropic_models import TextBlock, ToolUseBlock
+from telemetry import FileSpanExporter, Metrics, OTLPSpanExporter, Telemetry, telemetry
+from test_agent import ScriptedClient, response
+from agent import Agent
+
+
+class Collector:
+    def __init__(self) -> None:
+        self.spans = []
+
+    def export(self, span) -> None:
+        self.spans.append(span)
+
+    async def flush(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+
+@pytest.fixture
+def collector():
+    collector = Collector()
+    telemetry.add_exporter(collector)
+    yield collector
+    telemetry.exporters.remove(collector)
+
+
+async def test_spans_nest_across_tasks():
+    t = Telemetry()
+    collector = Collector()
+    t.add_exporter(collector)
+
+    async def child() -> None:
+        with t.span("child"):
+            await asyncio.sleep(0)
+
+    with t.span("root", kind="test") as root:
+        await asyncio.gather(child(), child())
+
+    children = [s for s in collector.spans if s.name == "child"]
+    assert len(children) == 2
+    assert all(s.parent_id == root.span_id for s in children)
+    assert all(s.trace_id == root.trace_id for s in children)
+    assert root.parent_id is None
+    assert root.attributes == {"kind": "test"}
+    assert t.current_span() is None
+
+
+def test_failed_span_is_marked_and_timed():
+    t = Telemetry()
+    with pytest.raises(RuntimeError):
+        with t.span("boom"):
+            raise RuntimeError("x")
+    histogram = t.metrics.histograms["span_duration_seconds"][(("span", "boom"),)]
+    assert histogram.count == 1
+
+
+def test_prometheus_rendering():
+    metrics = Metrics()
+    metrics.inc("tool_calls_total", tool="validate_toml", outcome="ok")
+    metrics.inc("tool_calls_total", 2, tool="validate_toml", outcome="ok")
+    metrics.observe("latency_seconds", 0.02)
+    text = metrics.render()
+
+    assert '# TYPE tool_calls_total counter' in text
+    assert 'tool_calls_total{outcome="ok",tool="validate_toml"} 3' in text
+    assert 'latency_seconds_bucket{le="0.01"} 0' in text
+    assert 'latency_seconds_bucket{le="0.025"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 1' in text
+    assert "latency_seconds_count 1" in text
+
+
+async def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    t = Telemetry()
+    t.add_exporter(FileSpanExporter(str(path)))
+    with t.span("a"):
+        with t.span("b", n=1):
+            pass
+    await t.aclose()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [s["name"] for s in spans] == ["b", "a"]
+    assert spans[0]["parent_id"] == spans[1]["span_id"]
+    assert spans[0]["attributes"] == {"n": 1}
+
+
+async def test_otlp_exporter_posts_batches():
+    posted = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        posted.append(json.loads(request.content))
+        return httpx.Response(200, json={})
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    exporter = OTLPSpanExporter("http://collector/v1/traces", http_client=http_client)
+    t = Telemetry()
+    t.add_exporter(exporter)
+    with t.span("a", tokens=5, ok=True):
+        pass
+    await t.flush()
+
+    span = posted[0]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "a"
+    assert {"key": "tokens", "value": {"intValue": "5"}} in span["attributes"]
+    assert {"key": "ok", "value": {"boolValue": True}} in span["attributes"]
+    await http_client.aclose()
+
+
+async def test_agent_run_is_traced(collector):
+    client = ScriptedClient([
+        response(ToolUseBlock(id="t1", name="upper", input={"text": "telemetry"},
+                              type="tool_use"), stop_reason="tool_use"),
+        response(TextBlock(text="done", type="text")),
+    ])
+    before = telemetry.metrics.value("tool_calls_total", tool="upper", outcome="ok",
+                                     cached=False)
+    agent = Agent(session_id=None, aclient=client, tools=[],
+                  tool_registry={"upper": lambda text: text.upper()})
+    await agent.run("go")
+
+    by_name = {}
+    for span in collector.spans:
+        by_name.setdefault(span.name, []).append(span)
+    run = by_name["agent.run"][0]
+    iterations = by_name["agent.iteration"]
+    tool = by_name["tool.execute"][0]
+    assert len(iterations) == 2
+    assert all(s.parent_id == run.span_id for s in iterations)
+    assert tool.parent_id == iterations[0].span_id
+    assert tool.attributes["outcome"] == "ok"
+    assert telemetry.metrics.value(
+        "tool_calls_total", tool="upper", outcome="ok", cached=False) == before + 1